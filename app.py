@@ -12,22 +12,22 @@ app.py (Main Application - SmartEvolve)
 import streamlit as st
 import os
 import traceback
-from datetime import datetime
 import base64
-import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
-import json
+import shutil
 import random
+from src.render_budget import track_page, begin_rerun, current_report
 
 # --- Core App Imports ---
 # Make sure you have these files in a folder named 'src'
 # (Or update these import paths if your files are elsewhere)
+# Only lightweight modules are imported here. pandas/plotly and the
+# OCR/grading/diagram modules (Gemini SDK, OpenCV, PyMuPDF) are imported
+# inside the pages that use them, so the login and student pages don't
+# pay for them on a cold start.
 try:
-    from src.ocr_extraction import convert_pdf_to_images, extract_text_from_images
-    from src.answer_grader import grade_answers
-    from src.diagram_detection import detect_diagrams
     from src.feedback_handler import load_feedback, save_feedback 
+    from src.evaluation_store import build_evaluation_record, score_path, get_store
+    from src.job_queue import JobQueue, make_batch_id
 except ImportError:
     st.error("Could not import source files from 'src' folder. Make sure 'src/ocr_extraction.py', 'src/answer_grader.py', etc. exist.")
     # st.stop() # Uncomment this line if you want the app to stop if imports fail
@@ -39,24 +39,68 @@ except Exception as e:
 # --- Page/Module Imports ---
 try:
     from login import login_page, is_logged_in, logout
-    from dashboard import display_dashboard, save_evaluation_to_history
 except ImportError as e:
-    st.error(f"Failed to import login or dashboard: {e}. Make sure login.py and dashboard.py are in the same folder.")
+    st.error(f"Failed to import login: {e}. Make sure login.py is in the same folder.")
     # st.stop()
 except Exception as e:
-    st.error(f"An error occurred importing login/dashboard: {e}")
+    st.error(f"An error occurred importing login: {e}")
     # st.stop()
 
 # --- START: Merged Frontend Code ---
+# Paths are anchored to this file so `streamlit run /path/to/app.py` works from any directory
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKGROUND_VIDEO_PATH = os.path.join(APP_DIR, "assets", "logo.mp4")
+LOGO_PATH = os.path.join(APP_DIR, "assets", "logo.png")
+STATIC_DIR = os.path.join(APP_DIR, "static")  # Served at app/static/ when server.enableStaticServing is on
+
+# Assets are cached once per server process (not per browser session). The
+# file's mtime is part of the cache key, so replacing an asset picks it up.
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _cached_base_64(path, mtime):
+    with open(path, "rb") as f:
+        return base64.b64encode(f.read()).decode()
+
 def to_base_64(path):
     """Convert file to base64 string."""
     try:
-        with open(path, "rb") as f:
-            return base64.b64encode(f.read()).decode()
+        return _cached_base_64(path, os.path.getmtime(path))
     except FileNotFoundError:
         st.warning(f"Asset file not found: {path}")
         return None
 
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _cached_logo_header(path, mtime):
+    return get_logo_header(_cached_base_64(path, mtime))
+
+def logo_header_html(path):
+    """Returns the logo header HTML, built once per process."""
+    try:
+        return _cached_logo_header(path, os.path.getmtime(path))
+    except FileNotFoundError:
+        st.warning(f"Asset file not found: {path}")
+        return "<h2>SMART EVAL</h2>" # Fallback
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _publish_static_asset(path, mtime):
+    """Copies an asset into the static folder and returns its URL."""
+    os.makedirs(STATIC_DIR, exist_ok=True)
+    shutil.copy2(path, os.path.join(STATIC_DIR, os.path.basename(path)))
+    return f"app/static/{os.path.basename(path)}"
+
+def get_video_source(video_path):
+    """
+    Returns the `src` for the background video. With static serving enabled
+    (see .streamlit/config.toml) the browser fetches and caches the file by
+    URL; otherwise the video is inlined as a base64 data URI.
+    """
+    if st.get_option("server.enableStaticServing"):
+        try:
+            return _publish_static_asset(video_path, os.path.getmtime(video_path))
+        except OSError as e:
+            print(f"Could not serve {video_path} statically, inlining it instead: {e}")
+    video_b64 = to_base_64(video_path)
+    return f"data:video/mp4;base64,{video_b64}" if video_b64 else None
+
 def get_global_animations():
     """Returns the main CSS for animations and neon glow effects."""
     return """
@@ -201,11 +245,11 @@ def get_custom_styles():
     </style>
     """
 
-def get_video_background(video_b64):
+def get_video_background(video_src):
     """
     Returns the HTML/CSS for a persistent video background.
     """
-    if not video_b64:
+    if not video_src:
         return ""
     return f"""
     <style>
@@ -226,7 +270,7 @@ def get_video_background(video_b64):
     }}
     </style>
     <video class="bgvideo" autoplay muted loop playsinline>
-        <source src="data:video/mp4;base64,{video_b64}" type="video/mp4">
+        <source src="{video_src}" type="video/mp4">
     </video>
     <div class="overlay"></div>
     """
@@ -313,6 +357,7 @@ def render_evaluation_report_header(analytics_data, key_prefix=""):
     Renders the top-level score as a Plotly Gauge Chart,
     plus the Overall Score and Pass/Fail metrics.
     """
+    import plotly.graph_objects as go
     total_score_data = analytics_data.get("total_score", {})
     percentage = total_score_data.get("percentage", 0.0)
     awarded = total_score_data.get("awarded", 0)
@@ -373,6 +418,9 @@ def render_analytics_charts(analytics_data, key_prefix=""):
     """
     Takes the analytics dictionary and renders Plotly charts.
     """
+    import pandas as pd
+    import plotly.graph_objects as go
+    import plotly.express as px
     if not analytics_data:
         st.info("No analytics data available for this evaluation.")
         return
@@ -469,10 +517,21 @@ def render_analytics_charts(analytics_data, key_prefix=""):
 
 
 # --- Page 1: Evaluation Page (For Teacher/Admin) ---
+@track_page("Evaluate", budget_ms=None)
 def display_evaluation_page(subject_name):
     """
     Renders the main evaluation workflow page.
     """
+    import pandas as pd
+    try:
+        from src.pipeline import run_document_pipelines, STAGE_LABELS
+        from src.answer_grader import grade_answers, GRADING_MODEL_NAME
+        from src.rate_limiter import get_limiter
+        from dashboard import save_evaluation_to_history
+    except ImportError as e:
+        st.error(f"Could not load the evaluation modules: {e}")
+        return
+
     st.header("🚀 Evaluate Paper")
     st.markdown(get_tab_animations(), unsafe_allow_html=True)
 
@@ -541,25 +600,37 @@ def display_evaluation_page(subject_name):
                         st.error("❌ Failed to save one or more uploaded files.")
                         return
 
-                    progress_bar.progress(10, text="Converting PDFs...")
+                    progress_bar.progress(10, text="Converting PDFs, extracting text and detecting diagrams...")
                     poppler_path = st.session_state.poppler_path
-                    q_images = convert_pdf_to_images(str(temp_q_path), str(poppler_path))
-                    k_images = convert_pdf_to_images(str(temp_k_path), str(poppler_path))
-                    s_images = convert_pdf_to_images(str(temp_s_path), str(poppler_path))
-
-                    progress_bar.progress(40, text="Extracting text (OCR)...")
-                    question_text = extract_text_from_images(q_images, api_key=api_key)
-                    key_text = extract_text_from_images(k_images, api_key=api_key)
-                    student_text = extract_text_from_images(s_images, api_key=api_key)
-                    
+
+                    def on_stage_complete(stage, done, total):
+                        # Stages fill 10% -> 80% of the bar; grading takes the rest
+                        pct = 10 + int(70 * done / total)
+                        progress_bar.progress(pct, text=f"{STAGE_LABELS.get(stage, stage)} ({done}/{total})")
+
+                    pipeline_results = run_document_pipelines(
+                        str(temp_q_path), str(temp_k_path), str(temp_s_path),
+                        api_key=api_key,
+                        poppler_path=str(poppler_path),
+                        diagram_dir="outputs/diagram_temp",
+                        on_stage_complete=on_stage_complete
+                    )
+                    question_text = pipeline_results["question_text"]
+                    key_text = pipeline_results["key_text"]
+                    student_text = pipeline_results["student_text"]
+                    diagram_count = pipeline_results["diagram_count"]
+                    skipped_pages = pipeline_results["skipped_pages"]
+                    cache_stats = pipeline_results["ocr_cache_stats"]
+                    skipped_note = (f" · Blank pages skipped: {', '.join(map(str, skipped_pages))}"
+                                    if skipped_pages else "")
+                    status_text.caption(
+                        f"OCR cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+                        f"({cache_stats['entries']} documents cached){skipped_note}"
+                    )
+
                     st.session_state.question_text = question_text
                     st.session_state.key_text = key_text
                     st.session_state.student_text = student_text
-                    
-                    # --- MODIFICATION: Removed st.snow() ---
-
-                    progress_bar.progress(70, text="Detecting diagrams...")
-                    diagram_count = detect_diagrams(temp_s_path, "outputs/diagram_temp")
                     st.session_state.diagram_count = diagram_count
 
                     progress_bar.progress(80, text=" Applying grading rules...")
@@ -576,17 +647,12 @@ def display_evaluation_page(subject_name):
                     st.session_state.evaluation_report = evaluation_report_md
                     st.session_state.evaluation_complete = True
 
-                    save_data = {
-                        "usn": usn,
-                        "subject": subject_name,
-                        "evaluated_by": st.session_state.username,
-                        "timestamp": datetime.now().isoformat(),
-                        "diagram_count": diagram_count,
-                        "evaluation_report": evaluation_report_md,
-                        "analytics_data": analytics_data
-                    }
+                    save_data = build_evaluation_record(
+                        usn, subject_name, st.session_state.username, diagram_count,
+                        evaluation_report_md, analytics_data, skipped_pages=skipped_pages
+                    )
                     
-                    save_path = f"outputs/scores/{usn}.json"
+                    save_path = score_path(usn, subject=subject_name)
                     save_evaluation_to_history(save_data, save_path)
                     
                     progress_bar.progress(100, text="✅ Evaluation completed!")
@@ -594,6 +660,12 @@ def display_evaluation_page(subject_name):
                     # --- THIS IS THE "POP-UP" MESSAGE ---
                     st.success(f"🎉 Evaluation for {usn} completed!")
                     st.info("Switch to the 'Evaluation Report' or 'Analytics' tab to see results.")
+                    api_stats = get_limiter(GRADING_MODEL_NAME).stats()
+                    st.caption(
+                        f"Gemini API (this server): {api_stats['calls']} calls, {api_stats['retries']} retries, "
+                        f"{api_stats['rate_limited']} rate-limited, {api_stats['throttled_seconds']:.1f}s throttled, "
+                        f"{api_stats['backoff_seconds']:.1f}s backing off"
+                    )
 
                 except Exception as e:
                     st.error(f"❌ Error during evaluation: {str(e)}")
@@ -654,17 +726,147 @@ def display_evaluation_page(subject_name):
         else:
             st.info("👆 Run an evaluation to see extracted text.")
 
+# --- Page 1b: Batch Evaluation Page (For Teacher/Admin) ---
+@track_page("Batch", budget_ms=None)
+def display_batch_evaluation_page(subject_name):
+    """
+    Grades every answer sheet in a directory against one
+    question paper and answer key.
+    """
+    import pandas as pd
+    try:
+        from src.batch_evaluation import run_batch_evaluation, find_answer_sheets, DEFAULT_SHEETS_DIR, DEFAULT_MAX_WORKERS
+        from src.prompt_cache import get_prefix_registry, token_savings, describe_savings
+    except ImportError as e:
+        st.error(f"Could not load the evaluation modules: {e}")
+        return
+
+    st.header("📚 Batch Evaluate")
+    st.markdown("Grade a whole class at once. Each sheet must be named `<USN>.pdf`.")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        uploaded_question_paper = st.file_uploader("1. Question Paper", type=["pdf"], key="batch_question_paper")
+    with col2:
+        uploaded_answer_key = st.file_uploader("2. Answer Key", type=["pdf"], key="batch_answer_key")
+
+    sheets_dir = st.text_input("3. Answer Sheets Folder", value=DEFAULT_SHEETS_DIR, key="batch_sheets_dir")
+    try:
+        sheet_count = len(find_answer_sheets(sheets_dir))
+        st.caption(f"Found {sheet_count} answer sheets.")
+    except FileNotFoundError:
+        sheet_count = 0
+        st.caption("Folder not found.")
+
+    col_mode, col_workers = st.columns(2)
+    with col_mode:
+        mode = st.radio("Evaluation Mode", ["Moderate", "Lenient", "Strict"], key="batch_mode_input", horizontal=True)
+    with col_workers:
+        max_workers = st.slider("Students graded in parallel", 1, 8, DEFAULT_MAX_WORKERS, key="batch_workers_input")
+
+    scoring_rules = st.text_area("4. Scoring Rubrics & Rules", height=120, key="batch_rules_input")
+    resume = st.checkbox(
+        "Resume previous run (skip students already graded for this subject)",
+        value=True, key="batch_resume_input"
+    )
+    st.divider()
+
+    if st.button("🚀 Start Batch Evaluation", type="primary", use_container_width=True):
+        if not st.session_state.get("api_key"):
+            st.error("❌ Please enter your API Key in the sidebar under Settings.")
+        elif not (uploaded_question_paper and uploaded_answer_key):
+            st.error("❌ Please upload the question paper and answer key.")
+        elif not sheet_count:
+            st.error("❌ No answer sheets found in that folder.")
+        else:
+            temp_q_path = save_uploaded_file(uploaded_question_paper, "data/temp_q.pdf")
+            temp_k_path = save_uploaded_file(uploaded_answer_key, "data/temp_k.pdf")
+            if not (temp_q_path and temp_k_path):
+                st.error("❌ Failed to save one or more uploaded files.")
+                return
+
+            progress_bar = st.progress(0, text="Reading question paper and answer key...")
+            log_area = st.empty()
+            log_lines = []
+
+            def on_student_complete(summary, done, total):
+                if summary["status"] == "done":
+                    log_lines.append(f"✅ {summary['usn']}: {summary['percentage']}% ({summary['seconds']}s)")
+                else:
+                    log_lines.append(f"❌ {summary['usn']}: {summary['error']}")
+                progress_bar.progress(int(100 * done / total), text=f"Graded {done}/{total} students")
+                log_area.text("\n".join(log_lines[-10:]))
+
+            try:
+                prompt_stats_before = get_prefix_registry().stats()
+                summaries = run_batch_evaluation(
+                    temp_q_path, temp_k_path, api_key=st.session_state.api_key,
+                    subject=subject_name, evaluated_by=st.session_state.username,
+                    rules=scoring_rules, mode=mode, sheets_dir=sheets_dir,
+                    poppler_path=st.session_state.get("poppler_path"),
+                    max_workers=max_workers, resume=resume, on_student_complete=on_student_complete
+                )
+                st.session_state.batch_summaries = summaries
+                st.session_state.batch_id = make_batch_id(temp_q_path, temp_k_path, subject_name, mode, sheets_dir)
+                failed = sum(1 for s in summaries if s["status"] != "done")
+                if summaries:
+                    st.success(f"🎉 Batch complete: {len(summaries) - failed} graded, {failed} failed.")
+                    savings = token_savings(prompt_stats_before, get_prefix_registry().stats())
+                    st.caption(f"Prompt caching: {describe_savings(savings)}")
+                else:
+                    st.info("Nothing to grade - every student in this folder is already done.")
+            except Exception as e:
+                st.error(f"❌ Error during batch evaluation: {str(e)}")
+                st.code(traceback.format_exc())
+
+    # Job state is read back from the durable queue, so it survives reruns and restarts
+    if st.session_state.get("batch_id"):
+        st.subheader("Batch Job Status")
+        queue = JobQueue()
+        counts = queue.counts(st.session_state.batch_id)
+        cols = st.columns(len(counts))
+        for col, (state, count) in zip(cols, counts.items()):
+            col.metric(state.title(), count)
+        with st.expander("All jobs"):
+            st.dataframe(pd.DataFrame(queue.jobs(st.session_state.batch_id)), use_container_width=True)
+
+    if st.session_state.get("batch_summaries"):
+        st.subheader("Last Batch Results")
+        st.dataframe(pd.DataFrame(st.session_state.batch_summaries), use_container_width=True)
+
+
+# --- Render Budget Panel ---
+def render_budget_panel():
+    """Shows how long each page and section took in this rerun."""
+    report = current_report()
+    with st.sidebar.expander("⏱️ Render Budget"):
+        for page in report["pages"]:
+            st.markdown(f"**{page['name']}**: {page['total_ms']:.0f} ms")
+            for section, ms in page["sections"].items():
+                st.caption(f"{section}: {ms:.1f} ms")
+        for warning in report["warnings"]:
+            st.warning(warning)
+
+
 # --- Page 2: Dashboard Page (For Teacher/Admin) ---
 def display_dashboard_page(subject_name):
     """Renders the dashboard page."""
+    try:
+        from dashboard import display_dashboard
+    except ImportError as e:
+        st.error(f"Failed to import dashboard: {e}. Make sure dashboard.py is in the same folder.")
+        return
     display_dashboard(subject_name)
 
 
 # --- Page 3: Feedback Page (For Teacher/Admin) ---
+@track_page("Feedback")
 def display_feedback_page():
     """
     Renders a page for teachers/admins to review all feedback.
     """
+    import pandas as pd
+    import plotly.graph_objects as go
     st.header("✉️ Feedback Hub")
     st.markdown("Review feedback submitted by students and teachers.")
     
@@ -747,10 +949,12 @@ def display_feedback_page():
 
 
 # --- Page 4: Student View ---
+@track_page("Student View")
 def display_student_view():
     """
     Renders the student-facing dashboard.
     """
+    import pandas as pd
     usn = st.session_state.username
     st.header(f"🧑‍🎓 Welcome, {usn}")
     
@@ -759,20 +963,19 @@ def display_student_view():
         st.button("Logout", on_click=logout, use_container_width=True)
     st.divider()
 
-    record_path = f"outputs/scores/{usn}.json"
-    
-    if not os.path.exists(record_path):
-        st.info("⏳ Awaiting Evaluation. Your paper has not been graded yet.")
-        st.markdown("Please check back later.")
-        return
-        
     try:
-        with open(record_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        # Newest record across all subjects/exams
+        records = get_store().by_usn(usn)
     except Exception as e:
         st.error(f"Could not load your report. Error: {e}")
         return
 
+    if not records:
+        st.info("⏳ Awaiting Evaluation. Your paper has not been graded yet.")
+        st.markdown("Please check back later.")
+        return
+    data = records[0]
+
     st.markdown(get_tab_animations(), unsafe_allow_html=True)
     tab_report, tab_analytics, tab_feedback = st.tabs([
         "📊 Evaluation Report", 
@@ -838,6 +1041,7 @@ def display_student_view():
 
 
 # --- Page 5: Settings Page (Now with API Key) ---
+@track_page("Settings")
 def display_settings_page():
     """
     A page for settings, including the new API Key input.
@@ -864,6 +1068,8 @@ def display_settings_page():
 
 # --- Main Application Router ---
 def main():
+    begin_rerun()
+
     # --- Initialize all session state keys ---
     if 'evaluation_complete' not in st.session_state:
         st.session_state.evaluation_complete = False
@@ -892,24 +1098,17 @@ def main():
         page_icon="🤖"
     )
     
-    # --- Load Assets into Session State ONCE ---
-    if 'video_b64' not in st.session_state:
-        video_path = "assets/logo.mp4"
-        st.session_state.video_b64 = to_base_64(video_path)
+    # --- Load Assets (cached per process, shared by all sessions) ---
+    video_src = get_video_source(BACKGROUND_VIDEO_PATH)
     
-    if 'logo_header_html' not in st.session_state:
-        logo_path = "assets/logo.png"
-        logo_b64 = to_base_64(logo_path)
-        if logo_b64:
-            st.session_state.logo_header_html = get_logo_header(logo_b64)
-        else:
-            st.session_state.logo_header_html = "<h2>SMART EVAL</h2>" # Fallback
+    # login.py reads the header from the session; the HTML itself is built once per process
+    st.session_state.logo_header_html = logo_header_html(LOGO_PATH)
 
     # --- Apply Global Styles (Persistent Background) ---
     st.markdown(get_global_animations(), unsafe_allow_html=True)
     st.markdown(get_custom_styles(), unsafe_allow_html=True)
-    if st.session_state.video_b64:
-        st.markdown(get_video_background(st.session_state.video_b64), unsafe_allow_html=True)
+    if video_src:
+        st.markdown(get_video_background(video_src), unsafe_allow_html=True)
     
     # --- ROUTER LOGIC ---
     if not is_logged_in():
@@ -942,6 +1141,7 @@ def main():
                 page_options = {
                     "🏠 Dashboard": "Dashboard",
                     "🚀 Evaluate": "Evaluate",
+                    "📚 Batch Evaluate": "Batch",
                     "✉️ Feedback": "Feedback",
                     "⚙️ Settings": "Settings"
                 }
@@ -965,10 +1165,14 @@ def main():
                 display_dashboard_page(subject_name)
             elif page == "Evaluate":
                 display_evaluation_page(subject_name)
+            elif page == "Batch":
+                display_batch_evaluation_page(subject_name)
             elif page == "Feedback":
                 display_feedback_page()
             elif page == "Settings":
                 display_settings_page()
 
+            render_budget_panel()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,85 @@
+"""
+batch_evaluate.py - Headless class-wide evaluation for SmartEval
+
+Grades every <USN>.pdf in a directory against one question paper and
+answer key, writing outputs/scores/<subject>/<USN>.json as each student
+finishes.
+Re-running the same command resumes an interrupted batch; pass --fresh
+to re-grade everyone.
+
+Example:
+    python batch_evaluate.py --question data/question_paper.pdf \\
+        --key data/answer_key.pdf --sheets-dir data/answer_sheets \\
+        --subject "OS - Internal 1" --workers 3
+
+The API key is read from --api-key or the GOOGLE_API_KEY environment variable.
+"""
+
+import argparse
+import os
+import sys
+
+from src.batch_evaluation import run_batch_evaluation, DEFAULT_SHEETS_DIR, DEFAULT_MAX_WORKERS
+from src.answer_grader import GRADING_MODEL_NAME
+from src.rate_limiter import get_limiter
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Grade a directory of answer sheets with SmartEval.")
+    parser.add_argument("--question", required=True, help="Question paper PDF")
+    parser.add_argument("--key", required=True, help="Answer key PDF")
+    parser.add_argument("--sheets-dir", default=DEFAULT_SHEETS_DIR, help="Directory of <USN>.pdf answer sheets")
+    parser.add_argument("--subject", default="OS - Internal 1", help="Subject name stored with each record")
+    parser.add_argument("--mode", default="Moderate", choices=["Lenient", "Moderate", "Strict"])
+    parser.add_argument("--rules", default="", help="Scoring rules text")
+    parser.add_argument("--rules-file", help="Read scoring rules from this file instead of --rules")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS, help="Students graded at the same time")
+    parser.add_argument("--poppler-path", default=None, help="Poppler bin directory, if not on PATH")
+    parser.add_argument("--evaluated-by", default="batch", help="Name recorded as the evaluator")
+    parser.add_argument("--fresh", action="store_true",
+                        help="Re-grade every sheet instead of resuming the previous run")
+    parser.add_argument("--api-key", default=os.environ.get("GOOGLE_API_KEY", ""))
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.api_key:
+        print("An API key is required (--api-key or GOOGLE_API_KEY).")
+        return 2
+
+    rules = args.rules
+    if args.rules_file:
+        with open(args.rules_file, "r", encoding="utf-8") as f:
+            rules = f.read()
+
+    def report(summary, done, total):
+        if summary["status"] == "done":
+            print(f"[{done}/{total}] {summary['usn']}: {summary['percentage']}% in {summary['seconds']}s")
+        else:
+            print(f"[{done}/{total}] {summary['usn']}: FAILED - {summary['error']}")
+
+    try:
+        summaries = run_batch_evaluation(
+            args.question, args.key, api_key=args.api_key, subject=args.subject,
+            evaluated_by=args.evaluated_by, rules=rules, mode=args.mode,
+            sheets_dir=args.sheets_dir, poppler_path=args.poppler_path,
+            max_workers=args.workers, resume=not args.fresh, on_student_complete=report
+        )
+    except RuntimeError as e:
+        print(f"Batch aborted: {e}")
+        return 1
+
+    failed = [s["usn"] for s in summaries if s["status"] != "done"]
+    print(f"Batch complete: {len(summaries) - len(failed)} graded, {len(failed)} failed.")
+    api_stats = get_limiter(GRADING_MODEL_NAME).stats()
+    print(f"API: {api_stats['calls']} calls, {api_stats['retries']} retries, "
+          f"{api_stats['rate_limited']} rate-limited (concurrency now {api_stats['concurrency']}), "
+          f"{api_stats['throttled_seconds']:.1f}s throttled, {api_stats['backoff_seconds']:.1f}s backing off")
+    if failed:
+        print("Failed: " + ", ".join(failed))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+bench_batch_offline.py
+
+Load-tests the batch pipeline end to end with the offline stub model:
+rendering, diagram detection, OCR fan-out, the rate limiter, the OCR
+caches, grading, saving and the job queue all run for real; only the
+Gemini calls are replaced by `StubModel` with a fixed latency.
+
+Each worker count is run twice against fresh caches: "cold" (every page
+goes to the model) and "warm" (pages answered from the page cache).
+Scores, caches and the job queue live in a temporary directory, so
+nothing under outputs/ is touched.
+
+Usage:
+    python benchmarks/bench_batch_offline.py [--workers 1 3] [--latency 0.5]
+        [--failure-rate 0.0] [--rpm 6000] [--sheets-dir data/answer_sheets] [--limit N]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+repo_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(repo_root))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--question", default="data/question_paper.pdf")
+    parser.add_argument("--key", default="data/answer_key.pdf")
+    parser.add_argument("--sheets-dir", default="data/answer_sheets")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N sheets")
+    parser.add_argument("--latency", type=float, default=0.5, help="Stub seconds per model call")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of stub calls failing with 503")
+    parser.add_argument("--rpm", type=int, default=6000,
+                        help="Rate limiter requests/minute (use your real quota to see quota-bound throughput)")
+    parser.add_argument("--poppler-path", default=None)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 3])
+    args = parser.parse_args()
+
+    # Stub settings are read when the model is created, so set them first
+    os.environ["SMARTEVAL_STUB_LATENCY"] = str(args.latency)
+    os.environ["SMARTEVAL_STUB_JITTER"] = str(args.latency / 5)
+    os.environ["SMARTEVAL_STUB_FAILURE_RATE"] = str(args.failure_rate)
+    os.environ["SMARTEVAL_REQUESTS_PER_MINUTE"] = str(args.rpm)
+
+    from src import ocr_cache
+    from src.model_registry import set_backend
+    from src.ocr_extraction import OCR_MODEL_NAME
+    from src.batch_evaluation import run_batch_evaluation
+    from src.job_queue import JobQueue
+    from src.rate_limiter import get_limiter
+
+    set_backend("stub")
+    api_key = "offline"
+
+    work_dir = Path(tempfile.mkdtemp(prefix="smarteval-bench-"))
+    sheets_dir = work_dir / "sheets"
+    sheets_dir.mkdir()
+    sheets = sorted(Path(args.sheets_dir).glob("*.pdf"))[:args.limit]
+    for sheet in sheets:
+        shutil.copy(sheet, sheets_dir / sheet.name)
+
+    try:
+        for workers in args.workers:
+            cache_dir = work_dir / f"cache-{workers}"
+            ocr_cache.DOCUMENT_CACHE_DIR = str(cache_dir / "documents")
+            ocr_cache.PAGE_CACHE_DIR = str(cache_dir / "pages")
+
+            for run in ("cold", "warm"):
+                queue = JobQueue(str(work_dir / f"jobs-{workers}-{run}.db"))
+                limiter_before = get_limiter(OCR_MODEL_NAME).stats()
+                pages_before = ocr_cache.get_page_cache().stats()
+                started = time.perf_counter()
+                summaries = run_batch_evaluation(
+                    args.question, args.key, api_key=api_key, subject="Benchmark", evaluated_by="bench",
+                    sheets_dir=str(sheets_dir), poppler_path=args.poppler_path, max_workers=workers,
+                    scores_dir=str(work_dir / f"scores-{workers}-{run}"), resume=False, job_queue=queue
+                )
+                elapsed = time.perf_counter() - started
+                limiter_after = get_limiter(OCR_MODEL_NAME).stats()
+                done = sum(1 for s in summaries if s["status"] == "done")
+                calls = limiter_after["calls"] - limiter_before["calls"]
+                retries = limiter_after["retries"] - limiter_before["retries"]
+                pages_after = ocr_cache.get_page_cache().stats()
+                print(f"workers={workers} {run}: {done}/{len(summaries)} graded in {elapsed:.1f}s "
+                      f"({done / elapsed * 60:.1f} students/min), {calls} model calls, {retries} retries, "
+                      f"page cache {pages_after['hits'] - pages_before['hits']} hits / "
+                      f"{pages_after['misses'] - pages_before['misses']} misses")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+bench_import_time.py
+
+Measures the cold-start import cost of each kind of page using
+`python -X importtime`. Every scenario runs in a fresh interpreter, the
+same way the first session after `streamlit run app.py` pays for it.
+
+    login      importing app.py (what every page pays)
+    student    + what the student report view imports on first render
+    evaluate   + the OCR / grading / diagram pipeline
+
+Usage:
+    python benchmarks/bench_import_time.py [--runs 5] [--top 8]
+"""
+
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+repo_root = Path(__file__).resolve().parents[1]
+
+SCENARIOS = {
+    "login": ["app"],
+    "student": ["app", "pandas", "plotly.graph_objects", "plotly.express"],
+    "evaluate": ["app", "pandas", "plotly.graph_objects", "plotly.express", "dashboard",
+                 "src.pipeline", "src.answer_grader", "src.batch_evaluation"],
+}
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\| (\s*)(\S+)")
+
+
+def measure(modules):
+    """
+    Imports `modules` in a fresh interpreter. Returns the total import time
+    in ms and {module: cumulative ms} for the modules they pulled in directly.
+    """
+    code = "; ".join(f"import {m}" for m in modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=repo_root, capture_output=True, text=True, check=True
+    )
+    total_us, children = 0, {}
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        depth = len(match.group(3)) // 2
+        if depth == 0:
+            total_us += int(match.group(2))
+        elif depth == 1:
+            children[match.group(4)] = int(match.group(2)) / 1000
+    return total_us / 1000, children
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per scenario")
+    parser.add_argument("--top", type=int, default=8, help="Slowest top-level imports to list")
+    args = parser.parse_args()
+
+    for name, modules in SCENARIOS.items():
+        totals, children = [], {}
+        for _ in range(args.runs):
+            total_ms, children = measure(modules)
+            totals.append(total_ms)
+        print(f"{name:>9}: median {statistics.median(totals):7.0f} ms over {args.runs} runs")
+        for module, ms in sorted(children.items(), key=lambda kv: -kv[1])[:args.top]:
+            print(f"           {ms:7.1f} ms  {module}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+bench_ocr_batching.py
+
+Compares OCR with one page per request against several pages packed
+into each request (`pages_per_request`), using the offline stub model.
+
+Each sheet is rendered once up front; every batch size then OCRs the
+same page images with the page cache off, so each run reaches the model.
+The stub charges a fixed latency per call plus a smaller latency per
+extra image, which is what makes per-call overhead worth batching away.
+Set the two to match what you measure against the real API.
+
+For every batch size this reports model calls per sheet, the median
+sheet latency, and whether the text matches the one-page-per-request run.
+
+Usage:
+    python benchmarks/bench_ocr_batching.py [--batch-sizes 1 2 4 8] [--latency 1.0]
+        [--page-latency 0.15] [--concurrency 4] [--sheets-dir data/answer_sheets] [--limit N]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+repo_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(repo_root))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sheets-dir", default="data/answer_sheets")
+    parser.add_argument("--limit", type=int, default=3, help="Only use the first N sheets")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=list(range(1, 9)))
+    parser.add_argument("--latency", type=float, default=1.0, help="Stub seconds per model call")
+    parser.add_argument("--page-latency", type=float, default=0.15,
+                        help="Stub seconds per extra image in a request")
+    parser.add_argument("--concurrency", type=int, default=4, help="OCR requests in flight per sheet")
+    parser.add_argument("--rpm", type=int, default=6000, help="Rate limiter requests/minute")
+    args = parser.parse_args()
+
+    # Stub settings are read when the model is created, so set them first
+    os.environ["SMARTEVAL_STUB_LATENCY"] = str(args.latency)
+    os.environ["SMARTEVAL_STUB_JITTER"] = "0"
+    os.environ["SMARTEVAL_STUB_PAGE_LATENCY"] = str(args.page_latency)
+    os.environ["SMARTEVAL_REQUESTS_PER_MINUTE"] = str(args.rpm)
+
+    from src.model_registry import set_backend
+    from src.ocr_extraction import OCR_MODEL_NAME, extract_text_from_images
+    from src.page_rendering import render_pdf_pages
+    from src.rate_limiter import get_limiter
+
+    set_backend("stub")
+    sheets = sorted(Path(args.sheets_dir).glob("*.pdf"))[:args.limit]
+    rendered = {sheet.name: [(p.index, p.ocr_image) for p in render_pdf_pages(str(sheet), processes=1)]
+                for sheet in sheets}
+    page_count = sum(len(pages) for pages in rendered.values())
+    print(f"{len(sheets)} sheets, {page_count} pages, stub latency {args.latency}s "
+          f"+ {args.page_latency}s per extra image\n")
+
+    baseline = {}
+    results = []
+    for size in args.batch_sizes:
+        calls_before = get_limiter(OCR_MODEL_NAME).stats()["calls"]
+        latencies, matches = [], 0
+        for name, pages in rendered.items():
+            started = time.perf_counter()
+            text = extract_text_from_images(pages, api_key="offline", max_concurrency=args.concurrency,
+                                            use_page_cache=False, pages_per_request=size)
+            latencies.append(time.perf_counter() - started)
+            baseline.setdefault(name, text)
+            matches += text == baseline[name]
+        calls = get_limiter(OCR_MODEL_NAME).stats()["calls"] - calls_before
+        results.append((size, calls / len(sheets), statistics.median(latencies), matches))
+
+    print(f"\n{'pages/request':>13} {'calls/sheet':>12} {'median sheet s':>15} {'same text':>10}")
+    for size, calls_per_sheet, latency, matches in results:
+        print(f"{size:>13} {calls_per_sheet:>12.1f} {latency:>15.2f} {matches:>6}/{len(sheets)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+bench_page_encoding.py
+
+Compares the OCR upload per page for the original encoding (colour JPEG
+at 150 DPI, base64-encoded) with the "fixed" encoding sent as raw bytes
+and the "adaptive" encoding (cropped, grayscale, DPI/quality picked by
+ink density).
+
+For each encoding it reports the average and median bytes per page and
+the encode time. With --api-key, the first --ocr-pages pages are also
+OCR'd with both encodings (page cache off) and the adaptive text is
+compared with the fixed text, to check what the smaller upload costs in
+OCR accuracy.
+
+Usage:
+    python benchmarks/bench_page_encoding.py [--limit N] [--api-key KEY --ocr-pages 6] [pdf ...]
+
+With no PDFs given, every sheet in data/answer_sheets is used.
+"""
+
+import argparse
+import difflib
+import glob
+import statistics
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+repo_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(repo_root))
+
+import cv2  # noqa: E402
+import fitz  # noqa: E402
+
+from src.diagram_detection import pixmap_to_array  # noqa: E402
+from src.page_encoding import encode_page  # noqa: E402
+from src.page_rendering import DIAGRAM_DPI  # noqa: E402
+
+
+def base64_size(n: int) -> int:
+    return 4 * ((n + 2) // 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdfs", nargs="*")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N PDFs")
+    parser.add_argument("--api-key", default=None, help="Also compare OCR text (uses the real API)")
+    parser.add_argument("--ocr-pages", type=int, default=6, help="Pages to OCR with --api-key")
+    args = parser.parse_args()
+
+    pdfs = (args.pdfs or sorted(glob.glob(str(repo_root / "data" / "answer_sheets" / "*.pdf"))))[:args.limit]
+    if not pdfs:
+        print("No PDFs to benchmark.")
+        return
+
+    sizes = {"base64 (before)": [], "fixed": [], "adaptive": []}
+    seconds = {"fixed": 0.0, "adaptive": 0.0}
+    profiles = Counter()
+    samples = []  # (fixed, adaptive) images for the OCR comparison
+    zoom = DIAGRAM_DPI / 72
+    for pdf_path in pdfs:
+        with fitz.open(pdf_path) as pdf:
+            for i in range(pdf.page_count):
+                pix = pdf.load_page(i).get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+                rgb = pixmap_to_array(pix)
+                gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+                encoded = {}
+                for encoding in ("fixed", "adaptive"):
+                    started = time.perf_counter()
+                    encoded[encoding] = encode_page(rgb, DIAGRAM_DPI, gray=gray, encoding=encoding)
+                    seconds[encoding] += time.perf_counter() - started
+                    sizes[encoding].append(len(encoded[encoding].data))
+                sizes["base64 (before)"].append(base64_size(len(encoded["fixed"].data)))
+                adaptive = encoded["adaptive"]
+                profiles[(adaptive.dpi, adaptive.quality, adaptive.cropped)] += 1
+                if len(samples) < args.ocr_pages:
+                    samples.append((encoded["fixed"].data, adaptive.data))
+
+    pages = len(sizes["fixed"])
+    baseline = statistics.mean(sizes["base64 (before)"])
+    print(f"{len(pdfs)} PDFs, {pages} pages\n")
+    print(f"{'encoding':>16} {'avg KB/page':>12} {'median KB':>10} {'vs before':>10} {'encode ms/page':>15}")
+    for name, values in sizes.items():
+        encode_ms = seconds[name] / pages * 1000 if name in seconds else float("nan")
+        print(f"{name:>16} {statistics.mean(values) / 1024:>12.1f} {statistics.median(values) / 1024:>10.1f} "
+              f"{statistics.mean(values) / baseline:>9.0%} {encode_ms:>15.1f}")
+
+    print("\nAdaptive profiles (dpi, quality, cropped): pages")
+    for profile, count in profiles.most_common():
+        print(f"  {profile}: {count}")
+
+    if args.api_key:
+        from src.ocr_extraction import extract_text_from_images
+        ratios = []
+        for fixed, adaptive in samples:
+            fixed_text = extract_text_from_images([fixed], args.api_key, use_page_cache=False)
+            adaptive_text = extract_text_from_images([adaptive], args.api_key, use_page_cache=False)
+            ratios.append(difflib.SequenceMatcher(None, fixed_text, adaptive_text).ratio())
+        print(f"\nOCR text similarity, adaptive vs fixed over {len(ratios)} pages: "
+              f"mean {statistics.mean(ratios):.3f}, min {min(ratios):.3f}")
+
+
+if __name__ == "__main__":
+    main()
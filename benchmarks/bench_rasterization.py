@@ -0,0 +1,67 @@
+"""
+bench_rasterization.py
+
+Measures page rasterization throughput (pages/second) of the shared
+render stage for different numbers of worker processes and pages per
+worker task.
+
+Usage:
+    python benchmarks/bench_rasterization.py [--processes 1 2 4] [--pages-per-task 1 2 4] [pdf ...]
+
+With no PDFs given, every sheet in data/answer_sheets is used.
+"""
+
+import argparse
+import glob
+import sys
+import time
+from pathlib import Path
+
+repo_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(repo_root))
+
+from src.page_rendering import iter_rendered_pages, PAGES_PER_TASK  # noqa: E402
+
+
+def bench(pdfs, processes, pages_per_task):
+    pages = 0
+    first_page_latency = []
+    started = time.perf_counter()
+    for pdf in pdfs:
+        doc_started = time.perf_counter()
+        for i, _ in enumerate(iter_rendered_pages(pdf, processes=processes, pages_per_task=pages_per_task)):
+            if i == 0:
+                first_page_latency.append(time.perf_counter() - doc_started)
+            pages += 1
+    elapsed = time.perf_counter() - started
+    return pages, elapsed, sum(first_page_latency) / max(1, len(first_page_latency))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdfs", nargs="*")
+    parser.add_argument("--processes", nargs="+", type=int, default=[1, 2, 4])
+    parser.add_argument("--pages-per-task", nargs="+", type=int, default=[PAGES_PER_TASK])
+    args = parser.parse_args()
+
+    pdfs = args.pdfs or sorted(glob.glob(str(repo_root / "data" / "answer_sheets" / "*.pdf")))
+    if not pdfs:
+        print("No PDFs to benchmark.")
+        return
+
+    # Start the worker pools before timing so spawn start-up isn't counted
+    for processes in args.processes:
+        for _ in iter_rendered_pages(pdfs[0], processes=processes):
+            pass
+
+    print(f"{len(pdfs)} PDFs")
+    print(f"{'processes':>9}  {'pages/task':>10}  {'pages':>6}  {'seconds':>8}  {'pages/s':>8}  {'first page (s)':>14}")
+    for processes in args.processes:
+        for pages_per_task in (args.pages_per_task if processes > 1 else [1]):
+            pages, elapsed, first = bench(pdfs, processes, pages_per_task)
+            print(f"{processes:>9}  {pages_per_task:>10}  {pages:>6}  {elapsed:>8.2f}  {pages / elapsed:>8.2f}  "
+                  f"{first:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,23 +5,69 @@ Handles the final evaluation by sending extracted text to the Gemini API.
 --- MODIFIED ---
 - The prompt now requests a new "detailed_breakdown" key in the JSON for a table.
 - The prompt for the Markdown report is now focused only on the summary.
+- The prompt is split into a prefix shared by the whole class (question paper,
+  key, rules, philosophy) and a per-student part, so the prefix can be cached
+  (see prompt_cache.py).
+- Grading uses Gemini's JSON output mode with a response schema (see
+  grading_schema.py); the report travels inside the JSON. Answers that still
+  fail validation get one cheap "reformat" request instead of a re-grade.
 """
 
 import os
 import google.generativeai as genai
+from google.api_core import exceptions as api_exceptions
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
 import streamlit as st
-import json
-import re
+
+from src.model_registry import get_client, get_model, get_cached_model
+from src.rate_limiter import call_with_retry, get_limiter
+from src.prompt_cache import get_prefix_registry
+from src.grading_schema import (
+    RESPONSE_SCHEMA, MAX_RESPONSE_CHARS, AnalyticsError, GradingResponse, parse_grading_json, parse_grading_response
+)
+
+# Use the old model names compatible with your library (v0.8.5)
+GRADING_MODEL_NAME = "models/gemini-2.5-flash-preview-09-2025"
+
+GENERATION_CONFIG = genai.types.GenerationConfig(  # pyright: ignore[reportPrivateImportUsage]
+    temperature=0.3,
+)
+
+# Schema-enforced JSON answers; set SMARTEVAL_STRUCTURED_OUTPUT=0 for the older
+# ```json block + Markdown layout
+STRUCTURED_OUTPUT = os.environ.get("SMARTEVAL_STRUCTURED_OUTPUT", "1") != "0"
+
+JSON_GENERATION_CONFIG = genai.types.GenerationConfig(  # pyright: ignore[reportPrivateImportUsage]
+    temperature=0.3,
+    response_mime_type="application/json",
+    response_schema=RESPONSE_SCHEMA,
+)
+
+# Asks the model to restate an answer that failed validation, without re-grading
+REPAIR_PROMPT = """
+    The grading output below could not be read. Rewrite it as one JSON object with an
+    "analytics" field and a "report" field (the Markdown feedback summary), following the
+    response schema. Keep every mark, total and piece of feedback exactly as given; do not
+    grade again, and do not invent marks that are not in the output.
+    ---
+    {raw_text}
+"""
+
+SAFETY_SETTINGS = {
+    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+}
 
 def initialize_gemini(api_key):
-    """Initializes and configures the Gemini client."""
+    """Checks the API key and sets up the shared Gemini client for it."""
     try:
         if not api_key:
             st.error("API Key is missing. Please add it on the 'Settings' page.")
             return False
         
-        genai.configure(api_key=api_key)  # pyright: ignore[reportPrivateImportUsage]
+        get_client(api_key)  # Created once per key and reused by every call
         return True
     except Exception as e:
         st.error(f"Error configuring Gemini API: {e}")
@@ -29,88 +75,72 @@ def initialize_gemini(api_key):
 
 def parse_ai_response(raw_text: str) -> dict:
     """
-    Parses the raw text output from the AI, separating the JSON
-    analytics block from the markdown report.
+    Parses the raw text output from the AI into {"report", "analytics"}.
+    Accepts structured JSON answers and the older ```json block + Markdown
+    layout; the analytics are validated (see `grading_schema`).
     """
-    analytics = {}
-    report = "Error: Could not parse AI response."
-    
     try:
-        # Regex to find the JSON block
-        json_match = re.search(r"```json\n({.*?})\n```", raw_text, re.DOTALL)
-        
-        if json_match:
-            json_string = json_match.group(1)
-            analytics = json.loads(json_string)
-            # The report is everything *outside* the JSON block
-            report = raw_text.replace(json_match.group(0), "").strip()
-        else:
-            # If no JSON block is found, assume the entire output is the report
-            report = raw_text
-            
-    except json.JSONDecodeError:
-        st.warning("Could not decode analytics JSON from response. Analytics may be unavailable.")
-        report = raw_text # Still return the raw text as the report
-    except Exception as e:
-        st.error(f"Error parsing response: {e}")
-        report = raw_text
+        return _as_dict(parse_grading_response(raw_text))
+    except AnalyticsError as e:
+        st.warning(f"Could not read analytics from the response ({e}). Analytics may be unavailable.")
+        # Still return the raw text as the report
+        return {"report": raw_text, "analytics": {}}
 
-    return {"report": report, "analytics": analytics}
+def _as_dict(result: GradingResponse) -> dict:
+    return {"report": result.report, "analytics": result.analytics.to_dict()}
 
 
-# --- MODIFIED: Function now accepts 'api_key' ---
-def grade_answers(question_text: str, key_text: str, student_text: str, rules: str, mode: str, diagram_count: int, api_key: str) -> dict:
-    """
-    Performs the final evaluation based on extracted text.
-    """
-    print("Starting final grading evaluation...")
-    
-    # Initialize the API client
-    if not initialize_gemini(api_key):
-        return {"report": "API Key configuration failed.", "analytics": {}}
-
-    # Use the old model names compatible with your library (v0.8.5)
-    GRADING_MODEL = genai.GenerativeModel("models/gemini-2.5-flash-preview-09-2025")  # pyright: ignore[reportPrivateImportUsage]
-    
-    GENERATION_CONFIG = genai.types.GenerationConfig(  # pyright: ignore[reportPrivateImportUsage]
-        temperature=0.3,
-    )
-
-    SAFETY_SETTINGS = {
-        HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-        HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-        HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-    }
-
-    # --- Dynamic Grading Philosophy ---
-    philosophy_text = ""
+def _philosophy_text(mode: str) -> str:
+    """The grading philosophy for a mode ("Lenient", "Moderate" or "Strict")."""
     if mode == "Lenient":
-        philosophy_text = """
+        return """
         - **Philosophy:** Be generous. Award partial credit for any reasonable attempt.
         - **Keywords:** If the student's answer shows they understand the core concept, award most of the marks, even if they miss specific keywords.
         - **Errors:** Be very tolerant of OCR errors, spelling mistakes, and different phrasing.
         - **Partials:** Grant credit for partially correct answers.
         """
     elif mode == "Strict":
-        philosophy_text = """
+        return """
         - **Philosophy:** Be precise. Adhere closely to the answer key for full credit.
         - **Keywords:** Award marks based on the presence of specific keywords from the answer key.
         - **Errors:** Full marks require all details. Incomplete or incorrect answers should receive reduced credit.
         - **Partials:** Award credit only for parts of the answer that are fully correct and complete.
         """
     else: # Moderate (Default)
-        philosophy_text = """
+        return """
         - **Philosophy:** Be balanced and fair. This is a standard university-level grading.
         - **Keywords:** The student must include the main keywords, but allow for some phrasing flexibility.
         - **Errors:** Tolerate minor spelling or OCR errors, but deduct for clear conceptual mistakes.
         - **Partials:** Grant partial credit where deserved, but do not be overly generous.
         """
-    # --- END NEW LOGIC ---
 
-    # --- MODIFIED: Prompt now includes the detailed philosophy ---
-    prompt = f"""
+def _structured_task(mode: str) -> str:
+    """Output instructions for schema-enforced JSON answers."""
+    return f"""
+        **TASK:**
+        Respond with one JSON object that follows the response schema, with two fields:
+        1.  "analytics": the detailed analytics.
+            - "required_estimate" is your best guess of required diagrams from the key.
+            - "found_estimate" is your best guess of how many the student drew (using the detected diagram count as a hint).
+            - "detailed_breakdown" MUST contain one entry for each sub-part of each question the student attempted. "description" should be a 2-5 word summary of the answer key concept.
+        2.  "report": the full, student-facing *feedback summary* in Markdown.
+            - Provide a brief summary of the performance *based on the {mode} philosophy*.
+            - Mention diagram performance, using the detected diagram count as a reference.
+            - Conclude with a "Strengths" section (bullet points).
+            - Conclude with an "Areas for Improvement" section (bullet points).
+            - **DO NOT** include the overall score or the detailed table in this report.
+    """
+
+def build_grading_prefix(question_text: str, key_text: str, rules: str, mode: str,
+                         structured: bool = STRUCTURED_OUTPUT) -> str:
+    """
+    The part of the grading prompt shared by every student of an exam. It
+    must not depend on anything student-specific, so it can be cached.
+    """
+    task = _structured_task(mode) if structured else _text_task(mode)
+    return f"""
         You are an expert teaching assistant. Your task is to grade a student's answer sheet.
+        The student's answer sheet and the diagram count are given at the end.
 
         Here is the Question Paper:
         ---
@@ -122,24 +152,19 @@ def grade_answers(question_text: str, key_text: str, student_text: str, rules: s
         {key_text}
         ---
 
-        Here is the Student's Handwritten Answer Sheet:
-        ---
-        {student_text}
-        ---
-
-        Here is an analysis from a separate diagram detection tool:
-        - Potential diagrams found: {diagram_count}
-        ---
-
         Here are the critical Scoring Rules & Question Structure:
         - {rules or "No specific rules provided. Assume all questions are mandatory and in order."}
         ---
 
         **CRITICAL GRADING PHILOSOPHY (MODE: {mode})**
         You MUST follow this philosophy while grading:
-        {philosophy_text}
+        {_philosophy_text(mode)}
         ---
+        {task}"""
 
+def _text_task(mode: str) -> str:
+    """Output instructions for the older ```json block + Markdown layout."""
+    return f"""
         **TASK:**
         Provide two things:
         1.  A structured JSON object with detailed analytics.
@@ -161,31 +186,109 @@ def grade_answers(question_text: str, key_text: str, student_text: str, rules: s
             ]
         }}
         - "required_estimate" is your best guess of required diagrams from the key.
-        - "found_estimate" is your best guess of how many the student drew (using the {diagram_count} as a hint).
+        - "found_estimate" is your best guess of how many the student drew (using the detected diagram count as a hint).
         - "detailed_breakdown" MUST contain one entry for each sub-part of each question the student attempted. "description" should be a 2-5 word summary of the answer key concept.
 
         **Markdown Report (Task 2):**
         After the JSON block, write the full, student-facing *feedback summary* in Markdown.
         - Provide a brief summary of the performance *based on the {mode} philosophy*.
-        - Mention diagram performance, using the {diagram_count} count as a reference.
+        - Mention diagram performance, using the detected diagram count as a reference.
         - Conclude with a "Strengths" section (bullet points).
         - Conclude with an "Areas for Improvement" section (bullet points).
         - **DO NOT** include the overall score or the detailed table in this markdown report.
+    """
+
+def build_student_prompt(student_text: str, diagram_count: int, structured: bool = STRUCTURED_OUTPUT) -> str:
+    """The per-student part of the grading prompt, sent after the shared prefix."""
+    closing = "Respond with the JSON object only." if structured else "Begin your response with the JSON block."
+    return f"""
+        Here is the Student's Handwritten Answer Sheet:
+        ---
+        {student_text}
+        ---
+
+        Here is an analysis from a separate diagram detection tool:
+        - Potential diagrams found: {diagram_count}
+        ---
 
-        Begin your response with the JSON block.
+        {closing}
     """
+
+def _generate_grading(api_key: str, prefix: str, student_prompt: str, structured: bool = STRUCTURED_OUTPUT):
+    """
+    Sends one grading request. A reused prefix is served from a context
+    cache when one is available; otherwise the whole prompt is sent, prefix
+    first (see `prompt_cache`).
+    """
+    config = JSON_GENERATION_CONFIG if structured else GENERATION_CONFIG
+    registry = get_prefix_registry()
+    entry = registry.register(api_key, GRADING_MODEL_NAME, prefix)
+    limiter = get_limiter(GRADING_MODEL_NAME)
+
+    cache_name = registry.context_cache(api_key, GRADING_MODEL_NAME, entry, prefix)
+    if cache_name:
+        model = get_cached_model(api_key, cache_name, GRADING_MODEL_NAME, config, SAFETY_SETTINGS)
+        try:
+            response = call_with_retry(model.generate_content, student_prompt, limiter=limiter)
+            registry.record_usage(response, used_context_cache=True)
+            return response
+        except (api_exceptions.NotFound, api_exceptions.PermissionDenied) as e:
+            # The cache expired or was deleted under us; send the full prompt instead
+            print(f"Context cache {cache_name} unavailable ({e}); sending the full prompt")
+            registry.invalidate(entry)
+
+    # Shared per process; the generation config and safety settings are the model's defaults
+    model = get_model(api_key, GRADING_MODEL_NAME, config, SAFETY_SETTINGS)
+    response = call_with_retry(model.generate_content, prefix + student_prompt, limiter=limiter)
+    registry.record_usage(response)
+    return response
+
+def _repair_grading(api_key: str, raw_text: str) -> dict:
+    """
+    Asks the model to restate an unreadable grading answer in the response
+    schema. This sends only the answer, not the exam, so it costs a fraction
+    of a re-grade. Raises AnalyticsError if the restated answer is unusable too.
+    """
+    model = get_model(api_key, GRADING_MODEL_NAME, JSON_GENERATION_CONFIG, SAFETY_SETTINGS)
+    prompt = REPAIR_PROMPT.format(raw_text=raw_text[:MAX_RESPONSE_CHARS])
+    response = call_with_retry(model.generate_content, prompt, limiter=get_limiter(GRADING_MODEL_NAME))
+    if not response.parts:
+        raise AnalyticsError("The reformat request returned no text")
+    return _as_dict(parse_grading_json(response.text))
+
+
+# --- MODIFIED: Function now accepts 'api_key' ---
+def grade_answers(question_text: str, key_text: str, student_text: str, rules: str, mode: str, diagram_count: int, api_key: str) -> dict:
+    """
+    Performs the final evaluation based on extracted text.
+    """
+    print("Starting final grading evaluation...")
+    
+    # Initialize the API client
+    if not initialize_gemini(api_key):
+        return {"report": "API Key configuration failed.", "analytics": {}}
+
+    # The question paper, key, rules and philosophy are the same for the whole
+    # class, so they form a prefix that can be cached between students
+    prefix = build_grading_prefix(question_text, key_text, rules, mode)
+    student_prompt = build_student_prompt(student_text, diagram_count)
     
     try:
-        response = GRADING_MODEL.generate_content(
-            prompt,
-            generation_config=GENERATION_CONFIG, 
-            safety_settings=SAFETY_SETTINGS
-        )
+        response = _generate_grading(api_key, prefix, student_prompt)
         
         if response.parts:
             print("Grading successful.")
-            # Parse the raw text to separate JSON and Markdown
-            return parse_ai_response(response.text)
+            raw_text = response.text
+            try:
+                return _as_dict(parse_grading_response(raw_text))
+            except AnalyticsError as e:
+                # The grading itself is done; only its layout is off
+                print(f"Grading answer failed validation ({e}); asking for a reformat")
+            try:
+                return _repair_grading(api_key, raw_text)
+            except Exception as e:
+                print(f"Reformat request failed ({e}); keeping the answer as the report")
+                return parse_ai_response(raw_text)
         else:
             reason = response.candidates[0].finish_reason if response.candidates else "Unknown"
             print(f"Grading failed. Finish Reason: {reason}")
@@ -195,4 +298,4 @@ def grade_answers(question_text: str, key_text: str, student_text: str, rules: s
         print(f"An error occurred during grading: {e}")
         st.error(f"Error (Grading): {e}")
         # Return error in the expected format
-        return {"report": f"Error (Grading): {e}", "analytics": {}}
\ No newline at end of file
+        return {"report": f"Error (Grading): {e}", "analytics": {}}
@@ -0,0 +1,170 @@
+"""
+batch_evaluation.py
+
+Grades a whole class in one go: one question paper, one answer key and
+a directory of student sheets named <USN>.pdf.
+
+The question paper and answer key are read once (through the OCR
+cache), then students are pushed through a worker pool with a bounded
+number of students in flight. Each student's record is written to
+outputs/scores/<subject>/<USN>.json as soon as that student finishes.
+
+Progress is tracked per student in the durable job queue, so running
+the same batch again resumes where a crashed or interrupted run stopped
+and skips students who already have a valid record.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Optional
+
+from src.answer_grader import grade_answers
+from src.pipeline import run_stage_graph, ocr_document_cached, read_student_sheet
+from src.page_rendering import debug_dump_dir
+from src.evaluation_store import (
+    SCORES_DIR, score_path, build_evaluation_record, save_evaluation, has_valid_score
+)
+from src.ocr_cache import is_cacheable_text
+from src.job_queue import JobQueue, make_batch_id, OCR, GRADING, DONE, FAILED
+from src.prompt_cache import get_prefix_registry, token_savings, describe_savings
+
+DEFAULT_SHEETS_DIR = "data/answer_sheets"
+DEFAULT_MAX_WORKERS = 3
+DIAGRAM_TEMP_DIR = "outputs/diagram_temp"
+
+
+def find_answer_sheets(sheets_dir: str = DEFAULT_SHEETS_DIR) -> list[tuple[str, str]]:
+    """
+    Lists (usn, pdf_path) for every PDF in `sheets_dir`, sorted by USN.
+    The USN is taken from the file name, e.g. 2C30309.pdf -> 2C30309.
+    """
+    if not os.path.isdir(sheets_dir):
+        raise FileNotFoundError(f"Answer sheet directory not found: {sheets_dir}")
+
+    sheets = []
+    for fname in os.listdir(sheets_dir):
+        stem, ext = os.path.splitext(fname)
+        if ext.lower() == ".pdf" and stem:
+            sheets.append((stem.upper(), os.path.join(sheets_dir, fname)))
+    return sorted(sheets)
+
+
+def evaluate_student(usn: str, sheet_path: str, question_text: str, key_text: str,
+                     rules: str, mode: str, api_key: str, subject: str, evaluated_by: str,
+                     scores_dir: str = SCORES_DIR, on_state: Optional[Callable[[str], None]] = None) -> dict:
+    """
+    OCRs and grades a single student sheet against already-extracted
+    question/key text, saves the record and returns it. `on_state` is
+    called with the job state ("ocr", "grading") as each phase starts.
+
+    Raises RuntimeError if grading did not produce any analytics, so a
+    failed student is reported instead of being saved as a zero.
+    """
+    if on_state:
+        on_state(OCR)
+    # Each student gets its own debug folder so parallel workers don't clash
+    results = read_student_sheet(sheet_path, api_key, debug_dump_dir(os.path.join(DIAGRAM_TEMP_DIR, usn)))
+
+    if on_state:
+        on_state(GRADING)
+    grading = grade_answers(
+        question_text, key_text, results["student_text"], rules, mode,
+        results["diagram_count"], api_key=api_key
+    )
+    analytics_data = grading.get("analytics", {})
+    if not analytics_data:
+        raise RuntimeError(grading.get("report", "Grading returned no analytics."))
+
+    record = build_evaluation_record(
+        usn, subject, evaluated_by, results["diagram_count"],
+        grading.get("report", "Error: No report found."), analytics_data,
+        skipped_pages=results["skipped_pages"]
+    )
+    save_evaluation(record, score_path(usn, scores_dir, subject), scores_dir)
+    return record
+
+
+def run_batch_evaluation(question_pdf: str, key_pdf: str, api_key: str, subject: str,
+                         evaluated_by: str, rules: str = "", mode: str = "Moderate",
+                         sheets_dir: str = DEFAULT_SHEETS_DIR, poppler_path: Optional[str] = None,
+                         max_workers: int = DEFAULT_MAX_WORKERS, scores_dir: str = SCORES_DIR,
+                         resume: bool = True, job_queue: Optional[JobQueue] = None,
+                         on_student_complete: Optional[Callable[[dict, int, int], None]] = None) -> list[dict]:
+    """
+    Grades every sheet in `sheets_dir` that still needs grading and
+    returns one summary per student graded in this run:
+    {"usn", "status": "done"|"failed", "seconds", "percentage"|"error"}.
+
+    With `resume` (the default), students holding a valid record for
+    `subject` are skipped and interrupted or failed jobs are retried. With
+    `resume=False` every sheet is re-graded.
+
+    `on_student_complete(summary, done, total)` is called from the calling
+    thread as each student finishes.
+
+    Raises RuntimeError before grading anyone if the question paper or
+    answer key could not be read completely.
+    """
+    sheets = find_answer_sheets(sheets_dir)
+    if not sheets:
+        return []
+
+    queue = job_queue or JobQueue()
+    batch_id = make_batch_id(question_pdf, key_pdf, subject, mode, sheets_dir)
+    if resume:
+        already_done = {usn for usn, _ in sheets if has_valid_score(usn, subject, scores_dir)}
+        queue.enqueue(batch_id, sheets, already_done=already_done)
+    else:
+        queue.enqueue(batch_id, sheets)
+        queue.reset(batch_id)
+
+    todo = queue.pending(batch_id)
+    print(f"Batch {batch_id}: {len(todo)} of {len(sheets)} sheets to grade from {sheets_dir} "
+          f"({max_workers} at a time)")
+    if not todo:
+        return []
+
+    # Question paper and answer key are shared by the whole class: read them once
+    shared = run_stage_graph({
+        "question_text": (lambda: ocr_document_cached(question_pdf, api_key, poppler_path), []),
+        "key_text": (lambda: ocr_document_cached(key_pdf, api_key, poppler_path), []),
+    })
+    # Grading the class against a half-read paper or key would save records
+    # that look valid, and resume would then skip those students for good
+    for name, label in (("question_text", "question paper"), ("key_text", "answer key")):
+        if not is_cacheable_text(shared[name]):
+            raise RuntimeError(f"Could not read the {label}, so no students were graded: "
+                               f"{shared[name][:200] or 'no text extracted'}")
+
+    def grade_one(usn, sheet_path):
+        started = time.perf_counter()
+        record = evaluate_student(
+            usn, sheet_path, shared["question_text"], shared["key_text"], rules, mode,
+            api_key, subject, evaluated_by, scores_dir=scores_dir,
+            on_state=lambda state: queue.set_state(batch_id, usn, state)
+        )
+        queue.set_state(batch_id, usn, DONE)
+        percentage = record["analytics_data"].get("total_score", {}).get("percentage")
+        return {"usn": usn, "status": "done", "seconds": round(time.perf_counter() - started, 1),
+                "percentage": percentage}
+
+    prompt_stats_before = get_prefix_registry().stats()
+    summaries = []
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {pool.submit(grade_one, usn, path): usn for usn, path in todo}
+        for future in as_completed(futures):
+            usn = futures[future]
+            try:
+                summary = future.result()
+            except Exception as e:
+                print(f"  - {usn}: evaluation failed: {e}")
+                queue.set_state(batch_id, usn, FAILED, error=str(e))
+                summary = {"usn": usn, "status": "failed", "error": str(e)}
+            summaries.append(summary)
+            if on_student_complete:
+                on_student_complete(summary, len(summaries), len(todo))
+
+    savings = token_savings(prompt_stats_before, get_prefix_registry().stats())
+    print(f"Batch {batch_id}: {describe_savings(savings)}")
+    return sorted(summaries, key=lambda s: s["usn"])
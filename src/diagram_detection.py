@@ -3,34 +3,64 @@ import os
 import numpy as np
 import fitz
 
-def pdf_to_images_for_diagrams(pdf_path, output_dir, dpi=200):
-    os.makedirs(output_dir, exist_ok=True)
-    pdf = fitz.open(pdf_path)
+# Set SMARTEVAL_DEBUG_DIAGRAMS=1 to also dump every rendered page as a PNG
+DEBUG_DUMP_PAGES = os.environ.get("SMARTEVAL_DEBUG_DIAGRAMS", "") == "1"
+
+def pixmap_to_array(pix):
+    """
+    Wraps a PyMuPDF pixmap as a (height, width, channels) uint8 array
+    without copying. The array borrows the pixmap's buffer, so it is only
+    valid while `pix` is alive.
+    """
+    rows = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.stride)
+    return rows[:, :pix.width * pix.n].reshape(pix.height, pix.width, pix.n)
+
+def iter_gray_pages(pdf_path, dpi=200, dump_dir=None):
+    """
+    Renders each page in memory and yields it as a grayscale NumPy array.
+    If `dump_dir` is given, each page is also saved there as page_N.png.
+
+    Pages are rendered as RGB and converted with OpenCV (rather than asking
+    MuPDF for a gray pixmap) so the gray levels seen by the threshold in
+    `count_diagrams_in_gray` match the old PNG + cv2.imread path exactly.
+    """
     zoom = dpi / 72
     matrix = fitz.Matrix(zoom, zoom)
-    paths = []
-    for i in range(pdf.page_count):
-        page = pdf.load_page(i)
-        pix = page.get_pixmap(matrix=matrix)
-        img_path = os.path.join(output_dir, f"page_{i+1}.png")
-        pix.save(img_path)
-        paths.append(img_path)
-    pdf.close()
-    return paths
-
-def detect_diagrams(pdf_path, output_dir):
-    os.makedirs(output_dir, exist_ok=True)
-    images = pdf_to_images_for_diagrams(pdf_path, output_dir)
+    if dump_dir:
+        os.makedirs(dump_dir, exist_ok=True)
+    with fitz.open(pdf_path) as pdf:
+        for i in range(pdf.page_count):
+            pix = pdf.load_page(i).get_pixmap(matrix=matrix, alpha=False)
+            if dump_dir:
+                pix.save(os.path.join(dump_dir, f"page_{i+1}.png"))
+            # cvtColor writes a new array, so nothing outlives the pixmap
+            yield cv2.cvtColor(pixmap_to_array(pix), cv2.COLOR_RGB2GRAY)
+
+# Gray levels at or below this count as ink
+INK_THRESHOLD = 200
+
+def ink_mask(gray):
+    """Binary mask of a grayscale page: 255 where there is ink, 0 elsewhere."""
+    _, th = cv2.threshold(gray, INK_THRESHOLD, 255, cv2.THRESH_BINARY_INV)
+    return th
+
+def count_diagrams_in_gray(gray):
+    """Counts diagram-sized contours on one grayscale page."""
+    contours, _ = cv2.findContours(ink_mask(gray), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     total_diagrams = 0
-    for img_path in images:
-        img = cv2.imread(img_path)
-        if img is None:
-            continue  # Skip if image failed to load
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        _, th = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY_INV)
-        contours, _ = cv2.findContours(th, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        for c in contours:
-            area = cv2.contourArea(c)
-            if 10000 < area < 500000:
-                total_diagrams += 1
+    for c in contours:
+        area = cv2.contourArea(c)
+        if 10000 < area < 500000:
+            total_diagrams += 1
     return total_diagrams
+
+def detect_diagrams(pdf_path, output_dir=None, dump_pages=DEBUG_DUMP_PAGES):
+    """
+    Counts likely diagrams across all pages of a PDF.
+
+    Pages are rendered to grayscale in memory and handed to OpenCV
+    directly; nothing is written to disk unless `dump_pages` is set, in
+    which case the rendered pages are saved to `output_dir` for debugging.
+    """
+    dump_dir = output_dir if (dump_pages and output_dir) else None
+    return sum(count_diagrams_in_gray(gray) for gray in iter_gray_pages(pdf_path, dump_dir=dump_dir))
@@ -0,0 +1,487 @@
+"""
+evaluation_store.py
+
+Where finished evaluations live on disk.
+
+Each graded student is written to outputs/scores/<subject>/<USN>.json,
+one directory per subject (the subject name carries the exam, e.g.
+"OS - Internal 1" -> os-internal-1-<hash>/), so grading a student in a
+second subject or exam no longer overwrites their earlier record. Records from
+before partitioning, stored flat as outputs/scores/<USN>.json, are still
+read. Both the Streamlit app and the headless batch runner save through
+here so the record layout stays the same no matter how a paper was
+graded.
+
+Every saved record is also written into a SQLite index
+(outputs/scores/evaluations.db) with its subject, USN, timestamp and
+score pulled out into indexed columns, and a partition table maps each
+subject directory back to its subject name. The dashboard queries that
+index, checking only its own subject's directory for changed files,
+instead of listing and parsing every JSON file on each Streamlit rerun.
+
+Alongside the index, a per-subject summary (evaluation count, score sum,
+pass count, score histogram and per-question sums) is kept up to date in
+the same transaction as every index write, so class-level analytics are
+read in constant time however many students or subjects there are.
+"""
+
+import os
+import re
+import json
+import hashlib
+import sqlite3
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+SCORES_DIR = "outputs/scores"
+INDEX_DB_NAME = "evaluations.db"
+PASS_PERCENTAGE = 40
+HISTOGRAM_BUCKETS = 10  # 0-10%, 10-20%, ..., 90-100%
+
+
+def subject_slug(subject: str) -> str:
+    """
+    Directory name for a subject's partition, e.g. "OS - Internal 1" ->
+    "os-internal-1-1a2b3c4d". The readable part drops case and punctuation,
+    so a hash of the exact subject name is appended to keep subjects like
+    "Math/Physics" and "Math Physics" apart.
+    """
+    subject = subject or ""
+    readable = re.sub(r"[^a-z0-9]+", "-", subject.lower()).strip("-") or "unsorted"
+    return f"{readable}-{hashlib.sha256(subject.encode('utf-8')).hexdigest()[:8]}"
+
+
+def score_path(usn: str, scores_dir: str = SCORES_DIR, subject: str = None) -> str:
+    """
+    Returns the path of a student's evaluation record for `subject`. Without
+    a subject, returns the legacy flat path used before partitioning.
+    """
+    if subject is None:
+        return os.path.join(scores_dir, f"{usn}.json")
+    return os.path.join(scores_dir, subject_slug(subject), f"{usn}.json")
+
+
+def build_evaluation_record(usn: str, subject: str, evaluated_by: str, diagram_count: int,
+                            evaluation_report: str, analytics_data: dict,
+                            skipped_pages: list = None) -> dict:
+    """
+    Builds the dictionary that is saved for one graded student.
+    `skipped_pages` lists the (1-based) blank pages that were not OCR'd.
+    """
+    return {
+        "usn": usn,
+        "subject": subject,
+        "evaluated_by": evaluated_by,
+        "timestamp": datetime.now().isoformat(),
+        "diagram_count": diagram_count,
+        "skipped_pages": list(skipped_pages or []),
+        "evaluation_report": evaluation_report,
+        "analytics_data": analytics_data
+    }
+
+
+def score_percentage(analytics: dict) -> float:
+    """
+    Reads the overall percentage from an analytics dict, accepting both the
+    current "total_score" key and the older "total" layout.
+    """
+    total_data = analytics.get("total_score", {}) or analytics.get("total", {})
+    percentage = total_data.get("percentage")
+    if percentage is None:
+        awarded = total_data.get("awarded", total_data.get("adjusted", total_data.get("original", 0)))
+        max_val = total_data.get("max", 100)
+        percentage = (awarded / max_val * 100) if max_val > 0 else 0
+    return percentage
+
+
+def question_scores(analytics: dict) -> list[tuple[str, float]]:
+    """
+    Returns (question, percentage) for each entry of the detailed
+    breakdown, with questions named like "Q1a".
+    """
+    scores = []
+    for item in analytics.get("detailed_breakdown", []) or []:
+        q_name = f"Q{item.get('question', 'N/A')}{item.get('part', '')}"
+        awarded = item.get("marks_awarded", 0)
+        max_m = item.get("max_marks", 0)
+        scores.append((q_name, (awarded / max_m * 100) if max_m > 0 else 0))
+    return scores
+
+
+def _histogram_bucket(percentage: float) -> int:
+    return min(HISTOGRAM_BUCKETS - 1, max(0, int(percentage // (100 / HISTOGRAM_BUCKETS))))
+
+
+def save_evaluation(evaluation_data: dict, path: str, scores_dir: str = SCORES_DIR):
+    """
+    Writes an evaluation record to `path` and indexes it. The file is
+    written to a temporary name first so readers never see a half-written
+    record.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(evaluation_data, f, indent=4)
+    os.replace(tmp_path, path)
+    store = get_store(scores_dir)
+    store.index_record(evaluation_data, path)
+
+    # A flat record from before partitioning for the same student and subject
+    # has just been superseded; drop it so the student isn't counted twice
+    legacy_path = score_path(evaluation_data.get("usn", ""), scores_dir)
+    if os.path.abspath(legacy_path) != os.path.abspath(path) and \
+            _read_record(legacy_path).get("subject") == evaluation_data.get("subject"):
+        os.remove(legacy_path)
+        store.remove_record(legacy_path)
+
+
+def _read_record(path: str) -> dict:
+    """Loads a record file, returning {} if it is missing or unreadable."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def has_valid_score(usn: str, subject: str = None, scores_dir: str = SCORES_DIR) -> bool:
+    """
+    True if the student already has a readable record with analytics
+    (and, if `subject` is given, for that subject). Looks in the subject's
+    partition first, then at the legacy flat record.
+    """
+    paths = [score_path(usn, scores_dir)]
+    if subject is not None:
+        paths.insert(0, score_path(usn, scores_dir, subject))
+    for path in paths:
+        data = _read_record(path)
+        if data.get("analytics_data") and (subject is None or data.get("subject") == subject):
+            return True
+    return False
+
+
+class EvaluationStore:
+    """SQLite index over the evaluation records in one scores directory."""
+
+    def __init__(self, scores_dir: str = SCORES_DIR):
+        self.scores_dir = scores_dir
+        self.db_path = os.path.join(scores_dir, INDEX_DB_NAME)
+        self._lock = threading.Lock()
+        self._synced_scopes = set()  # subjects synced so far; None means everything
+        self.last_sync = {}
+        os.makedirs(scores_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS evaluations (
+                    path       TEXT PRIMARY KEY,
+                    usn        TEXT NOT NULL,
+                    subject    TEXT,
+                    timestamp  TEXT,
+                    percentage REAL,
+                    mtime      REAL,
+                    size       INTEGER,
+                    record     TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_eval_subject ON evaluations (subject, timestamp)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_eval_usn ON evaluations (usn, timestamp)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_eval_timestamp ON evaluations (timestamp)")
+
+            needs_summary = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'subject_summary'"
+            ).fetchone() is None
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS subject_summary (
+                    subject   TEXT PRIMARY KEY,
+                    evaluated INTEGER NOT NULL,
+                    score_sum REAL NOT NULL,
+                    passed    INTEGER NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS subject_histogram (
+                    subject TEXT NOT NULL,
+                    bucket  INTEGER NOT NULL,
+                    count   INTEGER NOT NULL,
+                    PRIMARY KEY (subject, bucket)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS subject_questions (
+                    subject   TEXT NOT NULL,
+                    question  TEXT NOT NULL,
+                    attempts  INTEGER NOT NULL,
+                    score_sum REAL NOT NULL,
+                    PRIMARY KEY (subject, question)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS partitions (
+                    slug    TEXT PRIMARY KEY,
+                    subject TEXT NOT NULL,
+                    updated TEXT
+                )
+            """)
+            if needs_summary:
+                # Index built before summaries existed: backfill from the stored records
+                for (record,) in conn.execute("SELECT record FROM evaluations").fetchall():
+                    self._apply_to_summary(conn, json.loads(record), 1)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _key(self, path: str) -> str:
+        return os.path.relpath(path, self.scores_dir).replace(os.sep, "/")
+
+    def _apply_to_summary(self, conn, record: dict, sign: int):
+        """Adds (sign=1) or removes (sign=-1) one record's contribution to its subject summary."""
+        subject = record.get("subject") or ""
+        analytics = record.get("analytics_data", {}) or {}
+        percentage = score_percentage(analytics)
+
+        conn.execute(
+            "INSERT INTO subject_summary (subject, evaluated, score_sum, passed) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (subject) DO UPDATE SET evaluated = evaluated + excluded.evaluated, "
+            "score_sum = score_sum + excluded.score_sum, passed = passed + excluded.passed",
+            (subject, sign, sign * percentage, sign * int(percentage >= PASS_PERCENTAGE))
+        )
+        conn.execute(
+            "INSERT INTO subject_histogram (subject, bucket, count) VALUES (?, ?, ?) "
+            "ON CONFLICT (subject, bucket) DO UPDATE SET count = count + excluded.count",
+            (subject, _histogram_bucket(percentage), sign)
+        )
+        conn.executemany(
+            "INSERT INTO subject_questions (subject, question, attempts, score_sum) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (subject, question) DO UPDATE SET attempts = attempts + excluded.attempts, "
+            "score_sum = score_sum + excluded.score_sum",
+            [(subject, question, sign, sign * pct) for question, pct in question_scores(analytics)]
+        )
+        if sign < 0:
+            conn.execute("DELETE FROM subject_summary WHERE evaluated <= 0")
+            conn.execute("DELETE FROM subject_histogram WHERE count <= 0")
+            conn.execute("DELETE FROM subject_questions WHERE attempts <= 0")
+
+    def _previous_record(self, conn, key: str):
+        row = conn.execute("SELECT record FROM evaluations WHERE path = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def index_record(self, record: dict, path: str):
+        """
+        Adds or replaces the index row for the record stored at `path`, and
+        moves the subject summary from the old record (if any) to the new one
+        in the same transaction.
+        """
+        stat = os.stat(path)
+        key = self._key(path)
+        with self._lock, self._connect() as conn:
+            # Take the write lock before reading the old row so another process
+            # can't update the summary in between
+            conn.execute("BEGIN IMMEDIATE")
+            previous = self._previous_record(conn, key)
+            if previous is not None:
+                self._apply_to_summary(conn, previous, -1)
+            self._apply_to_summary(conn, record, 1)
+            conn.execute(
+                "INSERT OR REPLACE INTO evaluations (path, usn, subject, timestamp, percentage, mtime, size, record) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, record.get("usn", "Unknown"), record.get("subject"), record.get("timestamp"),
+                 score_percentage(record.get("analytics_data", {}) or {}), stat.st_mtime, stat.st_size,
+                 json.dumps(record, ensure_ascii=False))
+            )
+            if "/" in key:
+                conn.execute(
+                    "INSERT OR REPLACE INTO partitions (slug, subject, updated) VALUES (?, ?, ?)",
+                    (key.split("/", 1)[0], record.get("subject") or "", record.get("timestamp"))
+                )
+
+    def remove_record(self, path: str):
+        """Drops the index row for `path` (if any) and its summary contribution."""
+        key = self._key(path)
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            previous = self._previous_record(conn, key)
+            if previous is not None:
+                self._apply_to_summary(conn, previous, -1)
+                conn.execute("DELETE FROM evaluations WHERE path = ?", (key,))
+
+    def _in_scope(self, key: str, slug: str) -> bool:
+        # A subject's scope is its partition plus the legacy flat files
+        return slug is None or key.startswith(slug + "/") or "/" not in key
+
+    def sync_changes(self, subject: str = None) -> tuple[list[str], list[str]]:
+        """
+        Brings the index in line with the JSON files on disk: new or changed
+        files (by mtime/size) are parsed and indexed, and rows whose file was
+        deleted are dropped. Only file metadata is read for unchanged files.
+
+        With `subject`, only that subject's partition and the legacy flat
+        files are checked; other partitions are left untouched.
+
+        Returns (changed_keys, removed_keys), where keys are paths relative
+        to the scores directory. Counts and timing of the pass are kept in
+        `last_sync`.
+        """
+        changed, removed, self.last_sync = self._sync(subject)
+        return changed, removed
+
+    def _sync(self, subject: str = None) -> tuple[list[str], list[str], dict]:
+        """`sync_changes`, also returning the pass's counts and timing."""
+        started = time.perf_counter()
+        slug = subject_slug(subject) if subject is not None else None
+        on_disk = {}
+        for root, dirs, files in os.walk(self.scores_dir):
+            if slug is not None and root == self.scores_dir:
+                # Descend only into this subject's partition
+                dirs[:] = [d for d in dirs if d == slug]
+            for fname in files:
+                if fname.endswith(".json"):
+                    path = os.path.join(root, fname)
+                    stat = os.stat(path)
+                    on_disk[self._key(path)] = (path, stat.st_mtime, stat.st_size)
+
+        with self._connect() as conn:
+            indexed = {row[0]: (row[1], row[2]) for row in conn.execute("SELECT path, mtime, size FROM evaluations")
+                       if self._in_scope(row[0], slug)}
+
+        changed = []
+        for key, (path, mtime, size) in on_disk.items():
+            if indexed.get(key) == (mtime, size):
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except Exception as e:
+                print(f"Error reading {path}: {e}")
+                continue
+            if isinstance(data, dict):
+                self.index_record(data, path)
+                changed.append(key)
+
+        removed = [key for key in indexed if key not in on_disk]
+        for key in removed:
+            self.remove_record(os.path.join(self.scores_dir, key))
+
+        self._synced_scopes.add(subject if slug is not None else None)
+        stats = {"checked": len(on_disk), "reindexed": len(changed), "removed": len(removed),
+                 "sync_ms": (time.perf_counter() - started) * 1000}
+        return changed, removed, stats
+
+    def sync(self, subject: str = None) -> int:
+        """Like `sync_changes`, but returns just the number of files re-parsed."""
+        return len(self.sync_changes(subject)[0])
+
+    def ensure_synced(self, subject: str = None):
+        """
+        Syncs once per process, either everything or just `subject`'s
+        partition; later saves keep the index current. Returns the sync's
+        `last_sync` stats, or None if no sync was needed.
+        """
+        if None in self._synced_scopes or (subject is not None and subject in self._synced_scopes):
+            return None
+        self.sync_changes(subject)
+        return self.last_sync
+
+    def partitions(self) -> list[dict]:
+        """Every subject with a partition on disk: [{"subject", "slug", "updated"}], newest first."""
+        self.ensure_synced()
+        with self._connect() as conn:
+            return [{"subject": subject, "slug": slug, "updated": updated}
+                    for slug, subject, updated in conn.execute(
+                        "SELECT slug, subject, updated FROM partitions ORDER BY updated DESC")]
+
+    def query(self, subject: str = None, usn: str = None, limit: int = None) -> list[dict]:
+        """
+        Returns evaluation records, newest first, optionally filtered by
+        subject and/or USN and capped at `limit`.
+        """
+        self.ensure_synced(subject)
+        sql = "SELECT record FROM evaluations"
+        clauses, params = [], []
+        if subject is not None:
+            clauses.append("subject = ?")
+            params.append(subject)
+        if usn is not None:
+            clauses.append("usn = ?")
+            params.append(usn)
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY timestamp DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        with self._connect() as conn:
+            return [json.loads(row[0]) for row in conn.execute(sql, params)]
+
+    def subject_summary(self, subject: str) -> dict:
+        """
+        Class-level analytics for one subject, read from the materialized
+        summary: {"evaluated", "average", "passed", "failed", "histogram",
+        "question_averages", "sync"}. `histogram[i]` counts scores in the
+        i-th 10% band.
+
+        Every call first checks the subject's partition (and the legacy flat
+        files) for files written or deleted by other processes; unchanged
+        files are only stat'ed. "sync" holds that check's counts and time.
+        """
+        _, _, sync = self._sync(subject)
+        subject = subject or ""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT evaluated, score_sum, passed FROM subject_summary WHERE subject = ?", (subject,)
+            ).fetchone()
+            histogram = [0] * HISTOGRAM_BUCKETS
+            for bucket, count in conn.execute(
+                    "SELECT bucket, count FROM subject_histogram WHERE subject = ?", (subject,)):
+                histogram[bucket] = count
+            question_averages = {
+                question: score_sum / attempts
+                for question, attempts, score_sum in conn.execute(
+                    "SELECT question, attempts, score_sum FROM subject_questions WHERE subject = ?", (subject,))
+            }
+
+        evaluated, score_sum, passed = row or (0, 0.0, 0)
+        return {
+            "evaluated": evaluated,
+            "average": score_sum / evaluated if evaluated else 0,
+            "passed": passed,
+            "failed": evaluated - passed,
+            "histogram": histogram,
+            "question_averages": question_averages,
+            "sync": sync,
+        }
+
+    def by_subject(self, subject: str) -> list[dict]:
+        """All evaluations for one subject, newest first."""
+        return self.query(subject=subject)
+
+    def by_usn(self, usn: str) -> list[dict]:
+        """All evaluations of one student, newest first."""
+        return self.query(usn=usn)
+
+    def recent(self, n: int = 5) -> list[dict]:
+        """The `n` most recent evaluations across all subjects."""
+        return self.query(limit=n)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_store(scores_dir: str = SCORES_DIR) -> EvaluationStore:
+    """Returns the process-wide store for `scores_dir`."""
+    with _stores_lock:
+        if scores_dir not in _stores:
+            _stores[scores_dir] = EvaluationStore(scores_dir)
+        return _stores[scores_dir]
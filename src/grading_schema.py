@@ -0,0 +1,255 @@
+"""
+grading_schema.py
+
+Typed grading results, the response schema the grader asks Gemini for,
+and the parsers that turn a model answer into those types.
+
+In structured mode the grading request sets
+response_mime_type="application/json" with RESPONSE_SCHEMA, which is
+generated from the dataclasses below. The model must then answer with a
+single JSON object, {"analytics": {...}, "report": "<markdown>"}.
+`parse_grading_json` reads that with one `json.loads` and a validation
+pass over the fields. There is no searching through free text, and
+responses over MAX_RESPONSE_CHARS are rejected up front.
+
+Plain-text answers in the older layout (a ```json block followed by the
+Markdown report) still go through `parse_legacy_response`. Either way the
+analytics are validated into the same typed objects. Numbers sent as
+strings are coerced, a missing percentage is computed, and a missing
+total is rebuilt from the breakdown. Anything that can't be repaired
+raises AnalyticsError. `GradingAnalytics.to_dict()` gives the dict
+layout stored in evaluation records.
+"""
+
+import json
+import math
+import typing
+from dataclasses import dataclass, field, fields, asdict, is_dataclass
+
+# Longest model answer we attempt to parse
+MAX_RESPONSE_CHARS = 200_000
+
+
+class AnalyticsError(ValueError):
+    """The model's answer could not be turned into grading analytics."""
+
+
+@dataclass
+class ScoreTotal:
+    awarded: float
+    max: float
+    percentage: float
+
+
+@dataclass
+class SectionScore:
+    section: str
+    awarded: float
+    max: float
+    percentage: float
+
+
+@dataclass
+class QuestionScore:
+    question: str = field(metadata={"description": "Question number, e.g. Q1"})
+    awarded: float
+    max: float
+    percentage: float
+
+
+@dataclass
+class DiagramPerformance:
+    required_estimate: int = field(metadata={"description": "Diagrams the answer key calls for"})
+    found_estimate: int = field(metadata={"description": "Diagrams the student drew"})
+
+
+@dataclass
+class BreakdownItem:
+    question: str
+    part: str
+    description: str = field(metadata={"description": "2-5 word summary of the answer key concept"})
+    feedback: str = field(metadata={"description": "Specific feedback on the student's answer"})
+    marks_awarded: float
+    max_marks: float
+
+
+@dataclass
+class GradingAnalytics:
+    total_score: ScoreTotal
+    section_wise: list[SectionScore]
+    question_wise: list[QuestionScore]
+    diagram_performance: DiagramPerformance
+    detailed_breakdown: list[BreakdownItem] = field(
+        metadata={"description": "One entry per sub-part of each question the student attempted"}
+    )
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class GradingResponse:
+    analytics: GradingAnalytics
+    report: str = field(metadata={"description": "Student-facing feedback summary in Markdown"})
+
+
+def _schema_for(tp, description: str = None) -> dict:
+    """OpenAPI-style schema for a dataclass or field type; every field is required."""
+    if typing.get_origin(tp) is list:
+        schema = {"type": "array", "items": _schema_for(typing.get_args(tp)[0])}
+    elif is_dataclass(tp):
+        hints = typing.get_type_hints(tp)
+        names = [f.name for f in fields(tp)]
+        schema = {
+            "type": "object",
+            "properties": {f.name: _schema_for(hints[f.name], f.metadata.get("description")) for f in fields(tp)},
+            "required": names,
+        }
+    else:
+        schema = {str: {"type": "string"}, int: {"type": "integer"}, float: {"type": "number"}}[tp]
+    if description:
+        schema["description"] = description
+    return schema
+
+
+RESPONSE_SCHEMA = _schema_for(GradingResponse)
+
+
+# --- Validation ---
+def _number(value, path: str, integral: bool = False):
+    if isinstance(value, bool) or value is None:
+        raise AnalyticsError(f"{path}: expected a number, got {value!r}")
+    if isinstance(value, str):
+        try:
+            value = float(value.strip().rstrip("%"))
+        except ValueError:
+            raise AnalyticsError(f"{path}: expected a number, got {value!r}") from None
+    if not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise AnalyticsError(f"{path}: expected a number, got {value!r}")
+    if integral and float(value).is_integer():
+        return int(value)
+    return value
+
+
+def _text(value, path: str) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (str, int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise AnalyticsError(f"{path}: expected text, got {type(value).__name__}")
+
+
+def _object(value, path: str) -> dict:
+    if not isinstance(value, dict):
+        raise AnalyticsError(f"{path}: expected an object, got {type(value).__name__}")
+    return value
+
+
+def _list(value, path: str) -> list:
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        raise AnalyticsError(f"{path}: expected a list, got {type(value).__name__}")
+    return value
+
+
+def _percentage(data: dict, awarded, max_marks, path: str) -> float:
+    if data.get("percentage") is not None:
+        return float(_number(data["percentage"], f"{path}.percentage"))
+    return round(awarded / max_marks * 100, 1) if max_marks else 0.0
+
+
+def _score(data, path: str):
+    data = _object(data, path)
+    awarded = _number(data.get("awarded"), f"{path}.awarded", integral=True)
+    max_marks = _number(data.get("max"), f"{path}.max", integral=True)
+    return awarded, max_marks, _percentage(data, awarded, max_marks, path)
+
+
+def validate_analytics(data) -> GradingAnalytics:
+    """Checks and normalizes an analytics dict from the model, raising AnalyticsError if unusable."""
+    data = _object(data, "analytics")
+
+    breakdown = []
+    for i, item in enumerate(_list(data.get("detailed_breakdown"), "detailed_breakdown")):
+        path = f"detailed_breakdown[{i}]"
+        item = _object(item, path)
+        breakdown.append(BreakdownItem(
+            question=_text(item.get("question"), f"{path}.question"),
+            part=_text(item.get("part"), f"{path}.part"),
+            description=_text(item.get("description"), f"{path}.description"),
+            feedback=_text(item.get("feedback"), f"{path}.feedback"),
+            marks_awarded=_number(item.get("marks_awarded"), f"{path}.marks_awarded", integral=True),
+            max_marks=_number(item.get("max_marks"), f"{path}.max_marks", integral=True),
+        ))
+
+    total = data.get("total_score") or data.get("total")
+    if total is not None:
+        total_score = ScoreTotal(*_score(total, "total_score"))
+    elif breakdown:
+        # Rebuild the total from the per-part marks rather than losing the grading
+        awarded = sum(item.marks_awarded for item in breakdown)
+        max_marks = sum(item.max_marks for item in breakdown)
+        total_score = ScoreTotal(awarded, max_marks, round(awarded / max_marks * 100, 1) if max_marks else 0.0)
+    else:
+        raise AnalyticsError("analytics: no total_score and no detailed_breakdown")
+
+    section_wise = []
+    for i, section in enumerate(_list(data.get("section_wise"), "section_wise")):
+        path = f"section_wise[{i}]"
+        section_wise.append(SectionScore(_text(_object(section, path).get("section"), f"{path}.section"),
+                                         *_score(section, path)))
+
+    question_wise = []
+    for i, question in enumerate(_list(data.get("question_wise"), "question_wise")):
+        path = f"question_wise[{i}]"
+        question_wise.append(QuestionScore(_text(_object(question, path).get("question"), f"{path}.question"),
+                                           *_score(question, path)))
+
+    diagrams = _object(data.get("diagram_performance") or {}, "diagram_performance")
+    diagram_performance = DiagramPerformance(
+        required_estimate=_number(diagrams.get("required_estimate", 0), "diagram_performance.required_estimate",
+                                  integral=True),
+        found_estimate=_number(diagrams.get("found_estimate", 0), "diagram_performance.found_estimate",
+                               integral=True),
+    )
+
+    return GradingAnalytics(total_score, section_wise, question_wise, diagram_performance, breakdown)
+
+
+# --- Parsers ---
+def _load_json(text: str, what: str):
+    if len(text) > MAX_RESPONSE_CHARS:
+        raise AnalyticsError(f"{what} is {len(text)} characters, over the {MAX_RESPONSE_CHARS} limit")
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        raise AnalyticsError(f"{what} is not valid JSON: {e}") from None
+
+
+def parse_grading_json(text: str) -> GradingResponse:
+    """Parses a structured-mode answer: {"analytics": {...}, "report": "..."}."""
+    data = _object(_load_json(text, "Response"), "response")
+    return GradingResponse(validate_analytics(data.get("analytics")), _text(data.get("report"), "report").strip())
+
+
+def parse_legacy_response(text: str) -> GradingResponse:
+    """Parses the older layout: a ```json analytics block, with the report around it."""
+    start = text.find("```json")
+    if start < 0:
+        raise AnalyticsError("Response has no ```json block")
+    body_start = start + len("```json")
+    end = text.find("```", body_start)
+    if end < 0:
+        raise AnalyticsError("Response has an unterminated ```json block")
+
+    analytics = validate_analytics(_load_json(text[body_start:end], "The ```json block"))
+    report = (text[:start] + text[end + 3:]).strip()
+    return GradingResponse(analytics, report)
+
+
+def parse_grading_response(text: str) -> GradingResponse:
+    """Parses either layout, picking by whether the answer is a bare JSON object."""
+    if text.lstrip().startswith("{"):
+        return parse_grading_json(text)
+    return parse_legacy_response(text)
@@ -0,0 +1,161 @@
+"""
+job_queue.py
+
+Durable, SQLite-backed job queue for batch evaluations.
+
+Every student in a batch is one row that moves through
+queued -> ocr -> grading -> done (or failed). Because the state lives in
+outputs/jobs.db rather than st.session_state, a crashed or restarted run
+can pick up exactly the students that never finished.
+"""
+
+import os
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+JOB_DB_PATH = "outputs/jobs.db"
+
+QUEUED = "queued"
+OCR = "ocr"
+GRADING = "grading"
+DONE = "done"
+FAILED = "failed"
+JOB_STATES = (QUEUED, OCR, GRADING, DONE, FAILED)
+
+# States a job can be left in if the process dies mid-evaluation
+_IN_PROGRESS_STATES = (OCR, GRADING)
+
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+def make_batch_id(question_pdf: str, key_pdf: str, subject: str, mode: str, sheets_dir: str) -> str:
+    """
+    Identifies a batch by what is being graded, so re-running the same
+    question paper/key/subject over the same folder resumes the same jobs.
+    """
+    digest = hashlib.sha256()
+    for path in (question_pdf, key_pdf):
+        with open(path, "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    for part in (subject, mode, os.path.abspath(sheets_dir)):
+        digest.update(part.encode("utf-8") + b"\0")
+    return digest.hexdigest()[:16]
+
+
+class JobQueue:
+    """Per-student evaluation jobs stored in a local SQLite database."""
+
+    def __init__(self, db_path: str = JOB_DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    batch_id   TEXT NOT NULL,
+                    usn        TEXT NOT NULL,
+                    sheet_path TEXT NOT NULL,
+                    state      TEXT NOT NULL,
+                    attempts   INTEGER NOT NULL DEFAULT 0,
+                    error      TEXT,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (batch_id, usn)
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        # A short-lived connection per call keeps this safe to use from worker threads
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, batch_id: str, sheets: list[tuple[str, str]], already_done=None):
+        """
+        Adds one job per (usn, sheet_path). Existing jobs keep their state,
+        except that jobs interrupted mid-run are put back in the queue.
+
+        If `already_done` is given it is treated as the source of truth for
+        finished students: those USNs are marked done, and any other job
+        marked done (e.g. whose record was since deleted) is queued again.
+        """
+        now = datetime.now().isoformat()
+        with self._lock, self._connect() as conn:
+            for usn, sheet_path in sheets:
+                conn.execute(
+                    "INSERT OR IGNORE INTO jobs (batch_id, usn, sheet_path, state, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (batch_id, usn, sheet_path, QUEUED, now)
+                )
+                if already_done is None:
+                    continue
+                if usn in already_done:
+                    conn.execute(
+                        "UPDATE jobs SET state = ?, error = NULL, updated_at = ? WHERE batch_id = ? AND usn = ?",
+                        (DONE, now, batch_id, usn)
+                    )
+                else:
+                    conn.execute(
+                        "UPDATE jobs SET state = ?, updated_at = ? WHERE batch_id = ? AND usn = ? AND state = ?",
+                        (QUEUED, now, batch_id, usn, DONE)
+                    )
+            conn.execute(
+                f"UPDATE jobs SET state = ?, updated_at = ? WHERE batch_id = ? AND state IN ({','.join('?' * len(_IN_PROGRESS_STATES))})",
+                (QUEUED, now, batch_id, *_IN_PROGRESS_STATES)
+            )
+
+    def reset(self, batch_id: str):
+        """Puts every job of a batch back in the queue (used for a fresh re-grade)."""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = ?, attempts = 0, error = NULL, updated_at = ? WHERE batch_id = ?",
+                (QUEUED, datetime.now().isoformat(), batch_id)
+            )
+
+    def pending(self, batch_id: str, max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> list[tuple[str, str]]:
+        """Returns (usn, sheet_path) for jobs that still need to run."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT usn, sheet_path FROM jobs WHERE batch_id = ? AND "
+                "(state = ? OR (state = ? AND attempts < ?)) ORDER BY usn",
+                (batch_id, QUEUED, FAILED, max_attempts)
+            ).fetchall()
+        return [(usn, path) for usn, path in rows]
+
+    def set_state(self, batch_id: str, usn: str, state: str, error: str = None):
+        """Moves a job to `state`. Entering OCR counts as a new attempt."""
+        if state not in JOB_STATES:
+            raise ValueError(f"Unknown job state: {state}")
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, updated_at = ?, attempts = attempts + ? "
+                "WHERE batch_id = ? AND usn = ?",
+                (state, error, datetime.now().isoformat(), 1 if state == OCR else 0, batch_id, usn)
+            )
+
+    def counts(self, batch_id: str) -> dict:
+        """Returns {state: number of jobs} for a batch."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT state, COUNT(*) FROM jobs WHERE batch_id = ? GROUP BY state", (batch_id,)
+            ).fetchall()
+        counts = {state: 0 for state in JOB_STATES}
+        counts.update(dict(rows))
+        return counts
+
+    def jobs(self, batch_id: str) -> list[dict]:
+        """Returns every job of a batch as a dict, ordered by USN."""
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(
+                "SELECT usn, sheet_path, state, attempts, error, updated_at FROM jobs WHERE batch_id = ? ORDER BY usn",
+                (batch_id,)
+            ).fetchall()
+        return [dict(row) for row in rows]
@@ -0,0 +1,154 @@
+"""
+model_registry.py
+
+Process-wide Gemini clients and model handles.
+
+`genai.configure()` throws away the SDK's cached service clients every
+time it is called, so configuring on each OCR or grading call meant a
+new gRPC channel (and TLS handshake) per call. Here each API key gets
+one long-lived client, created on first use, and models are cached per
+(api key, model name, generation config, safety settings). The gRPC
+channel keeps its HTTP/2 connection open between calls, so a batch run
+reuses one connection for every page and student.
+
+Clients are kept per key rather than through the SDK's global
+configuration, so two sessions using different keys don't keep
+resetting each other's connections. The same per-key setup also serves
+the context-cache service (see `prompt_cache`), and `get_cached_model`
+returns models bound to a cached prompt prefix.
+
+The backend is pluggable. SMARTEVAL_MODEL_BACKEND=stub (or
+`set_backend("stub")`) swaps Gemini for the offline `StubModel`, so the
+whole pipeline can be run and load-tested without an API key. Use
+`cache_model_id` in cache keys, so stub output never gets served for
+real requests.
+"""
+
+import os
+import threading
+
+import google.generativeai as genai
+from google.generativeai import client as genai_client
+
+BACKENDS = ("gemini", "stub")
+_backend = os.environ.get("SMARTEVAL_MODEL_BACKEND", "gemini").lower()
+
+_managers = {}
+_models = {}
+_cached_models = {}  # models bound to a context cache, keyed by cache name first
+_lock = threading.Lock()
+_stats = {"model_hits": 0, "model_misses": 0}
+
+
+def _freeze(value) -> str:
+    """Stable cache-key text for a config object or dict."""
+    if isinstance(value, dict):
+        return repr(sorted((repr(k), repr(v)) for k, v in value.items()))
+    return repr(value)
+
+
+def get_backend() -> str:
+    return _backend
+
+
+def set_backend(name: str):
+    """Switches every later `get_model` call to the "gemini" or "stub" backend."""
+    global _backend
+    name = name.lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown model backend {name!r}; expected one of {BACKENDS}")
+    with _lock:
+        _backend = name
+
+
+def cache_model_id(model_name: str) -> str:
+    """The model name to use in cache keys; tagged when it isn't the real API."""
+    return model_name if _backend == "gemini" else f"{_backend}:{model_name}"
+
+
+def get_client(api_key: str, service: str = "generative"):
+    """
+    Returns the shared client for `api_key` and an SDK service
+    ("generative", "cache", ...), creating it once.
+    """
+    if not api_key:
+        raise ValueError("API Key is missing. Please add it on the 'Settings' page.")
+    with _lock:
+        manager = _managers.get(api_key)
+        if manager is None:
+            # A private client manager per key, configured like genai.configure() would
+            manager = genai_client._ClientManager()
+            manager.configure(api_key=api_key)
+            _managers[api_key] = manager
+        # The manager keeps one client per service
+        return manager.get_default_client(service)
+
+
+def get_model(api_key: str, model_name: str, generation_config=None, safety_settings=None):
+    """
+    Returns a cached GenerativeModel bound to the shared client for
+    `api_key` (or a StubModel on the stub backend). Models are safe to
+    share between threads; the settings given here are used as defaults
+    for every `generate_content` call.
+    """
+    key = (_backend, api_key, model_name, _freeze(generation_config), _freeze(safety_settings))
+    with _lock:
+        model = _models.get(key)
+        if model is not None:
+            _stats["model_hits"] += 1
+            return model
+        _stats["model_misses"] += 1
+
+    if key[0] == "stub":
+        from src.stub_model import StubModel
+        with _lock:
+            return _models.setdefault(key, StubModel(model_name, generation_config=generation_config))
+
+    client = get_client(api_key)
+    model = genai.GenerativeModel(  # pyright: ignore[reportPrivateImportUsage]
+        model_name, generation_config=generation_config, safety_settings=safety_settings
+    )
+    model._client = client
+    with _lock:
+        # Another thread may have built the same model meanwhile; keep the first
+        return _models.setdefault(key, model)
+
+
+def get_cached_model(api_key: str, cached_content: str, model_name: str, generation_config=None,
+                     safety_settings=None):
+    """
+    Returns a cached GenerativeModel whose requests are prefixed with the
+    context cache `cached_content` (a "cachedContents/..." name). Works like
+    `GenerativeModel.from_cached_content`, without looking the cache up
+    through the SDK's global client.
+    """
+    key = (cached_content, api_key, model_name, _freeze(generation_config), _freeze(safety_settings))
+    with _lock:
+        model = _cached_models.get(key)
+        if model is not None:
+            _stats["model_hits"] += 1
+            return model
+        _stats["model_misses"] += 1
+
+    client = get_client(api_key)
+    model = genai.GenerativeModel(  # pyright: ignore[reportPrivateImportUsage]
+        model_name, generation_config=generation_config, safety_settings=safety_settings
+    )
+    model._client = client
+    model._cached_content = cached_content
+    with _lock:
+        return _cached_models.setdefault(key, model)
+
+
+def forget_cached_model(cached_content: str):
+    """Drops the models bound to a context cache that has expired or been deleted."""
+    with _lock:
+        for key in [k for k in _cached_models if k[0] == cached_content]:
+            del _cached_models[key]
+
+
+def registry_stats() -> dict:
+    """Counts of shared clients and models, and model cache hits/misses."""
+    with _lock:
+        return {"backend": _backend, "clients": len(_managers), "models": len(_models) + len(_cached_models),
+                **_stats}
@@ -0,0 +1,225 @@
+"""
+ocr_cache.py
+
+Persistent, content-addressed cache for OCR output.
+
+Entries are keyed by a SHA-256 of the source bytes plus the OCR model
+and prompt, so a re-uploaded copy of the same question paper or answer
+key is recognised no matter what it is called. Two caches use this:
+one for whole documents and one for individual rendered pages, so a
+re-uploaded sheet with a single corrected page only re-OCRs that page.
+
+Each cache is a SQLite database (index.db) holding the text with its
+size and access order, plus hit/miss counters, so the Streamlit server
+and a batch run can share a cache directory without losing each other's
+entries. A put writes one row; lookups are buffered in memory and
+written together by `flush()` (once per document or sheet). When the
+cache grows past `max_bytes` the least recently used entries are evicted.
+"""
+
+import os
+import re
+import json
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DOCUMENT_CACHE_DIR = "outputs/ocr_cache/documents"
+PAGE_CACHE_DIR = "outputs/ocr_cache/pages"
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024  # 50 MB of extracted text
+INDEX_DB_NAME = "index.db"
+LEGACY_INDEX_NAME = "index.json"  # one .txt file per entry, from before the SQLite index
+
+# Bump this when the OCR pipeline changes in a way that invalidates old text
+CACHE_FORMAT_VERSION = "1"
+
+# Text produced by a failed OCR run must never be cached
+_FAILURE_PATTERN = re.compile(r"\[Page \d+ OCR (Failed|Error)|^API Key configuration failed")
+
+
+def hash_bytes(data: bytes, *salt: str) -> str:
+    """Returns the SHA-256 hex digest of `data` combined with the salt strings."""
+    digest = hashlib.sha256()
+    for part in (CACHE_FORMAT_VERSION, *salt):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    digest.update(data)
+    return digest.hexdigest()
+
+
+def document_cache_key(pdf_path: str, model_name: str, prompt: str) -> str:
+    """Cache key for a whole PDF: hash of its bytes + OCR model/prompt."""
+    with open(pdf_path, "rb") as f:
+        return hash_bytes(f.read(), model_name, prompt)
+
+
+def page_cache_key(image_data, model_name: str, prompt: str, mime_type: str) -> str:
+    """
+    Cache key for a single rendered page: hash of the encoded image
+    (base64 string or raw bytes) + OCR model/prompt/mime type.
+    """
+    if isinstance(image_data, str):
+        image_data = image_data.encode("ascii")
+    return hash_bytes(image_data, model_name, prompt, mime_type)
+
+
+def is_cacheable_text(text: str) -> bool:
+    """True if the OCR output looks complete (no failed/errored pages)."""
+    return bool(text) and not _FAILURE_PATTERN.search(text)
+
+
+class OCRCache:
+    """A size-bounded LRU cache of OCR text persisted under `cache_dir`."""
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.db_path = os.path.join(cache_dir, INDEX_DB_NAME)
+        self._lock = threading.Lock()
+        # Lookups since the last write, applied with the next put/flush
+        self._touched = []  # keys hit, oldest first
+        self._counts = {"hits": 0, "misses": 0}
+        os.makedirs(cache_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key       TEXT PRIMARY KEY,
+                    text      TEXT NOT NULL,
+                    size      INTEGER NOT NULL,
+                    last_used INTEGER NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries (last_used)")
+            # hits/misses, the access clock and the total size of all entries
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.executemany("INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)",
+                             [(name,) for name in ("hits", "misses", "clock", "bytes")])
+        self._import_legacy_index()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _import_legacy_index(self):
+        """Moves entries from the older index.json + one-file-per-entry layout into the database."""
+        index_path = os.path.join(self.cache_dir, LEGACY_INDEX_NAME)
+        if not os.path.exists(index_path):
+            return
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Old OCR cache index unreadable, dropping it: {e}")
+            index = {}
+
+        entries = index.get("entries", {})
+        for key in sorted(entries, key=lambda k: entries[k].get("last_used", 0)):
+            text_path = os.path.join(self.cache_dir, f"{key}.txt")
+            try:
+                with open(text_path, "r", encoding="utf-8") as f:
+                    text = f.read()
+            except OSError:
+                continue
+            self.put(key, text)
+            os.remove(text_path)
+        with self._connect() as conn:
+            conn.executemany("UPDATE counters SET value = value + ? WHERE name = ?",
+                             [(index.get("hits", 0), "hits"), (index.get("misses", 0), "misses")])
+        os.remove(index_path)
+
+    def _write_pending(self, conn):
+        # Caller holds self._lock and an open write transaction
+        if self._touched:
+            clock = conn.execute("SELECT value FROM counters WHERE name = 'clock'").fetchone()[0]
+            conn.executemany("UPDATE entries SET last_used = ? WHERE key = ?",
+                             [(clock + n, key) for n, key in enumerate(self._touched, 1)])
+            conn.execute("UPDATE counters SET value = ? WHERE name = 'clock'", (clock + len(self._touched),))
+        conn.executemany("UPDATE counters SET value = value + ? WHERE name = ?",
+                         [(count, name) for name, count in self._counts.items() if count])
+        self._touched = []
+        self._counts = {"hits": 0, "misses": 0}
+
+    # --- Public API ---
+    def get(self, key: str):
+        """Returns the cached text for `key`, or None on a miss."""
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT text FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._counts["misses"] += 1
+                return None
+            # Lookups only touch counters and access order; they are written on the next put/flush
+            self._counts["hits"] += 1
+            self._touched.append(key)
+            return row[0]
+
+    def put(self, key: str, text: str):
+        """Stores `text` under `key` and evicts old entries if over budget."""
+        size = len(text.encode("utf-8"))
+        with self._lock, self._connect() as conn:
+            # Other processes may write to the same cache; take the write lock up front
+            conn.execute("BEGIN IMMEDIATE")
+            self._write_pending(conn)
+            old = conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            clock = conn.execute(
+                "UPDATE counters SET value = value + 1 WHERE name = 'clock' RETURNING value").fetchone()[0]
+            conn.execute("INSERT OR REPLACE INTO entries (key, text, size, last_used) VALUES (?, ?, ?, ?)",
+                         (key, text, size, clock))
+            total = conn.execute("UPDATE counters SET value = value + ? WHERE name = 'bytes' RETURNING value",
+                                 (size - (old[0] if old else 0),)).fetchone()[0]
+            if total > self.max_bytes:
+                self._evict(conn, total)
+
+    def flush(self):
+        """Writes pending counter/access-order updates to the index."""
+        with self._lock:
+            if not (self._touched or any(self._counts.values())):
+                return
+            with self._connect() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                self._write_pending(conn)
+
+    def _evict(self, conn, total: int):
+        evicted = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            evicted.append(key)
+            total -= size
+        conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in evicted])
+        conn.execute("UPDATE counters SET value = ? WHERE name = 'bytes'", (total,))
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and current size of the cache."""
+        with self._lock, self._connect() as conn:
+            counters = dict(conn.execute("SELECT name, value FROM counters"))
+            return {
+                "hits": counters["hits"] + self._counts["hits"],
+                "misses": counters["misses"] + self._counts["misses"],
+                "entries": conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0],
+                "bytes": counters["bytes"],
+            }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def _get_cache(cache_dir: str) -> OCRCache:
+    with _caches_lock:
+        if cache_dir not in _caches:
+            _caches[cache_dir] = OCRCache(cache_dir)
+        return _caches[cache_dir]
+
+def get_document_cache() -> OCRCache:
+    """Returns the process-wide cache for whole-document OCR text."""
+    return _get_cache(DOCUMENT_CACHE_DIR)
+
+def get_page_cache() -> OCRCache:
+    """Returns the process-wide cache for per-page OCR text."""
+    return _get_cache(PAGE_CACHE_DIR)
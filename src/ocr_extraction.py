@@ -6,12 +6,16 @@ Gemini API's multimodal capabilities for OCR.
 """
 
 import os
-import base64
-import io
-import google.generativeai as genai
+import re
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
 import streamlit as st
-from typing import Optional
+from typing import Iterable, Optional, Union
+import numpy as np
+from src.ocr_cache import get_page_cache, page_cache_key, is_cacheable_text
+from src.model_registry import get_client, get_model, cache_model_id
+from src.rate_limiter import call_with_retry, get_limiter
+from src.page_encoding import encode_page, FIXED_DPI
 
 # --- PDF Conversion (requires pdf2image) ---
 try:
@@ -20,9 +24,17 @@ except ImportError:
     st.error("pdf2image not found. Please run: pip install pdf2image")
     convert_from_path = None
 
-def convert_pdf_to_images(pdf_path: str, poppler_path: Optional[str] = None) -> list[str]:
+# Number of pdftoppm processes pdf2image may run for one document
+PDF_CONVERT_THREADS = max(1, min(4, os.cpu_count() or 1))
+
+def _encode_image(image) -> bytes:
+    """Encodes a PIL image for OCR (see `page_encoding.encode_page`)."""
+    return encode_page(np.asarray(image.convert("RGB")), FIXED_DPI).data
+
+def convert_pdf_to_images(pdf_path: str, poppler_path: Optional[str] = None,
+                          thread_count: int = PDF_CONVERT_THREADS) -> list[bytes]:
     """
-    Converts a PDF file into a list of base64-encoded JPEG images.
+    Converts a PDF file into a list of OCR-ready JPEG images (bytes).
     """
     if not convert_from_path:
         raise ImportError("pdf2image library is required but not found.")
@@ -30,31 +42,29 @@ def convert_pdf_to_images(pdf_path: str, poppler_path: Optional[str] = None) ->
     print(f"Converting PDF: {pdf_path}")
 
     # Call 'convert_from_path' differently based on whether poppler_path is provided.
+    # thread_count splits the page range across that many pdftoppm processes.
     if poppler_path:
-        images = convert_from_path(pdf_path, poppler_path=poppler_path, dpi=150)
+        images = convert_from_path(pdf_path, poppler_path=poppler_path, dpi=FIXED_DPI, thread_count=thread_count)
     else:
-        images = convert_from_path(pdf_path, dpi=150)
+        images = convert_from_path(pdf_path, dpi=FIXED_DPI, thread_count=thread_count)
     
-    base64_images = []
+    encoded_images = []
     for i, image in enumerate(images):
         print(f"  - Processing page {i+1}/{len(images)}")
-        buffered = io.BytesIO()
-        image.save(buffered, format="JPEG")
-        b64_string = base64.b64encode(buffered.getvalue()).decode("utf-8")
-        base64_images.append(b64_string)
+        encoded_images.append(_encode_image(image))
         
-    print(f"Conversion complete. {len(base64_images)} images generated.")
-    return base64_images
+    print(f"Conversion complete. {len(encoded_images)} images generated.")
+    return encoded_images
 
 # --- Gemini API Configuration ---
 def initialize_gemini(api_key):
-    """Initializes and configures the Gemini client."""
+    """Checks the API key and sets up the shared Gemini client for it."""
     try:
         if not api_key:
             st.error("API Key is missing. Please add it on the 'Settings' page.")
             return False
         
-        genai.configure(api_key=api_key)  # pyright: ignore[reportPrivateImportUsage]
+        get_client(api_key)  # Created once per key and reused by every call
         return True
     except Exception as e:
         st.error(f"Error configuring Gemini API: {e}")
@@ -68,54 +78,189 @@ SAFETY_SETTINGS = {
     HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
 }
 
+# --- OCR Settings ---
+OCR_MODEL_NAME = "models/gemini-2.5-flash-preview-09-2025"
+
+# This prompt will be used for each individual page
+OCR_PROMPT = "Extract all text from this image. Maintain line breaks."
+
+# Maximum number of page requests in flight at once. Keeps a 14-page sheet
+# well under the per-minute quota while removing the serialized round-trips.
+OCR_MAX_CONCURRENCY = 4
+
+# Pages packed into one OCR request. 1 keeps one call per page; larger
+# values cut calls per sheet (see benchmarks/bench_ocr_batching.py).
+OCR_PAGES_PER_REQUEST = int(os.environ.get("SMARTEVAL_OCR_PAGES_PER_REQUEST", "1"))
+
+# Prompt for multi-page requests; the delimiters let us split the answer per page
+OCR_BATCH_PROMPT = (
+    "Extract all text from each of the following {count} page images. Maintain line breaks. "
+    "Before the text of each page, write a line containing only '=== PAGE n ===', where n is "
+    "the image's position (1 to {count}). Include every page, even if it is blank."
+)
+PAGE_DELIMITER = re.compile(r"^=== PAGE (\d+) ===[ \t]*$", re.MULTILINE)
+
+def _ocr_single_page(model, page_number: int, image_data: Union[bytes, str], mime_type: str) -> str:
+    """
+    Runs OCR for one page and returns its text, or the
+    '[Page N OCR Failed/Error]' placeholder on failure.
+    """
+    print(f"  - Processing image {page_number}...")
+
+    parts = [
+        {"text": OCR_PROMPT},
+        {
+            "inline_data": {
+                "mime_type": mime_type,
+                "data": image_data
+            }
+        }
+    ]
+
+    try:
+        # Throttled and retried with the shared per-model limiter
+        response = call_with_retry(model.generate_content, parts, limiter=get_limiter(OCR_MODEL_NAME))
+
+        if response.parts:
+            return response.text
+
+        reason = response.candidates[0].finish_reason if response.candidates else "Unknown"
+        print(f"    - OCR failed for image {page_number}. Reason: {reason}")
+        return f"[Page {page_number} OCR Failed: {reason}]"
+
+    except Exception as e:
+        print(f"    - An error occurred during OCR for image {page_number}: {e}")
+        return f"[Page {page_number} OCR Error: {e}]"
+
+def split_batched_text(text: str, page_count: int) -> Optional[list[str]]:
+    """
+    Splits the answer to a multi-page OCR request into per-page text.
+    Returns None unless pages 1..page_count each appear exactly once, in order.
+    """
+    matches = list(PAGE_DELIMITER.finditer(text))
+    if [int(m.group(1)) for m in matches] != list(range(1, page_count + 1)):
+        return None
+    ends = [m.start() for m in matches[1:]] + [len(text)]
+    return [text[m.end():end].strip("\n") for m, end in zip(matches, ends)]
+
+def _ocr_page_batch(model, pages: list[tuple[int, Union[bytes, str]]], mime_type: str) -> dict[int, str]:
+    """
+    Runs OCR for several pages in one request and returns {page index: text}.
+    If the answer can't be split back into pages, each page is sent again
+    on its own.
+    """
+    if len(pages) == 1:
+        i, image_data = pages[0]
+        return {i: _ocr_single_page(model, i + 1, image_data, mime_type)}
+
+    numbers = ", ".join(str(i + 1) for i, _ in pages)
+    print(f"  - Processing images {numbers} in one request...")
+
+    parts = [{"text": OCR_BATCH_PROMPT.format(count=len(pages))}]
+    parts += [{"inline_data": {"mime_type": mime_type, "data": image_data}} for _, image_data in pages]
+
+    try:
+        response = call_with_retry(model.generate_content, parts, limiter=get_limiter(OCR_MODEL_NAME))
+        page_texts = split_batched_text(response.text, len(pages)) if response.parts else None
+    except Exception as e:
+        print(f"    - An error occurred during OCR for images {numbers}: {e}")
+        return {i: f"[Page {i + 1} OCR Error: {e}]" for i, _ in pages}
+
+    if page_texts is None:
+        print(f"    - Could not split the OCR output for images {numbers}; retrying them one at a time")
+        return {i: _ocr_single_page(model, i + 1, image_data, mime_type) for i, image_data in pages}
+    return {i: text for (i, _), text in zip(pages, page_texts)}
+
 # --- Gemini OCR Function ---
-def extract_text_from_images(images_base64: list[str], api_key: str, mime_type: str = "image/jpeg") -> str:
+def extract_text_from_images(images: Iterable[Union[bytes, str, tuple[int, Union[bytes, str]]]], api_key: str,
+                             mime_type: str = "image/jpeg",
+                             max_concurrency: int = OCR_MAX_CONCURRENCY,
+                             use_page_cache: bool = True,
+                             pages_per_request: int = OCR_PAGES_PER_REQUEST) -> str:
     """
-    Performs OCR on an array of base64-encoded images using Gemini.
+    Performs OCR on page images using Gemini.
+
+    `images` may be a list or any iterable/generator. Items are either
+    images (numbered in the order they arrive) or (page_index, image)
+    pairs for sources that produce pages out of order. Images are raw
+    bytes or base64 strings; the SDK accepts both for inline data.
+
+    Pages are pulled from the iterable only when fewer than
+    `max_concurrency` requests are in flight, so with a generator source
+    each page flows render -> encode -> OCR as soon as it is ready and
+    peak memory stays proportional to the concurrency, not the page count.
+    The extracted text is joined back in page order. With
+    `use_page_cache`, pages whose rendered image was OCR'd before are
+    answered from the on-disk page cache and never reach the API.
+
+    With `pages_per_request` > 1, uncached pages are packed that many to a
+    request (the last request may hold fewer), and the answer is split
+    back into pages using the page delimiters in OCR_BATCH_PROMPT.
     """
     if not initialize_gemini(api_key):
         return "API Key configuration failed."
 
     # --- THIS WILL CAUSE A 404 ERROR WITH YOUR OLD LIBRARY ---
-    OCR_MODEL = genai.GenerativeModel("models/gemini-2.5-flash-preview-09-2025")  # pyright: ignore[reportPrivateImportUsage]
+    OCR_MODEL = get_model(api_key, OCR_MODEL_NAME, safety_settings=SAFETY_SETTINGS)
+
+    page_cache = get_page_cache() if use_page_cache else None
+    max_concurrency = max(1, max_concurrency)
+    pages_per_request = max(1, pages_per_request)
+    texts = {}
+    in_flight = {}  # future -> [(page index, cache key)] for the pages in that request
+    batch = []      # pages waiting to fill the next request: (page index, image, cache key)
+    cached_count = 0
+    uploaded_bytes = 0
+
+    def collect(done):
+        for future in done:
+            results = future.result()
+            for i, key in in_flight.pop(future):
+                texts[i] = results[i]
+                if page_cache and is_cacheable_text(texts[i]):
+                    page_cache.put(key, texts[i])
+
+    def submit_batch():
+        # Bounded buffering: wait for a slot before sending the next request
+        while len(in_flight) >= max_concurrency:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            collect(done)
+        pages = [(i, image_data) for i, image_data, _ in batch]
+        in_flight[pool.submit(_ocr_page_batch, OCR_MODEL, pages, mime_type)] = [(i, key) for i, _, key in batch]
+        batch.clear()
 
-    if not images_base64:
+    print(f"Starting Gemini OCR (up to {max_concurrency} requests in parallel, "
+          f"{pages_per_request} page(s) per request)...")
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        for position, item in enumerate(images):
+            i, image_data = item if isinstance(item, tuple) else (position, item)
+
+            key = None
+            if page_cache:
+                key = page_cache_key(image_data, cache_model_id(OCR_MODEL_NAME), OCR_PROMPT, mime_type)
+                cached_text = page_cache.get(key)
+                if cached_text is not None:
+                    texts[i] = cached_text
+                    cached_count += 1
+                    continue
+
+            batch.append((i, image_data, key))
+            uploaded_bytes += len(image_data)
+            if len(batch) >= pages_per_request:
+                submit_batch()
+
+        if batch:
+            submit_batch()
+        collect(wait(in_flight).done)
+
+    if page_cache:
+        page_cache.flush()
+
+    if not texts:
         return ""
-        
-    print(f"Starting Gemini OCR for {len(images_base64)} images (one by one)...")
 
-    # This prompt will be used for each individual page
-    prompt_for_single_image = "Extract all text from this image. Maintain line breaks."
-    
-    all_extracted_text = []
-    
-    for i, b64_string in enumerate(images_base64):
-        print(f"  - Processing image {i+1}/{len(images_base64)}...")
-        
-        parts = [
-            {"text": prompt_for_single_image},
-            {
-                "inline_data": {
-                    "mime_type": mime_type,
-                    "data": b64_string
-                }
-            }
-        ]
-        
-        try:
-            response = OCR_MODEL.generate_content(parts, safety_settings=SAFETY_SETTINGS)
-            
-            if response.parts:
-                all_extracted_text.append(response.text)
-            else:
-                reason = response.candidates[0].finish_reason if response.candidates else "Unknown"
-                print(f"    - OCR failed for image {i+1}. Reason: {reason}")
-                all_extracted_text.append(f"[Page {i+1} OCR Failed: {reason}]")
-
-        except Exception as e:
-            print(f"    - An error occurred during OCR for image {i+1}: {e}")
-            all_extracted_text.append(f"[Page {i+1} OCR Error: {e}]")
-
-    print("OCR extraction complete for all images.")
+    print(f"OCR extraction complete for all {len(texts)} images ({cached_count} from cache, "
+          f"{uploaded_bytes / 1024:.0f} KB uploaded).")
     # Join the text from all pages, separated by a new line
-    return "\n".join(all_extracted_text)
\ No newline at end of file
+    return "\n".join(texts[i] for i in sorted(texts))
@@ -0,0 +1,127 @@
+"""
+page_encoding.py
+
+Encodes a rendered page into the image that is sent to the OCR model.
+
+The "fixed" encoding is the original one: the whole page in colour at
+OCR_DPI with JPEG quality 75. The "adaptive" encoding (the default)
+shrinks the upload without touching the text:
+
+- Blank margins are cropped to the bounding box of the ink, plus a
+  little padding. Rows and columns with only a few dark pixels (scanner
+  specks) count as margin.
+- The page is sent as a single-channel grayscale JPEG.
+- Resolution and JPEG quality are chosen from the page's ink density
+  inside the crop: sparse pages (large handwriting, typed text) are sent
+  smaller, dense pages keep the full OCR resolution.
+
+Pages are returned as raw JPEG bytes. The Gemini SDK accepts bytes for
+`inline_data` directly, so pages are no longer base64-encoded (and
+decoded again by the SDK) on the way to the API.
+
+Set SMARTEVAL_OCR_ENCODING=fixed to go back to the original encoding,
+e.g. to compare OCR accuracy (see benchmarks/bench_page_encoding.py).
+"""
+
+import os
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from src.diagram_detection import ink_mask
+
+ENCODINGS = ("adaptive", "fixed")
+OCR_ENCODING = os.environ.get("SMARTEVAL_OCR_ENCODING", "adaptive").lower()
+
+FIXED_DPI = 150
+FIXED_JPEG_QUALITY = 75  # Same as Pillow's default used by the old pdf2image path
+
+# Padding kept around the ink when cropping margins
+CROP_PADDING_INCHES = 0.15
+# Rows/columns with less than this share of dark pixels count as margin
+MIN_INK_SHARE = 0.002
+
+# (highest ink density, dpi, JPEG quality); the first matching profile is used.
+# Scanned handwriting sits around 0.05-0.12, typed pages below 0.05.
+DENSITY_PROFILES = [
+    (0.04, 120, 70),
+    (0.09, 135, 70),
+    (1.00, FIXED_DPI, FIXED_JPEG_QUALITY),
+]
+
+
+@dataclass
+class EncodedPage:
+    """An OCR-ready page image and how it was produced."""
+    data: bytes        # JPEG bytes
+    dpi: int
+    quality: int
+    ink_ratio: float   # share of dark pixels inside the crop
+    cropped: bool
+
+
+def content_box(mask: np.ndarray, padding: int):
+    """
+    Returns the (x0, y0, x1, y1) box around the ink in `mask`, grown by
+    `padding` pixels, or None if the page has no ink.
+    """
+    ink = mask > 0
+    rows = np.flatnonzero(ink.sum(axis=1) >= max(1, mask.shape[1] * MIN_INK_SHARE))
+    cols = np.flatnonzero(ink.sum(axis=0) >= max(1, mask.shape[0] * MIN_INK_SHARE))
+    if rows.size == 0 or cols.size == 0:
+        return None
+    height, width = mask.shape
+    return (max(0, cols[0] - padding), max(0, rows[0] - padding),
+            min(width, cols[-1] + 1 + padding), min(height, rows[-1] + 1 + padding))
+
+
+def choose_profile(ink_ratio: float, max_dpi: int = FIXED_DPI) -> tuple[int, int]:
+    """Picks (dpi, JPEG quality) for a page with the given ink density."""
+    for max_ratio, dpi, quality in DENSITY_PROFILES:
+        if ink_ratio <= max_ratio:
+            return min(dpi, max_dpi), quality
+    return max_dpi, FIXED_JPEG_QUALITY
+
+
+def _resize_and_encode(pixels: np.ndarray, source_dpi: int, dpi: int, quality: int) -> bytes:
+    if dpi != source_dpi:
+        scale = dpi / source_dpi
+        size = (max(1, round(pixels.shape[1] * scale)), max(1, round(pixels.shape[0] * scale)))
+        pixels = cv2.resize(pixels, size, interpolation=cv2.INTER_AREA)
+    ok, jpeg = cv2.imencode(".jpg", pixels, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("Could not encode page as JPEG")
+    return jpeg.tobytes()
+
+
+def encode_page(rgb: np.ndarray, source_dpi: int, gray: np.ndarray = None, max_dpi: int = FIXED_DPI,
+                encoding: str = None) -> EncodedPage:
+    """
+    Encodes one rendered RGB page (rendered at `source_dpi`) for OCR.
+    Pass `gray` if the grayscale page has already been computed.
+    """
+    encoding = (encoding or OCR_ENCODING).lower()
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown OCR encoding {encoding!r}; expected one of {ENCODINGS}")
+
+    if gray is None:
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+    mask = ink_mask(gray)
+
+    if encoding == "fixed":
+        dpi = min(FIXED_DPI, max_dpi)
+        data = _resize_and_encode(cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR), source_dpi, dpi, FIXED_JPEG_QUALITY)
+        return EncodedPage(data, dpi, FIXED_JPEG_QUALITY, float(np.count_nonzero(mask)) / mask.size, False)
+
+    box = content_box(mask, round(CROP_PADDING_INCHES * source_dpi))
+    if box is None:
+        # Nothing on the page: send it whole at the smallest profile
+        dpi, quality = choose_profile(0.0, max_dpi)
+        return EncodedPage(_resize_and_encode(gray, source_dpi, dpi, quality), dpi, quality, 0.0, False)
+
+    x0, y0, x1, y1 = box
+    ink_ratio = float(np.count_nonzero(mask[y0:y1, x0:x1])) / ((x1 - x0) * (y1 - y0))
+    dpi, quality = choose_profile(ink_ratio, max_dpi)
+    data = _resize_and_encode(gray[y0:y1, x0:x1], source_dpi, dpi, quality)
+    return EncodedPage(data, dpi, quality, ink_ratio, box != (0, 0, gray.shape[1], gray.shape[0]))
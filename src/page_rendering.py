@@ -0,0 +1,220 @@
+"""
+page_rendering.py
+
+Rasterizes a PDF once and derives everything the pipeline needs from
+that single render.
+
+Each page is rendered by PyMuPDF at DIAGRAM_DPI. The contour detector
+runs on the full-resolution grayscale image, and the same pixels are
+encoded for the OCR model by `page_encoding.encode_page` (cropped,
+grayscale, at most OCR_DPI). Only the small JPEG and the diagram count
+are kept per page, so peak memory is one full-resolution page rather
+than the whole document.
+
+Blank pages (only ruled lines, margins and scanner noise) are detected
+from the same grayscale pixels and are not encoded at all; the pipeline
+skips OCR for them.
+
+Large scans are split into page ranges that are rendered in parallel by
+a shared process pool; pages are streamed back in page order as their
+ranges finish.
+
+Question papers and answer keys go through the same path with
+`analyze=False`: pages are rendered straight at OCR_DPI and encoded,
+without diagram detection or the blank-page check.
+"""
+
+import os
+import math
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import cv2
+import fitz
+import numpy as np
+
+from src.diagram_detection import pixmap_to_array, count_diagrams_in_gray, ink_mask, DEBUG_DUMP_PAGES
+from src.page_encoding import encode_page, FIXED_DPI
+
+DIAGRAM_DPI = 200  # Contour area thresholds are calibrated for this resolution
+OCR_DPI = FIXED_DPI  # Upper bound; adaptive encoding may send sparse pages smaller
+
+# Worker processes shared by every render in this process (batch workers included)
+RENDER_PROCESSES = max(1, min(4, (os.cpu_count() or 1) - 1))
+# Below this many pages per worker, process start-up/pickling costs more than it saves
+MIN_PAGES_PER_PROCESS = 2
+# Pages rendered per worker task. Each task costs ~35 ms of IPC and PDF
+# reopening against ~200 ms to render a page; two pages per task removes most
+# of that overhead, and the first page waits for only one more render
+# (see benchmarks/bench_rasterization.py --pages-per-task)
+PAGES_PER_TASK = 2
+# Ranges queued per worker process; keeps workers busy while bounding how
+# many rendered pages wait in memory for a slow consumer
+RANGES_IN_FLIGHT_PER_PROCESS = 2
+
+# A page with no diagrams and less ink than this (after removing ruled
+# lines) is blank. The sparsest written page in the sample sheets is ~2%,
+# a blank ruled page ~0.1%. Set SMARTEVAL_BLANK_INK_RATIO=0 to OCR every page.
+BLANK_INK_RATIO = float(os.environ.get("SMARTEVAL_BLANK_INK_RATIO", "0.005"))
+# Strokes longer than 1/N of the page width (or height) are ruled lines
+RULED_LINE_FRACTION = 8
+# The blank check runs on the ink mask shrunk by this factor (~50 DPI)
+BLANK_CHECK_SCALE = 4
+
+
+@dataclass
+class RenderedPage:
+    """What the pipeline keeps from one rendered page."""
+    index: int
+    ocr_image: bytes  # JPEG bytes at up to OCR_DPI; empty for blank pages
+    diagram_count: int
+    blank: bool = False
+
+
+def text_ink_ratio(gray) -> float:
+    """
+    Share of a grayscale page covered by ink, not counting ruled lines,
+    margin lines and page borders (long horizontal or vertical strokes).
+
+    Measured on the ink mask shrunk by BLANK_CHECK_SCALE; a shrunk pixel
+    counts as ink if any pixel it covers was ink, so thin strokes survive.
+    """
+    mask = ink_mask(gray)
+    size = (max(1, mask.shape[1] // BLANK_CHECK_SCALE), max(1, mask.shape[0] // BLANK_CHECK_SCALE))
+    _, mask = cv2.threshold(cv2.resize(mask, size, interpolation=cv2.INTER_AREA), 0, 255, cv2.THRESH_BINARY)
+    height, width = mask.shape
+    horizontal = cv2.getStructuringElement(cv2.MORPH_RECT, (max(1, width // RULED_LINE_FRACTION), 1))
+    vertical = cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(1, height // RULED_LINE_FRACTION)))
+    lines = cv2.bitwise_or(cv2.morphologyEx(mask, cv2.MORPH_OPEN, horizontal),
+                           cv2.morphologyEx(mask, cv2.MORPH_OPEN, vertical))
+    return np.count_nonzero(cv2.subtract(mask, lines)) / mask.size
+
+
+def is_blank_page(gray, diagram_count: int = 0) -> bool:
+    """True if a page has no diagrams and (almost) no writing."""
+    return diagram_count == 0 and text_ink_ratio(gray) < BLANK_INK_RATIO
+
+
+def process_page(page, index: int, render_dpi: int = DIAGRAM_DPI, ocr_dpi: int = OCR_DPI,
+                 dump_dir: str = None, analyze: bool = True) -> RenderedPage:
+    """
+    Renders one PyMuPDF page and returns its OCR image and diagram count.
+    With `analyze=False` the page is only rendered at `ocr_dpi` and encoded.
+    """
+    if not analyze:
+        render_dpi = ocr_dpi
+    zoom = render_dpi / 72
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+    if dump_dir:
+        pix.save(os.path.join(dump_dir, f"page_{index+1}.png"))
+
+    rgb = pixmap_to_array(pix)
+    gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+    if not analyze:
+        return RenderedPage(index=index, ocr_image=encode_page(rgb, render_dpi, gray=gray).data, diagram_count=0)
+
+    diagram_count = count_diagrams_in_gray(gray)
+    if is_blank_page(gray, diagram_count):
+        return RenderedPage(index=index, ocr_image=b"", diagram_count=diagram_count, blank=True)
+
+    encoded = encode_page(rgb, render_dpi, gray=gray, max_dpi=ocr_dpi)
+    return RenderedPage(
+        index=index,
+        ocr_image=encoded.data,
+        diagram_count=diagram_count,
+    )
+
+
+def _render_page_range(pdf_path: str, start: int, stop: int, render_dpi: int, ocr_dpi: int,
+                       dump_dir: str = None, analyze: bool = True) -> list[RenderedPage]:
+    """Renders pages [start, stop) of a PDF. Runs inside a worker process."""
+    with fitz.open(pdf_path) as pdf:
+        return [process_page(pdf.load_page(i), i, render_dpi, ocr_dpi, dump_dir, analyze)
+                for i in range(start, stop)]
+
+
+_process_pools = {}
+_process_pools_lock = threading.Lock()
+
+def _get_process_pool(processes: int) -> ProcessPoolExecutor:
+    """
+    Returns the shared rendering pool of the given size, creating it on
+    first use. "spawn" is used everywhere because forking a process that
+    already runs threads (Streamlit, the OCR pool) is unsafe, and it is
+    the only option on Windows.
+    """
+    with _process_pools_lock:
+        if processes not in _process_pools:
+            _process_pools[processes] = ProcessPoolExecutor(
+                max_workers=processes, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _process_pools[processes]
+
+
+def iter_rendered_pages(pdf_path: str, processes: int = RENDER_PROCESSES, render_dpi: int = DIAGRAM_DPI,
+                        ocr_dpi: int = OCR_DPI, dump_dir: str = None, analyze: bool = True,
+                        pages_per_task: int = None):
+    """
+    Yields a RenderedPage for every page of a PDF, in page order.
+
+    On a single process each page is rendered only when the consumer asks
+    for it. With more than one process, the document is split into page
+    ranges that are rendered in parallel, and each range is yielded as soon
+    as it and the ranges before it are done. Only a few ranges per process
+    are queued at a time, so a slow consumer holds a bounded number of
+    rendered pages however long the document is.
+    """
+    if dump_dir:
+        os.makedirs(dump_dir, exist_ok=True)
+    with fitz.open(pdf_path) as pdf:
+        page_count = pdf.page_count
+
+        if processes <= 1 or page_count < processes * MIN_PAGES_PER_PROCESS:
+            for i in range(page_count):
+                yield process_page(pdf.load_page(i), i, render_dpi, ocr_dpi, dump_dir, analyze)
+            return
+
+    # Small ranges stream pages out sooner; larger ones reopen the PDF less often
+    chunk = max(1, min(pages_per_task or PAGES_PER_TASK, math.ceil(page_count / processes)))
+    starts = iter(range(0, page_count, chunk))
+    pool = _get_process_pool(processes)
+    pending = deque()
+
+    def submit_next():
+        start = next(starts, None)
+        if start is not None:
+            pending.append(pool.submit(_render_page_range, pdf_path, start, min(start + chunk, page_count),
+                                       render_dpi, ocr_dpi, dump_dir, analyze))
+
+    try:
+        for _ in range(processes * RANGES_IN_FLIGHT_PER_PROCESS):
+            submit_next()
+        # Ranges are submitted in page order, so the earliest pages finish first
+        while pending:
+            pages = pending.popleft().result()
+            submit_next()
+            yield from pages
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def render_pdf_pages(pdf_path: str, render_dpi: int = DIAGRAM_DPI, ocr_dpi: int = OCR_DPI,
+                     dump_dir: str = None, processes: int = RENDER_PROCESSES) -> list[RenderedPage]:
+    """
+    Renders every page of a PDF once, returning a RenderedPage per page in
+    page order. If `dump_dir` is given, full-resolution pages are saved
+    there for debugging.
+    """
+    print(f"Rendering PDF: {pdf_path}")
+    pages = list(iter_rendered_pages(pdf_path, processes, render_dpi, ocr_dpi, dump_dir))
+    print(f"Rendering complete. {len(pages)} pages.")
+    return pages
+
+
+def debug_dump_dir(output_dir: str):
+    """Returns `output_dir` when page dumping is enabled, else None."""
+    return output_dir if DEBUG_DUMP_PAGES else None
@@ -0,0 +1,171 @@
+"""
+pipeline.py
+
+Orchestrates the pre-grading work of an evaluation (PDF conversion,
+OCR and diagram detection) as a small dependency graph.
+
+Independent stages run concurrently; a stage starts as soon as the
+stages it depends on have finished. Progress is reported back to the
+caller (on the caller's thread) each time a stage completes, so the
+Streamlit progress bar reflects real work instead of fixed steps.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Optional
+
+import fitz
+
+from src.ocr_extraction import (
+    convert_pdf_to_images, extract_text_from_images, OCR_MODEL_NAME, OCR_PROMPT
+)
+from src.page_rendering import iter_rendered_pages, debug_dump_dir
+from src.ocr_cache import get_document_cache, document_cache_key, is_cacheable_text
+from src.model_registry import cache_model_id
+
+# Friendly labels used for progress messages
+STAGE_LABELS = {
+    "question_text": "Read question paper",
+    "key_text": "Read answer key",
+    "student_sheet": "Read student sheet and counted diagrams",
+}
+
+
+def run_stage_graph(stages: dict, max_workers: int = 4,
+                    on_stage_complete: Optional[Callable[[str, int, int], None]] = None) -> dict:
+    """
+    Runs a dependency graph of stages and returns {stage_name: result}.
+
+    `stages` maps a stage name to (func, [dependency names]). Each func is
+    called with the results of its dependencies as positional arguments,
+    in the order they are listed. `on_stage_complete(name, done, total)`
+    is invoked from the calling thread after every stage finishes.
+    The first stage to raise cancels anything not yet started and the
+    exception is re-raised.
+    """
+    for name, (_, deps) in stages.items():
+        missing = [d for d in deps if d not in stages]
+        if missing:
+            raise ValueError(f"Stage '{name}' depends on unknown stage(s): {missing}")
+
+    results = {}
+    pending = dict(stages)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            # Submit every stage whose dependencies are satisfied
+            ready = [name for name, (_, deps) in pending.items() if all(d in results for d in deps)]
+            for name in ready:
+                func, deps = pending.pop(name)
+                running[pool.submit(func, *[results[d] for d in deps])] = name
+
+            if not running:
+                raise ValueError(f"Stage graph has a cycle: {sorted(pending)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception:
+                    for other in running:
+                        other.cancel()
+                    raise
+                if on_stage_complete:
+                    on_stage_complete(name, len(results), len(stages))
+
+    return results
+
+
+def iter_document_pages(pdf_path: str, poppler_path: Optional[str] = None):
+    """
+    Yields (page_index, OCR image) for a question paper or answer key, in
+    page order, as pages are rendered. Rendering runs on the shared PyMuPDF
+    process pool (see `page_rendering`); files PyMuPDF can't open are
+    converted with Poppler instead.
+    """
+    try:
+        for page in iter_rendered_pages(pdf_path, analyze=False):
+            yield page.index, page.ocr_image
+    except fitz.FileDataError as e:
+        print(f"PyMuPDF could not open {pdf_path} ({e}); converting with Poppler")
+        yield from enumerate(convert_pdf_to_images(pdf_path, poppler_path))
+
+
+def ocr_document_cached(pdf_path: str, api_key: str, poppler_path: Optional[str] = None) -> str:
+    """
+    Returns the OCR text of a PDF, rendering and OCR-ing it only if the
+    same file (by content hash) has not been read before. Pages are OCR'd
+    as they are rendered.
+
+    Used for the question paper and answer key, which are identical for
+    every student in a class.
+    """
+    cache = get_document_cache()
+    key = document_cache_key(pdf_path, cache_model_id(OCR_MODEL_NAME), OCR_PROMPT)
+
+    cached_text = cache.get(key)
+    if cached_text is not None:
+        print(f"OCR cache hit for {pdf_path}")
+        cache.flush()
+        return cached_text
+
+    text = extract_text_from_images(iter_document_pages(pdf_path, poppler_path), api_key=api_key)
+    if is_cacheable_text(text):
+        cache.put(key, text)
+    return text
+
+
+def read_student_sheet(student_pdf: str, api_key: str, dump_dir: str = None) -> dict:
+    """
+    Renders the student sheet once and streams each page straight into
+    OCR as it is rendered, counting diagrams on the way through. Blank
+    pages are not sent to OCR.
+
+    Returns {"student_text": ..., "diagram_count": ..., "skipped_pages": [page numbers]}.
+    """
+    diagram_counts = []
+    skipped_pages = []
+
+    def pages():
+        for page in iter_rendered_pages(student_pdf, dump_dir=dump_dir):
+            diagram_counts.append(page.diagram_count)
+            if page.blank:
+                skipped_pages.append(page.index + 1)
+                continue
+            yield page.index, page.ocr_image
+
+    student_text = extract_text_from_images(pages(), api_key=api_key)
+    if skipped_pages:
+        print(f"Skipped OCR for {len(skipped_pages)} blank page(s): {sorted(skipped_pages)}")
+    return {"student_text": student_text, "diagram_count": sum(diagram_counts),
+            "skipped_pages": sorted(skipped_pages)}
+
+
+def run_document_pipelines(question_pdf: str, key_pdf: str, student_pdf: str, api_key: str,
+                           poppler_path: Optional[str] = None,
+                           diagram_dir: str = "outputs/diagram_temp",
+                           on_stage_complete: Optional[Callable[[str, int, int], None]] = None) -> dict:
+    """
+    Converts and OCRs the question paper, answer key and student sheet,
+    and counts diagrams on the student sheet, all concurrently. The
+    question paper and answer key go through the OCR cache; the student
+    sheet is rendered once for both OCR and diagram detection, so it is a
+    single stage.
+
+    Returns a dict with "question_text", "key_text", "student_text" and
+    "diagram_count" - everything `grade_answers` needs - plus
+    "skipped_pages" (blank student pages not sent to OCR) and
+    "ocr_cache_stats".
+    """
+    stages = {
+        "question_text": (lambda: ocr_document_cached(question_pdf, api_key, poppler_path), []),
+        "key_text": (lambda: ocr_document_cached(key_pdf, api_key, poppler_path), []),
+        "student_sheet": (lambda: read_student_sheet(student_pdf, api_key, debug_dump_dir(diagram_dir)), []),
+    }
+
+    results = run_stage_graph(stages, max_workers=len(stages), on_stage_complete=on_stage_complete)
+    output = {"question_text": results["question_text"], "key_text": results["key_text"],
+              **results["student_sheet"]}
+    output["ocr_cache_stats"] = get_document_cache().stats()
+    return output
@@ -0,0 +1,189 @@
+"""
+prompt_cache.py
+
+Reuse of the static part of grading prompts across a class.
+
+A grading prompt is split into a prefix that is the same for every
+student of an exam (instructions, question paper, answer key, rules,
+grading philosophy, output format) and a short per-student suffix
+(the OCR'd answer sheet and diagram count). The prefix is registered
+here by its hash, together with a hash of the API key, since a context
+cache belongs to the project of the key that created it:
+
+- With the Gemini backend, once a prefix is used a second time it is
+  stored as an explicit context cache (`cachedContents`) and later
+  students send only their suffix. Caches live for
+  CONTEXT_CACHE_TTL_SECONDS. Prefixes shorter than the API's minimum
+  cache size, models without caching support, and SMARTEVAL_CONTEXT_CACHE=off
+  fall back to sending the whole prompt.
+- Otherwise the full prompt is sent with the prefix first and
+  byte-identical for every student, which is what lets the API's
+  implicit prefix caching hit.
+
+Either way, each response's usage metadata is recorded, so a batch can
+report how many prompt tokens were served from a cache.
+"""
+
+import os
+import time
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from typing import Optional
+
+from google.generativeai import protos
+
+from src.model_registry import get_backend, get_client, forget_cached_model
+from src.rate_limiter import call_with_retry, get_limiter, is_retryable
+
+# "auto" uses explicit context caches where possible; "off" never creates them
+CONTEXT_CACHE_MODE = os.environ.get("SMARTEVAL_CONTEXT_CACHE", "auto").lower()
+CONTEXT_CACHE_TTL_SECONDS = int(os.environ.get("SMARTEVAL_CONTEXT_CACHE_TTL", "3600"))
+# Explicit caches below this size are rejected by the API (Gemini 2.5 Flash)
+MIN_CACHE_TOKENS = 1024
+# Rough size estimate used until the API reports real token counts
+CHARS_PER_TOKEN = 4
+# Stop using a cache this long before it expires, so in-flight requests don't race it
+EXPIRY_MARGIN_SECONDS = 120
+
+
+def prefix_hash(api_key: str, model_name: str, prefix: str) -> str:
+    key_hash = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{key_hash}\0{model_name}\0{prefix}".encode("utf-8")).hexdigest()
+
+
+@dataclass
+class PrefixEntry:
+    """What the registry knows about one prompt prefix."""
+    digest: str
+    estimated_tokens: int
+    uses: int = 0
+    cache_name: Optional[str] = None  # explicit context cache, if one is live
+    cache_tokens: int = 0             # its size as reported by the API
+    expires_at: float = 0.0           # time.time() when the cache expires
+    cache_failed: bool = False        # creation was refused outright; don't ask again
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+
+class PrefixRegistry:
+    """Prompt prefixes seen in this process, their context caches, and token counters."""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "prefix_reuses": 0, "reused_prefix_tokens": 0, "explicit_cache_requests": 0,
+                       "caches_created": 0, "prompt_tokens": 0, "cached_tokens": 0, "output_tokens": 0}
+
+    def register(self, api_key: str, model_name: str, prefix: str) -> PrefixEntry:
+        """Records one use of `prefix` with `api_key` and returns its entry."""
+        digest = prefix_hash(api_key, model_name, prefix)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                entry = self._entries[digest] = PrefixEntry(digest, len(prefix) // CHARS_PER_TOKEN)
+            entry.uses += 1
+            self._stats["requests"] += 1
+            if entry.uses > 1:
+                # Tokens a cache can serve for this request (estimated until a context cache reports its size)
+                self._stats["prefix_reuses"] += 1
+                self._stats["reused_prefix_tokens"] += entry.cache_tokens or entry.estimated_tokens
+            return entry
+
+    def context_cache(self, api_key: str, model_name: str, entry: PrefixEntry, prefix: str) -> Optional[str]:
+        """
+        Returns the name of a live context cache holding `prefix`, creating
+        one if the prefix is being reused, or None to send the whole prompt.
+        """
+        if CONTEXT_CACHE_MODE == "off" or get_backend() != "gemini":
+            return None
+        if entry.cache_failed or entry.estimated_tokens < MIN_CACHE_TOKENS:
+            return None
+
+        # One thread creates the cache; the others wait for it rather than making their own
+        with entry.lock:
+            if entry.cache_name and time.time() < entry.expires_at - EXPIRY_MARGIN_SECONDS:
+                return entry.cache_name
+            if entry.cache_name:
+                forget_cached_model(entry.cache_name)
+                entry.cache_name = None
+            if entry.uses < 2 or entry.cache_failed:
+                # A prefix used once doesn't pay for its cache storage
+                return None
+
+            request = protos.CreateCachedContentRequest(cached_content=protos.CachedContent(
+                model=model_name,
+                display_name=f"smarteval-{entry.digest[:16]}",
+                contents=[protos.Content(role="user", parts=[protos.Part(text=prefix)])],
+                ttl={"seconds": CONTEXT_CACHE_TTL_SECONDS},
+            ))
+            try:
+                cached = call_with_retry(get_client(api_key, "cache").create_cached_content, request,
+                                         limiter=get_limiter(model_name))
+            except Exception as e:
+                if is_retryable(e):
+                    # Quota or server trouble: send this prompt whole and try again on the next reuse
+                    print(f"Could not create a context cache for {model_name} ({e}); sending the full prompt")
+                    return None
+                # Refused (prefix too small, model without caching, ...); this won't change
+                print(f"Context caching unavailable for {model_name}, sending full prompts: {e}")
+                entry.cache_failed = True
+                return None
+
+            entry.cache_name = cached.name
+            entry.cache_tokens = cached.usage_metadata.total_token_count
+            entry.expires_at = time.time() + CONTEXT_CACHE_TTL_SECONDS
+            with self._lock:
+                self._stats["caches_created"] += 1
+            print(f"Created context cache {cached.name} ({entry.cache_tokens} tokens)")
+            return entry.cache_name
+
+    def invalidate(self, entry: PrefixEntry):
+        """Stops using `entry`'s context cache, e.g. after the API no longer finds it."""
+        with entry.lock:
+            if entry.cache_name:
+                forget_cached_model(entry.cache_name)
+            entry.cache_name = None
+
+    def record_usage(self, response, used_context_cache: bool = False):
+        """Adds a response's token counts to the counters."""
+        usage = getattr(response, "usage_metadata", None)
+        with self._lock:
+            if used_context_cache:
+                self._stats["explicit_cache_requests"] += 1
+            if usage is not None:
+                self._stats["prompt_tokens"] += usage.prompt_token_count
+                self._stats["cached_tokens"] += usage.cached_content_token_count
+                self._stats["output_tokens"] += usage.candidates_token_count
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "prefixes": len(self._entries),
+                    "live_caches": sum(1 for e in self._entries.values() if e.cache_name)}
+
+
+def token_savings(before: dict, after: dict) -> dict:
+    """
+    Token counters between two `stats()` snapshots, e.g. around a batch,
+    with the share of prompt tokens that were served from a cache.
+    """
+    delta = {key: after[key] - before.get(key, 0) for key in
+             ("requests", "prefix_reuses", "reused_prefix_tokens", "explicit_cache_requests", "caches_created",
+              "prompt_tokens", "cached_tokens", "output_tokens")}
+    delta["cached_share"] = delta["cached_tokens"] / delta["prompt_tokens"] if delta["prompt_tokens"] else 0.0
+    return delta
+
+
+def describe_savings(savings: dict) -> str:
+    """One-line summary of `token_savings` for logs and the UI."""
+    return (f"{savings['requests']} grading requests ({savings['prefix_reuses']} reused a prompt prefix of "
+            f"~{savings['reused_prefix_tokens']:,} tokens in total, "
+            f"{savings['explicit_cache_requests']} via context cache); "
+            f"{savings['cached_tokens']:,} of {savings['prompt_tokens']:,} prompt tokens served from cache "
+            f"({savings['cached_share']:.0%})")
+
+
+_registry = PrefixRegistry()
+
+def get_prefix_registry() -> PrefixRegistry:
+    """Returns the process-wide prefix registry."""
+    return _registry
@@ -0,0 +1,195 @@
+"""
+rate_limiter.py
+
+Shared throttling and retries for model API calls.
+
+Every Gemini call from OCR and grading goes through `call_with_retry`
+with the limiter for its model, so a batch run with several students
+and several pages per student in flight still stays within one quota:
+
+- A token bucket caps the request rate (requests per minute, with a
+  small burst).
+- A concurrency gate caps calls in flight. It is halved whenever the API
+  answers 429 and grows back by one after a run of successes (AIMD).
+- Retryable failures (429, 5xx, timeouts) are retried with exponential
+  backoff and full jitter. A retry delay sent by the server (RetryInfo,
+  Retry-After or "retry in Ns") is used instead when present.
+
+Each limiter keeps counters (calls, retries, 429s, time spent throttled
+and backing off) for the UI and the batch runner to report.
+"""
+
+import os
+import re
+import time
+import random
+import threading
+
+from google.api_core import exceptions as api_exceptions
+
+# Per-model quota; override with SMARTEVAL_REQUESTS_PER_MINUTE
+DEFAULT_REQUESTS_PER_MINUTE = int(os.environ.get("SMARTEVAL_REQUESTS_PER_MINUTE", "60"))
+DEFAULT_BURST = 4
+DEFAULT_MAX_CONCURRENCY = 8
+# Successful calls needed before the concurrency limit grows by one
+INCREASE_AFTER_SUCCESSES = 10
+
+MAX_ATTEMPTS = 5
+BASE_DELAY_SECONDS = 1.0
+MAX_DELAY_SECONDS = 60.0
+
+RETRYABLE_ERRORS = (
+    api_exceptions.TooManyRequests,      # 429, includes ResourceExhausted
+    api_exceptions.InternalServerError,  # 500
+    api_exceptions.BadGateway,           # 502
+    api_exceptions.ServiceUnavailable,   # 503
+    api_exceptions.GatewayTimeout,       # 504, includes DeadlineExceeded
+)
+
+_RETRY_IN_PATTERN = re.compile(r"retry in ([\d.]+)\s*s", re.IGNORECASE)
+_RETRY_DELAY_PATTERN = re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)")
+
+
+def is_rate_limited(error: Exception) -> bool:
+    return isinstance(error, api_exceptions.TooManyRequests)
+
+
+def is_retryable(error: Exception) -> bool:
+    return isinstance(error, RETRYABLE_ERRORS)
+
+
+def retry_after_seconds(error: Exception):
+    """
+    Reads the server's suggested retry delay from an API error, or returns
+    None if it didn't send one.
+    """
+    for detail in getattr(error, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None and (delay.seconds or delay.nanos):
+            return delay.seconds + delay.nanos / 1e9
+
+    response = getattr(error, "response", None)
+    header = getattr(response, "headers", {}).get("Retry-After") if response is not None else None
+    if header:
+        try:
+            return float(header)
+        except ValueError:
+            pass
+
+    message = str(error)
+    for pattern in (_RETRY_IN_PATTERN, _RETRY_DELAY_PATTERN):
+        match = pattern.search(message)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def backoff_delay(attempt: int, base: float = BASE_DELAY_SECONDS, cap: float = MAX_DELAY_SECONDS) -> float:
+    """Exponential backoff with full jitter for the given (0-based) retry attempt."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class RateLimiter:
+    """Token bucket plus an adaptive cap on calls in flight."""
+
+    def __init__(self, requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE, burst: int = DEFAULT_BURST,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        self.rate = requests_per_minute / 60.0
+        self.burst = max(1, burst)
+        self.max_concurrency = max(1, max_concurrency)
+        self.concurrency = self.max_concurrency
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+        self._in_flight = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+        self._stats = {"calls": 0, "retries": 0, "rate_limited": 0, "failures": 0,
+                       "throttled_seconds": 0.0, "backoff_seconds": 0.0}
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self):
+        """Blocks until a call may start: a free slot and a token are both available."""
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                self._refill()
+                if self._in_flight < self.concurrency and self._tokens >= 1:
+                    self._tokens -= 1
+                    self._in_flight += 1
+                    break
+                if self._in_flight >= self.concurrency:
+                    self._cond.wait()
+                else:
+                    self._cond.wait((1 - self._tokens) / self.rate)
+            self._stats["throttled_seconds"] += time.monotonic() - started
+
+    def release(self, rate_limited: bool = False):
+        """Ends a call; a 429 halves the concurrency limit, successes slowly raise it."""
+        with self._cond:
+            self._in_flight -= 1
+            self._stats["calls"] += 1
+            if rate_limited:
+                self._stats["rate_limited"] += 1
+                self._successes = 0
+                self.concurrency = max(1, self.concurrency // 2)
+                # Drop saved-up tokens so the retry wave doesn't burst straight back
+                self._tokens = min(self._tokens, 0.0)
+            else:
+                self._successes += 1
+                if self._successes >= INCREASE_AFTER_SUCCESSES and self.concurrency < self.max_concurrency:
+                    self.concurrency += 1
+                    self._successes = 0
+            self._cond.notify_all()
+
+    def record(self, key: str, amount: float = 1):
+        with self._cond:
+            self._stats[key] += amount
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {**self._stats, "concurrency": self.concurrency, "in_flight": self._in_flight}
+
+
+def call_with_retry(func, *args, limiter: RateLimiter, max_attempts: int = MAX_ATTEMPTS,
+                    sleep=time.sleep, **kwargs):
+    """
+    Calls `func(*args, **kwargs)` under `limiter`, retrying retryable API
+    errors up to `max_attempts` times in total. The last error is raised
+    if every attempt fails; non-retryable errors are raised immediately.
+    """
+    for attempt in range(max_attempts):
+        limiter.acquire()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            limited = is_rate_limited(e)
+            limiter.release(rate_limited=limited)
+            if not is_retryable(e) or attempt == max_attempts - 1:
+                limiter.record("failures")
+                raise
+            delay = retry_after_seconds(e)
+            if delay is None:
+                delay = backoff_delay(attempt)
+            print(f"    - API call failed ({type(e).__name__}); retry {attempt + 1}/{max_attempts - 1} "
+                  f"in {delay:.1f}s")
+            limiter.record("retries")
+            limiter.record("backoff_seconds", delay)
+            sleep(delay)
+        else:
+            limiter.release()
+            return result
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(name: str) -> RateLimiter:
+    """Returns the process-wide limiter for `name` (one per model, i.e. per quota)."""
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = RateLimiter()
+        return _limiters[name]
@@ -0,0 +1,85 @@
+"""
+render_budget.py
+
+Per-rerun timing for the Streamlit pages.
+
+Every Streamlit rerun executes the script top to bottom, so a page that
+is rendered twice or a section that suddenly takes longer is otherwise
+invisible. `track_page` wraps a page function and `budget_section`
+times a named step inside it (load, aggregate, chart build, serialize).
+
+Streamlit runs each session's script on its own thread, so timings are
+kept per thread: `begin_rerun()` starts a fresh report at the top of the
+script and `current_report()` returns it for display.
+"""
+
+import time
+import functools
+import threading
+from contextlib import contextmanager
+
+# A page whose total render time goes over this is reported as over budget
+PAGE_BUDGET_MS = 1500
+
+_local = threading.local()
+
+
+def begin_rerun() -> dict:
+    """Starts a new timing report for this rerun and returns it."""
+    _local.report = {"pages": [], "warnings": [], "started": time.perf_counter()}
+    _local.page = None
+    return _local.report
+
+
+def current_report() -> dict:
+    """Returns this rerun's report, starting one if needed."""
+    report = getattr(_local, "report", None)
+    return report if report is not None else begin_rerun()
+
+
+@contextmanager
+def budget_section(name: str):
+    """Times the enclosed block as section `name` of the page being rendered."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        page = getattr(_local, "page", None)
+        if page is not None:
+            page["sections"][name] = page["sections"].get(name, 0.0) + elapsed_ms
+
+
+def track_page(name: str, budget_ms: float | None = PAGE_BUDGET_MS):
+    """
+    Decorator for a page function. Records the page's total time and its
+    sections in the current report, and warns if the page is rendered more
+    than once in the same rerun or runs over `budget_ms`. Pages that wait
+    on OCR and grading (Evaluate, Batch) pass `budget_ms=None`: they are
+    still timed but never reported as over budget.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            report = current_report()
+            if any(p["name"] == name for p in report["pages"]):
+                _warn(report, f"Page '{name}' rendered more than once in this rerun.")
+
+            page = {"name": name, "sections": {}, "total_ms": 0.0}
+            report["pages"].append(page)
+            outer_page, _local.page = getattr(_local, "page", None), page
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                page["total_ms"] = (time.perf_counter() - started) * 1000
+                _local.page = outer_page
+                if budget_ms is not None and page["total_ms"] > budget_ms:
+                    _warn(report, f"Page '{name}' took {page['total_ms']:.0f} ms (budget {budget_ms:.0f} ms).")
+        return wrapper
+    return decorator
+
+
+def _warn(report: dict, message: str):
+    print(f"Render budget: {message}")
+    report["warnings"].append(message)
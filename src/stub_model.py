@@ -0,0 +1,169 @@
+"""
+stub_model.py
+
+A local, deterministic stand-in for the Gemini model, used to exercise
+and benchmark the OCR/grading pipeline on a machine with no API key or
+network access.
+
+`StubModel.generate_content` accepts the same inputs the pipeline sends
+to Gemini and returns a real `GenerateContentResponse`, so the callers'
+`.parts` / `.text` / `.candidates` handling runs unchanged:
+
+- OCR requests (prompt + inline image) get a few lines of fake text
+  derived from a hash of the image. Requests carrying several images get
+  one "=== PAGE n ===" section per image, as OCR_BATCH_PROMPT asks.
+- Grading requests (one text prompt) get a ```json analytics block with
+  a per-question breakdown, followed by a short Markdown report. When the
+  model or request asks for response_mime_type="application/json" they
+  get a single {"analytics", "report"} JSON object instead.
+
+The same input always produces the same output. Behaviour is set with
+environment variables (or constructor arguments):
+
+    SMARTEVAL_STUB_LATENCY       seconds per call (default 0.5)
+    SMARTEVAL_STUB_PAGE_LATENCY  extra seconds per image after the first (default 0)
+    SMARTEVAL_STUB_JITTER        +/- seconds added at random (default 0.1)
+    SMARTEVAL_STUB_FAILURE_RATE  share of calls failing with 503 (default 0)
+    SMARTEVAL_STUB_SEED          seed for latency jitter and failures (default 0)
+"""
+
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+
+from google.api_core import exceptions as api_exceptions
+from google.generativeai import protos
+from google.generativeai.types import GenerateContentResponse
+
+STUB_QUESTIONS = [("1", "a", 5), ("1", "b", 5), ("2", "a", 10), ("3", "a", 5), ("3", "b", 5)]
+
+
+def _digest(*parts) -> bytes:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+    return h.digest()
+
+
+# Tokens Gemini counts for one image
+IMAGE_TOKENS = 258
+
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // 4
+
+
+def _text_response(text: str, prompt_tokens: int = 0) -> GenerateContentResponse:
+    """Wraps `text` in the response type the Gemini SDK returns, with estimated token usage."""
+    output_tokens = _estimate_tokens(text)
+    return GenerateContentResponse.from_response(protos.GenerateContentResponse(
+        candidates=[protos.Candidate(
+            content=protos.Content(parts=[protos.Part(text=text)], role="model"),
+            finish_reason=protos.Candidate.FinishReason.STOP,
+        )],
+        usage_metadata=protos.GenerateContentResponse.UsageMetadata(
+            prompt_token_count=prompt_tokens, candidates_token_count=output_tokens,
+            total_token_count=prompt_tokens + output_tokens,
+        ),
+    ))
+
+
+def stub_ocr_text(image_data: str) -> str:
+    """Fake page text for one image, stable for the same image."""
+    tag = _digest(image_data).hex()[:8]
+    return "\n".join(f"Stub answer line {n} for page {tag}" for n in range(1, 4))
+
+
+def stub_analytics(prompt: str) -> dict:
+    """Canned analytics in the format the grading prompt asks for."""
+    seed = _digest(prompt)
+    breakdown = []
+    for i, (question, part, max_marks) in enumerate(STUB_QUESTIONS):
+        awarded = seed[i] % (max_marks + 1)
+        breakdown.append({
+            "question": question, "part": part, "description": "Stub concept",
+            "feedback": "Generated offline by the stub model.",
+            "marks_awarded": awarded, "max_marks": max_marks,
+        })
+
+    awarded = sum(item["marks_awarded"] for item in breakdown)
+    max_total = sum(item["max_marks"] for item in breakdown)
+    question_wise = {}
+    for item in breakdown:
+        q = question_wise.setdefault(item["question"], {"question": f"Q{item['question']}", "awarded": 0, "max": 0})
+        q["awarded"] += item["marks_awarded"]
+        q["max"] += item["max_marks"]
+    for q in question_wise.values():
+        q["percentage"] = round(q["awarded"] / q["max"] * 100, 1)
+
+    return {
+        "total_score": {"awarded": awarded, "max": max_total, "percentage": round(awarded / max_total * 100, 1)},
+        "section_wise": [{"section": "Section A", "awarded": awarded, "max": max_total,
+                          "percentage": round(awarded / max_total * 100, 1)}],
+        "question_wise": list(question_wise.values()),
+        "diagram_performance": {"required_estimate": 2, "found_estimate": seed[-1] % 3},
+        "detailed_breakdown": breakdown,
+    }
+
+
+def _wants_json(generation_config) -> bool:
+    """Whether a generation config (dict or GenerationConfig) asks for JSON output."""
+    if isinstance(generation_config, dict):
+        return generation_config.get("response_mime_type") == "application/json"
+    return getattr(generation_config, "response_mime_type", None) == "application/json"
+
+
+class StubModel:
+    """Offline model with configurable latency and failure rate."""
+
+    def __init__(self, model_name: str, latency: float = None, jitter: float = None,
+                 failure_rate: float = None, seed: int = None, page_latency: float = None,
+                 generation_config=None):
+        self.model_name = model_name
+        self.generation_config = generation_config
+        self.latency = float(os.environ.get("SMARTEVAL_STUB_LATENCY", "0.5")) if latency is None else latency
+        self.page_latency = (float(os.environ.get("SMARTEVAL_STUB_PAGE_LATENCY", "0"))
+                             if page_latency is None else page_latency)
+        self.jitter = float(os.environ.get("SMARTEVAL_STUB_JITTER", "0.1")) if jitter is None else jitter
+        self.failure_rate = (float(os.environ.get("SMARTEVAL_STUB_FAILURE_RATE", "0"))
+                             if failure_rate is None else failure_rate)
+        seed = int(os.environ.get("SMARTEVAL_STUB_SEED", "0")) if seed is None else seed
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def generate_content(self, contents, **kwargs) -> GenerateContentResponse:
+        # OCR requests: [{"text": prompt}, {"inline_data": {...}}, ...]
+        images = [] if isinstance(contents, str) else [
+            part["inline_data"]["data"] for part in contents if isinstance(part, dict) and "inline_data" in part
+        ]
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            delay += self.page_latency * max(0, len(images) - 1)
+            fail = self._random.random() < self.failure_rate
+        time.sleep(delay)
+        if fail:
+            raise api_exceptions.ServiceUnavailable("Stub model: simulated outage")
+
+        if isinstance(contents, str):
+            analytics = stub_analytics(contents)
+            report = ("The student attempted every question (stub report).\n\n"
+                      "### Strengths\n- Consistent structure\n\n"
+                      "### Areas for Improvement\n- Add more detail")
+            if _wants_json(kwargs.get("generation_config") or self.generation_config):
+                return _text_response(json.dumps({"analytics": analytics, "report": report}),
+                                      _estimate_tokens(contents))
+            return _text_response(f"```json\n{json.dumps(analytics, indent=2)}\n```\n\n{report}",
+                                  _estimate_tokens(contents))
+
+        prompt_tokens = len(images) * IMAGE_TOKENS + sum(
+            _estimate_tokens(part["text"]) for part in contents if isinstance(part, dict) and "text" in part
+        )
+        if len(images) > 1:
+            return _text_response("\n".join(f"=== PAGE {n} ===\n{stub_ocr_text(data)}"
+                                             for n, data in enumerate(images, 1)), prompt_tokens)
+        return _text_response(stub_ocr_text(images[0] if images else ""), prompt_tokens)
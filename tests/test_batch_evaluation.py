@@ -0,0 +1,146 @@
+import os
+import json
+
+import fitz
+import pytest
+
+from src import batch_evaluation, ocr_cache, pipeline, rate_limiter
+from src.answer_grader import GRADING_MODEL_NAME
+from src.batch_evaluation import find_answer_sheets, run_batch_evaluation
+from src.evaluation_store import score_path, has_valid_score
+from src.job_queue import JobQueue
+from src.model_registry import set_backend
+from src.ocr_extraction import OCR_MODEL_NAME
+
+SUBJECT = "OS - Internal 1"
+
+
+def _pdf(path, lines):
+    doc = fitz.open()
+    page = doc.new_page(width=300, height=400)
+    for n, line in enumerate(lines):
+        page.insert_text((30, 60 + 30 * n), line, fontsize=14)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+@pytest.fixture
+def batch(tmp_path, monkeypatch):
+    """A question paper, answer key and three sheets, graded offline by the stub model."""
+    monkeypatch.setenv("SMARTEVAL_STUB_LATENCY", "0")
+    monkeypatch.setenv("SMARTEVAL_STUB_JITTER", "0")
+    monkeypatch.setattr(ocr_cache, "DOCUMENT_CACHE_DIR", str(tmp_path / "cache" / "documents"))
+    monkeypatch.setattr(ocr_cache, "PAGE_CACHE_DIR", str(tmp_path / "cache" / "pages"))
+    for name in {OCR_MODEL_NAME, GRADING_MODEL_NAME}:
+        monkeypatch.setitem(rate_limiter._limiters, name, rate_limiter.RateLimiter(requests_per_minute=60000,
+                                                                                    burst=100))
+    set_backend("stub")
+
+    sheets = tmp_path / "sheets"
+    sheets.mkdir()
+    _pdf(sheets / "2c30309.pdf", ["1a. Paging splits memory into frames."])
+    _pdf(sheets / "2C30314.pdf", ["1a. A TLB caches page table entries."])
+    _pdf(sheets / "2C30330.pdf", [])  # handed in blank: nothing to OCR, so nothing to grade
+
+    real_grade_answers = batch_evaluation.grade_answers
+
+    def grade_answers(question_text, key_text, student_text, *args, **kwargs):
+        if not student_text.strip():
+            return {"report": "Nothing to grade.", "analytics": {}}
+        return real_grade_answers(question_text, key_text, student_text, *args, **kwargs)
+
+    monkeypatch.setattr(batch_evaluation, "grade_answers", grade_answers)
+    yield {
+        "question": _pdf(tmp_path / "question.pdf", ["Q1a. Explain paging. (5)"]),
+        "key": _pdf(tmp_path / "key.pdf", ["1a. Memory is split into fixed-size frames."]),
+        "sheets": str(sheets),
+        "scores": str(tmp_path / "scores"),
+        "queue": JobQueue(str(tmp_path / "jobs.db")),
+    }
+    set_backend("gemini")
+
+
+def _run(batch, **kwargs):
+    return run_batch_evaluation(batch["question"], batch["key"], api_key="batch-test", subject=SUBJECT,
+                                evaluated_by="tester", sheets_dir=batch["sheets"], scores_dir=batch["scores"],
+                                job_queue=batch["queue"], **kwargs)
+
+
+def test_usn_comes_from_the_file_name(batch):
+    assert [usn for usn, _ in find_answer_sheets(batch["sheets"])] == ["2C30309", "2C30314", "2C30330"]
+
+
+def test_batch_saves_graded_students_and_reports_failures(batch):
+    summaries = _run(batch)
+
+    assert [(s["usn"], s["status"]) for s in summaries] == [
+        ("2C30309", "done"), ("2C30314", "done"), ("2C30330", "failed")
+    ]
+    assert summaries[2]["error"] == "Nothing to grade."
+    for usn in ("2C30309", "2C30314"):
+        assert os.path.exists(score_path(usn, batch["scores"], SUBJECT))
+        assert has_valid_score(usn, SUBJECT, batch["scores"])
+    assert not os.path.exists(score_path("2C30330", batch["scores"], SUBJECT))
+
+    # Resuming retries only the failed student, who fails again; nobody is re-graded
+    again = _run(batch, resume=True)
+    assert [(s["usn"], s["status"]) for s in again] == [("2C30330", "failed")]
+
+
+def test_resume_grades_nobody_once_everyone_is_done(batch):
+    os.remove(os.path.join(batch["sheets"], "2C30330.pdf"))
+    assert len(_run(batch)) == 2
+    assert _run(batch, resume=True) == []
+
+
+def test_unreadable_answer_key_aborts_before_grading(batch, monkeypatch):
+    real_ocr = batch_evaluation.ocr_document_cached
+
+    def ocr_document_cached(pdf_path, *args):
+        if pdf_path == batch["key"]:
+            return "1a. Memory is split\n[Page 2 OCR Error: 503 Service Unavailable]"
+        return real_ocr(pdf_path, *args)
+
+    monkeypatch.setattr(batch_evaluation, "ocr_document_cached", ocr_document_cached)
+    with pytest.raises(RuntimeError, match="answer key"):
+        _run(batch)
+    assert not os.path.exists(batch["scores"])  # nothing was saved
+
+
+def _sheet_with_blank_ruled_page(path):
+    doc = fitz.open()
+    written = doc.new_page(width=300, height=400)
+    written.insert_text((30, 60), "1a. Paging splits memory into frames.", fontsize=14)
+    blank = doc.new_page(width=300, height=400)
+    for y in range(60, 400, 20):
+        blank.draw_line((0, y), (300, y), color=(0.6, 0.6, 0.6), width=0.5)
+    blank.draw_line((30, 0), (30, 400), color=(0.5, 0.5, 0.5), width=0.5)
+    blank.insert_text((200, 30), "Date ___ Page ___", fontsize=6)
+    doc.save(str(path))
+    doc.close()
+
+
+def test_blank_pages_skip_ocr_and_are_saved_with_the_record(batch, monkeypatch, tmp_path):
+    sheets = tmp_path / "ruled"
+    sheets.mkdir()
+    _sheet_with_blank_ruled_page(sheets / "2C30319.pdf")
+    ocr_pages = []
+    real_extract = pipeline.extract_text_from_images
+
+    def extract_text_from_images(pages, *args, **kwargs):
+        def recorded():
+            for index, image in pages:
+                ocr_pages.append(index)
+                yield index, image
+        return real_extract(recorded(), *args, **kwargs)
+
+    monkeypatch.setattr(pipeline, "extract_text_from_images", extract_text_from_images)
+    sheet = pipeline.read_student_sheet(str(sheets / "2C30319.pdf"), api_key="batch-test")
+    assert ocr_pages == [0]
+    assert sheet["skipped_pages"] == [2]
+
+    batch["sheets"] = str(sheets)
+    assert [s["status"] for s in _run(batch)] == ["done"]
+    with open(score_path("2C30319", batch["scores"], SUBJECT), encoding="utf-8") as f:
+        assert json.load(f)["skipped_pages"] == [2]
@@ -0,0 +1,31 @@
+import cv2
+import numpy as np
+
+from src.page_rendering import is_blank_page, text_ink_ratio, BLANK_INK_RATIO
+
+
+def _ruled_page(height=2200, width=1600):
+    """A blank ruled booklet page: ruled lines, a margin line and a printed header."""
+    page = np.full((height, width), 255, dtype=np.uint8)
+    page[200::60, :] = 150
+    page[:, 150:153] = 120
+    cv2.putText(page, "Date ___ Page ___", (1100, 100), cv2.FONT_HERSHEY_SIMPLEX, 1.2, 0, 2)
+    return page
+
+
+def test_ruled_page_without_writing_is_blank():
+    page = _ruled_page()
+    assert text_ink_ratio(page) < BLANK_INK_RATIO
+    assert is_blank_page(page)
+
+
+def test_written_page_is_not_blank():
+    page = _ruled_page()
+    for y in range(320, 1400, 60):
+        cv2.putText(page, "The scheduler picks the process with the least burst time",
+                    (200, y), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 30, 2)
+    assert not is_blank_page(page)
+
+
+def test_page_with_a_diagram_is_never_blank():
+    assert not is_blank_page(_ruled_page(), diagram_count=1)
@@ -0,0 +1,84 @@
+import threading
+import time
+
+from src import ocr_extraction
+from src.ocr_extraction import extract_text_from_images
+from src.rate_limiter import RateLimiter
+from src.stub_model import _text_response
+
+
+class _VaryingLatencyModel:
+    """Answers each page after its own delay; pages named "fail..." raise."""
+
+    def __init__(self, latencies):
+        self.latencies = latencies
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.finished = 0
+
+    def generate_content(self, contents, **kwargs):
+        name = contents[1]["inline_data"]["data"].decode()
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.latencies.get(name, 0.01))
+            if name.startswith("fail"):
+                raise ValueError("image could not be decoded")
+            return _text_response(f"text of {name}")
+        finally:
+            with self.lock:
+                self.active -= 1
+                self.finished += 1
+
+
+def _use_model(monkeypatch, model):
+    monkeypatch.setattr(ocr_extraction, "initialize_gemini", lambda api_key: True)
+    monkeypatch.setattr(ocr_extraction, "get_model", lambda *args, **kwargs: model)
+    monkeypatch.setattr(ocr_extraction, "get_limiter", lambda name: RateLimiter(requests_per_minute=60000, burst=100))
+
+
+def test_pages_are_joined_in_source_order_when_they_finish_out_of_order(monkeypatch):
+    # The first pages are the slowest, so they finish last
+    names = [f"p{n}" for n in range(6)]
+    model = _VaryingLatencyModel({"p0": 0.3, "p1": 0.2, "p2": 0.1})
+    _use_model(monkeypatch, model)
+
+    text = extract_text_from_images([name.encode() for name in names], api_key="key",
+                                    max_concurrency=6, use_page_cache=False)
+    assert text.splitlines() == [f"text of {name}" for name in names]
+
+
+def test_indexed_pages_are_ordered_by_index_not_arrival(monkeypatch):
+    _use_model(monkeypatch, _VaryingLatencyModel({}))
+    pages = [(2, b"c"), (0, b"a"), (1, b"b")]
+    text = extract_text_from_images(pages, api_key="key", use_page_cache=False)
+    assert text.splitlines() == ["text of a", "text of b", "text of c"]
+
+
+def test_failed_page_gets_a_placeholder_and_the_rest_still_succeed(monkeypatch):
+    _use_model(monkeypatch, _VaryingLatencyModel({}))
+    text = extract_text_from_images([b"p0", b"fail1", b"p2"], api_key="key", use_page_cache=False)
+    lines = text.splitlines()
+    assert lines[0] == "text of p0"
+    assert lines[1].startswith("[Page 2 OCR Error:")
+    assert lines[2] == "text of p2"
+
+
+def test_at_most_max_concurrency_pages_are_outstanding(monkeypatch):
+    latencies = {f"p{n}": 0.02 * (n % 4 + 1) for n in range(12)}
+    model = _VaryingLatencyModel(latencies)
+    _use_model(monkeypatch, model)
+    outstanding = []
+
+    def pages():
+        for n in range(12):
+            # Pages pulled earlier and not answered yet
+            outstanding.append(n - model.finished)
+            yield f"p{n}".encode()
+
+    text = extract_text_from_images(pages(), api_key="key", max_concurrency=3, use_page_cache=False)
+    assert len(text.splitlines()) == 12
+    assert model.max_active == 3
+    assert max(outstanding) <= 3
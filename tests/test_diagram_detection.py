@@ -0,0 +1,19 @@
+import os
+
+import pytest
+
+from src.diagram_detection import detect_diagrams
+from src.page_rendering import render_pdf_pages
+
+SHEETS_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "answer_sheets")
+
+# Diagram counts of sample sheets, checked by hand
+KNOWN_COUNTS = {"2C30314": 19, "2C30309": 5, "2C30330": 12}
+
+
+@pytest.mark.parametrize("usn, expected", KNOWN_COUNTS.items())
+def test_diagram_counts_of_sample_sheets(usn, expected):
+    path = os.path.join(SHEETS_DIR, f"{usn}.pdf")
+    assert detect_diagrams(path) == expected
+    # The OCR pipeline counts diagrams from its own renders; both must agree
+    assert sum(page.diagram_count for page in render_pdf_pages(path, processes=1)) == expected
@@ -0,0 +1,165 @@
+import json
+import os
+import time
+
+from src.evaluation_store import (
+    EvaluationStore, save_evaluation, score_path, score_percentage, has_valid_score, get_store, subject_slug
+)
+
+
+def make_record(usn, subject="OS - Internal 1", percentage=50.0, timestamp="2025-11-03T10:00:00"):
+    return {
+        "usn": usn,
+        "subject": subject,
+        "timestamp": timestamp,
+        "analytics_data": {"total_score": {"awarded": 10, "max": 20, "percentage": percentage}},
+    }
+
+
+def test_save_indexes_record(tmp_path):
+    scores_dir = str(tmp_path)
+    save_evaluation(make_record("2C30309"), score_path("2C30309", scores_dir), scores_dir)
+
+    store = EvaluationStore(scores_dir)
+    assert [r["usn"] for r in store.query()] == ["2C30309"]
+
+
+def test_queries_filter_and_order(tmp_path):
+    scores_dir = str(tmp_path)
+    store = EvaluationStore(scores_dir)
+    for usn, subject, ts in [("A", "OS", "2025-01-01"), ("B", "OS", "2025-01-03"), ("C", "DBMS", "2025-01-02")]:
+        path = score_path(usn, scores_dir)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(make_record(usn, subject, timestamp=ts), f)
+        store.index_record(make_record(usn, subject, timestamp=ts), path)
+
+    assert [r["usn"] for r in store.by_subject("OS")] == ["B", "A"]
+    assert [r["usn"] for r in store.by_usn("C")] == ["C"]
+    assert [r["usn"] for r in store.recent(2)] == ["B", "C"]
+
+
+def test_sync_picks_up_new_changed_and_deleted_files(tmp_path):
+    scores_dir = str(tmp_path)
+    for usn in ("A", "B"):
+        with open(score_path(usn, scores_dir), "w", encoding="utf-8") as f:
+            json.dump(make_record(usn), f)
+
+    store = EvaluationStore(scores_dir)
+    assert store.sync() == 2
+    assert store.sync() == 0  # nothing changed
+
+    with open(score_path("A", scores_dir), "w", encoding="utf-8") as f:
+        json.dump(make_record("A", percentage=90.0, timestamp="2025-12-01"), f)
+    os.remove(score_path("B", scores_dir))
+
+    assert store.sync() == 1
+    records = store.query()
+    assert [r["usn"] for r in records] == ["A"]
+    assert records[0]["analytics_data"]["total_score"]["percentage"] == 90.0
+
+
+def test_score_percentage_fallbacks():
+    assert score_percentage({"total_score": {"percentage": 72.5}}) == 72.5
+    assert score_percentage({"total": {"awarded": 15, "max": 20}}) == 75.0
+    assert score_percentage({}) == 0
+
+
+def test_subject_summary_tracks_saves_overwrites_and_deletions(tmp_path):
+    scores_dir = str(tmp_path)
+    store = EvaluationStore(scores_dir)
+    for usn, pct in [("A", 30.0), ("B", 80.0)]:
+        path = score_path(usn, scores_dir)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(make_record(usn, percentage=pct), f)
+        store.index_record(make_record(usn, percentage=pct), path)
+
+    summary = store.subject_summary("OS - Internal 1")
+    assert (summary["evaluated"], summary["average"], summary["passed"]) == (2, 55.0, 1)
+
+    # Re-grading A replaces its contribution instead of adding a second one
+    store.index_record(make_record("A", percentage=50.0), score_path("A", scores_dir))
+    summary = store.subject_summary("OS - Internal 1")
+    assert (summary["evaluated"], summary["average"], summary["passed"]) == (2, 65.0, 2)
+    assert summary["histogram"][5] == 1 and summary["histogram"][8] == 1
+
+    os.remove(score_path("B", scores_dir))
+    store.sync_changes()
+    summary = store.subject_summary("OS - Internal 1")
+    assert (summary["evaluated"], summary["average"], summary["failed"]) == (1, 50.0, 0)
+    assert store.subject_summary("DBMS")["evaluated"] == 0
+
+
+def test_subject_summary_picks_up_files_changed_on_disk(tmp_path):
+    scores_dir = str(tmp_path)
+    paths = {}
+    for usn in ("A", "B"):
+        paths[usn] = score_path(usn, scores_dir, "OS")
+        os.makedirs(os.path.dirname(paths[usn]), exist_ok=True)
+        with open(paths[usn], "w", encoding="utf-8") as f:
+            json.dump(make_record(usn, "OS"), f)
+
+    store = EvaluationStore(scores_dir)
+    first = store.subject_summary("OS")
+    assert (first["sync"]["checked"], first["sync"]["reindexed"], first["average"]) == (2, 2, 50.0)
+    again = store.subject_summary("OS")["sync"]
+    assert (again["checked"], again["reindexed"]) == (2, 0)
+
+    # Another process re-grades B; the next summary re-reads just that file
+    with open(paths["B"], "w", encoding="utf-8") as f:
+        json.dump(make_record("B", "OS", percentage=90.0, timestamp="2025-12-01T10:00:00"), f)
+    os.utime(paths["B"], (time.time() + 5, time.time() + 5))
+    summary = store.subject_summary("OS")
+    assert (summary["sync"]["checked"], summary["sync"]["reindexed"], summary["average"]) == (2, 1, 70.0)
+
+
+def test_subjects_are_partitioned_and_supersede_legacy_records(tmp_path):
+    scores_dir = str(tmp_path)
+    # Flat record from before partitioning
+    legacy = score_path("A", scores_dir)
+    with open(legacy, "w", encoding="utf-8") as f:
+        json.dump(make_record("A", "OS - Internal 1", percentage=20.0), f)
+    assert has_valid_score("A", "OS - Internal 1", scores_dir)
+
+    save_evaluation(make_record("A", "DBMS - Internal 1"), score_path("A", scores_dir, "DBMS - Internal 1"), scores_dir)
+    assert os.path.exists(os.path.join(scores_dir, subject_slug("DBMS - Internal 1"), "A.json"))
+    assert os.path.exists(legacy)  # a different subject doesn't touch the old record
+
+    save_evaluation(make_record("A", "OS - Internal 1", percentage=90.0),
+                    score_path("A", scores_dir, "OS - Internal 1"), scores_dir)
+    assert not os.path.exists(legacy)
+
+    store = get_store(scores_dir)
+    assert len(store.by_usn("A")) == 2
+    summary = store.subject_summary("OS - Internal 1")
+    assert (summary["evaluated"], summary["average"]) == (1, 90.0)
+    assert {p["subject"] for p in store.partitions()} == {"OS - Internal 1", "DBMS - Internal 1"}
+
+
+def test_subject_sync_only_reads_its_partition(tmp_path):
+    scores_dir = str(tmp_path)
+    for usn, subject in [("A", "OS"), ("B", "DBMS")]:
+        path = score_path(usn, scores_dir, subject)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(make_record(usn, subject), f)
+
+    store = EvaluationStore(scores_dir)
+    changed, _ = store.sync_changes("OS")
+    assert changed == [f"{subject_slug('OS')}/A.json"]
+    assert [r["usn"] for r in store.by_subject("OS")] == ["A"]
+
+
+def test_similar_subject_names_get_separate_partitions(tmp_path):
+    scores_dir = str(tmp_path)
+    subjects = ["Math/Physics", "Math Physics", "math physics", "MATH-PHYSICS"]
+    assert len({subject_slug(subject) for subject in subjects}) == len(subjects)
+    assert subject_slug("OS - Internal 1").startswith("os-internal-1-")
+
+    store = EvaluationStore(scores_dir)
+    for pct, subject in zip((20.0, 40.0, 60.0, 80.0), subjects):
+        save_evaluation(make_record("A", subject, percentage=pct), score_path("A", scores_dir, subject), scores_dir)
+
+    for pct, subject in zip((20.0, 40.0, 60.0, 80.0), subjects):
+        assert has_valid_score("A", subject, scores_dir)
+        assert store.subject_summary(subject)["average"] == pct
+        assert [r["subject"] for r in store.by_subject(subject)] == [subject]
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from src import answer_grader, model_registry
+from src.grading_schema import (
+    RESPONSE_SCHEMA, AnalyticsError, parse_grading_json, parse_grading_response
+)
+from src.stub_model import StubModel, stub_analytics, _text_response
+
+ANALYTICS = stub_analytics("grade this sheet")
+
+
+def test_structured_answer_parses_into_typed_analytics():
+    result = parse_grading_json(json.dumps({"analytics": ANALYTICS, "report": "Good work."}))
+    assert result.report == "Good work."
+    assert result.analytics.total_score.awarded == ANALYTICS["total_score"]["awarded"]
+    assert len(result.analytics.detailed_breakdown) == len(ANALYTICS["detailed_breakdown"])
+    assert result.analytics.to_dict() == ANALYTICS
+
+
+def test_numbers_sent_as_text_are_coerced_and_missing_total_rebuilt():
+    analytics = {"detailed_breakdown": [
+        {"question": 1, "part": "a", "description": "Paging", "feedback": "Fine",
+         "marks_awarded": "3", "max_marks": "5"},
+        {"question": 1, "part": "b", "description": "TLB", "feedback": "Missing",
+         "marks_awarded": 1.0, "max_marks": 5},
+    ]}
+    result = parse_grading_json(json.dumps({"analytics": analytics, "report": ""}))
+    assert result.analytics.total_score.awarded == 4
+    assert result.analytics.total_score.max == 10
+    assert result.analytics.total_score.percentage == 40.0
+    assert result.analytics.detailed_breakdown[0].question == "1"
+
+
+def test_legacy_layout_still_parses():
+    text = f"```json\n{json.dumps(ANALYTICS)}\n```\n\n### Strengths\n- Clear"
+    result = parse_grading_response(text)
+    assert result.analytics.to_dict() == ANALYTICS
+    assert result.report == "### Strengths\n- Clear"
+
+
+@pytest.mark.parametrize("text", [
+    "No JSON here at all",
+    "```json\n{\"total_score\": \n```",
+    json.dumps({"analytics": {"section_wise": []}, "report": ""}),
+    json.dumps({"analytics": {**ANALYTICS, "total_score": {"awarded": "most", "max": 30}}, "report": ""}),
+])
+def test_unusable_answers_raise(text):
+    with pytest.raises(AnalyticsError):
+        parse_grading_response(text)
+
+
+def test_schema_requires_every_field():
+    analytics = RESPONSE_SCHEMA["properties"]["analytics"]
+    assert RESPONSE_SCHEMA["required"] == ["analytics", "report"]
+    assert set(analytics["required"]) == set(ANALYTICS)
+    assert analytics["properties"]["detailed_breakdown"]["type"] == "array"
+
+
+def test_unreadable_answer_is_reformatted_not_regraded(monkeypatch):
+    reformat = StubModel("models/test", latency=0, jitter=0, generation_config=answer_grader.JSON_GENERATION_CONFIG)
+    monkeypatch.setattr(answer_grader, "initialize_gemini", lambda api_key: True)
+    monkeypatch.setattr(answer_grader, "_generate_grading",
+                        lambda *args, **kwargs: _text_response("Q1a: 3/5. Q1b: 4/5. Good effort overall."))
+    monkeypatch.setattr(answer_grader, "get_model", lambda *args, **kwargs: reformat)
+
+    result = answer_grader.grade_answers("Q", "Key", "Answer", "", "Moderate", 0, "key")
+    assert reformat.calls == 1
+    assert result["analytics"]["total_score"]["max"] == 30
+    assert "Strengths" in result["report"]
+
+
+def test_stub_backend_answers_in_json_mode():
+    try:
+        model_registry.set_backend("stub")
+        model = model_registry.get_model("any-key", "models/test", answer_grader.JSON_GENERATION_CONFIG)
+        model.latency = model.jitter = 0
+        text = model.generate_content("grade this sheet").text
+    finally:
+        model_registry.set_backend("gemini")
+    assert text.startswith("{")
+    assert parse_grading_json(text).analytics.to_dict() == ANALYTICS
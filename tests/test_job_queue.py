@@ -0,0 +1,54 @@
+from src.job_queue import JobQueue, QUEUED, OCR, GRADING, DONE, FAILED
+
+SHEETS = [("2C30309", "a.pdf"), ("2C30314", "b.pdf"), ("2C30315", "c.pdf")]
+
+
+def test_enqueue_and_pending(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    queue.enqueue("b1", SHEETS, already_done=["2C30314"])
+
+    assert queue.pending("b1") == [("2C30309", "a.pdf"), ("2C30315", "c.pdf")]
+    assert queue.counts("b1")[DONE] == 1
+    assert queue.counts("b1")[QUEUED] == 2
+
+
+def test_interrupted_jobs_are_requeued_on_resume(tmp_path):
+    db = str(tmp_path / "jobs.db")
+    queue = JobQueue(db)
+    queue.enqueue("b1", SHEETS)
+    queue.set_state("b1", "2C30309", OCR)
+    queue.set_state("b1", "2C30309", GRADING)
+    queue.set_state("b1", "2C30314", OCR)
+    queue.set_state("b1", "2C30314", GRADING)
+    queue.set_state("b1", "2C30314", DONE)
+
+    # Simulate a restarted process
+    resumed = JobQueue(db)
+    resumed.enqueue("b1", SHEETS)
+    assert resumed.pending("b1") == [("2C30309", "a.pdf"), ("2C30315", "c.pdf")]
+    assert resumed.counts("b1")[DONE] == 1
+
+
+def test_failed_jobs_retry_until_max_attempts(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    queue.enqueue("b1", SHEETS[:1])
+    for _ in range(2):
+        queue.set_state("b1", "2C30309", OCR)
+        queue.set_state("b1", "2C30309", FAILED, error="quota")
+    assert queue.pending("b1", max_attempts=3) == [("2C30309", "a.pdf")]
+    assert queue.pending("b1", max_attempts=2) == []
+
+
+def test_reset_requeues_everything(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    queue.enqueue("b1", SHEETS, already_done=[usn for usn, _ in SHEETS])
+    assert queue.pending("b1") == []
+    queue.reset("b1")
+    assert len(queue.pending("b1")) == 3
+
+
+def test_done_job_without_record_is_requeued(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    queue.enqueue("b1", SHEETS, already_done={"2C30309", "2C30314"})
+    queue.enqueue("b1", SHEETS, already_done={"2C30309"})
+    assert queue.pending("b1") == [("2C30314", "b.pdf"), ("2C30315", "c.pdf")]
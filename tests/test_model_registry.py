@@ -0,0 +1,17 @@
+from src.model_registry import get_client, get_model
+from src.answer_grader import GENERATION_CONFIG, SAFETY_SETTINGS
+
+
+def test_models_are_reused_per_key_and_config():
+    first = get_model("test-key-1", "models/test", GENERATION_CONFIG, SAFETY_SETTINGS)
+    again = get_model("test-key-1", "models/test", GENERATION_CONFIG, dict(SAFETY_SETTINGS))
+    other_config = get_model("test-key-1", "models/test")
+
+    assert first is again
+    assert other_config is not first
+    assert first._client is other_config._client is get_client("test-key-1")
+
+
+def test_each_key_gets_its_own_client():
+    assert get_client("test-key-1") is get_client("test-key-1")
+    assert get_client("test-key-1") is not get_client("test-key-2")
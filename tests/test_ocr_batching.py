@@ -0,0 +1,39 @@
+from src.ocr_extraction import split_batched_text, _ocr_page_batch
+from src.stub_model import StubModel, stub_ocr_text, _text_response
+
+
+def test_split_batched_text_per_page():
+    text = "=== PAGE 1 ===\nfirst page\n=== PAGE 2 ===\n\n=== PAGE 3 ===\nthird\npage\n"
+    assert split_batched_text(text, 3) == ["first page", "", "third\npage"]
+
+
+def test_split_rejects_missing_or_reordered_pages():
+    assert split_batched_text("=== PAGE 1 ===\na\n=== PAGE 3 ===\nc", 3) is None
+    assert split_batched_text("=== PAGE 2 ===\nb\n=== PAGE 1 ===\na", 2) is None
+    assert split_batched_text("no delimiters at all", 2) is None
+
+
+def test_batch_matches_single_page_text():
+    model = StubModel("models/test", latency=0, jitter=0)
+    pages = [(0, "aaa"), (4, "bbb"), (5, "ccc")]
+
+    assert _ocr_page_batch(model, pages, "image/jpeg") == {i: stub_ocr_text(data) for i, data in pages}
+    assert model.calls == 1
+
+
+class _UndelimitedModel(StubModel):
+    """Answers batched requests without page delimiters."""
+
+    def generate_content(self, contents, **kwargs):
+        if len(contents) > 2:
+            self.calls += 1
+            return _text_response("all the pages, run together")
+        return super().generate_content(contents, **kwargs)
+
+
+def test_unsplittable_batch_falls_back_to_single_pages():
+    model = _UndelimitedModel("models/test", latency=0, jitter=0)
+    pages = [(0, "aaa"), (1, "bbb")]
+
+    assert _ocr_page_batch(model, pages, "image/jpeg") == {i: stub_ocr_text(data) for i, data in pages}
+    assert model.calls == 3  # the batch, then one call per page
@@ -0,0 +1,102 @@
+import json
+
+from src.ocr_cache import OCRCache, document_cache_key, page_cache_key, is_cacheable_text
+
+
+def test_get_put_and_counters(tmp_path):
+    cache = OCRCache(str(tmp_path))
+    assert cache.get("abc") is None
+    cache.put("abc", "question one")
+    assert cache.get("abc") == "question one"
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+
+
+def test_index_survives_reload(tmp_path):
+    OCRCache(str(tmp_path)).put("abc", "answer key")
+    reloaded = OCRCache(str(tmp_path))
+    assert reloaded.get("abc") == "answer key"
+
+
+def test_lru_eviction_keeps_recently_used(tmp_path):
+    cache = OCRCache(str(tmp_path), max_bytes=10)
+    cache.put("old", "aaaa")
+    cache.put("new", "bbbb")
+    cache.get("old")  # "new" is now the least recently used
+    cache.put("third", "cccc")
+
+    assert cache.get("new") is None
+    assert cache.get("old") == "aaaa"
+    assert cache.get("third") == "cccc"
+
+
+def test_key_depends_on_content_and_model(tmp_path):
+    a = tmp_path / "a.pdf"
+    b = tmp_path / "b.pdf"
+    a.write_bytes(b"%PDF same")
+    b.write_bytes(b"%PDF same")
+
+    assert document_cache_key(str(a), "m1", "p") == document_cache_key(str(b), "m1", "p")
+    assert document_cache_key(str(a), "m1", "p") != document_cache_key(str(a), "m2", "p")
+
+
+def test_failed_ocr_is_not_cacheable():
+    assert is_cacheable_text("Q1. Define a process.")
+    assert not is_cacheable_text("Q1\n[Page 2 OCR Error: timeout]")
+    assert not is_cacheable_text("API Key configuration failed.")
+    assert not is_cacheable_text("")
+
+
+def test_page_key_accepts_str_and_bytes():
+    assert page_cache_key("aGVsbG8=", "m", "p", "image/jpeg") == page_cache_key(b"aGVsbG8=", "m", "p", "image/jpeg")
+    assert page_cache_key("aGVsbG8=", "m", "p", "image/jpeg") != page_cache_key("aGVsbG9=", "m", "p", "image/jpeg")
+
+
+def test_lookups_persist_on_flush(tmp_path):
+    cache = OCRCache(str(tmp_path))
+    cache.put("abc", "page text")
+    cache.get("abc")
+    cache.flush()
+    assert OCRCache(str(tmp_path)).stats()["hits"] == 1
+
+
+def test_two_processes_sharing_a_cache_keep_each_others_entries(tmp_path):
+    # Streamlit and a batch run each open their own OCRCache on the same directory
+    server = OCRCache(str(tmp_path))
+    batch = OCRCache(str(tmp_path))
+    server.put("a", "from the app")
+    batch.put("b", "from the batch")
+    server.flush()
+    batch.flush()
+
+    reloaded = OCRCache(str(tmp_path))
+    assert reloaded.get("a") == "from the app"
+    assert reloaded.get("b") == "from the batch"
+
+
+def test_size_bound_holds_across_instances(tmp_path):
+    first = OCRCache(str(tmp_path), max_bytes=10)
+    second = OCRCache(str(tmp_path), max_bytes=10)
+    first.put("one", "aaaa")
+    second.put("two", "bbbb")
+    first.put("three", "cccc")
+
+    stats = OCRCache(str(tmp_path), max_bytes=10).stats()
+    assert stats["entries"] == 2
+    assert stats["bytes"] == 8
+    assert first.get("one") is None
+
+
+def test_legacy_json_index_is_imported(tmp_path):
+    (tmp_path / "abc.txt").write_text("old page text", encoding="utf-8")
+    (tmp_path / "index.json").write_text(
+        json.dumps({"entries": {"abc": {"size": 13, "last_used": 1}}, "hits": 3, "misses": 2, "clock": 1}))
+
+    cache = OCRCache(str(tmp_path))
+    assert cache.get("abc") == "old page text"
+    assert cache.stats()["hits"] == 4
+    assert not (tmp_path / "index.json").exists()
+    assert not (tmp_path / "abc.txt").exists()
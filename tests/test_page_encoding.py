@@ -0,0 +1,49 @@
+import cv2
+import numpy as np
+
+from src.page_encoding import encode_page, content_box, choose_profile, DENSITY_PROFILES
+
+
+def _page(height=1000, width=800):
+    page = np.full((height, width, 3), 255, dtype=np.uint8)
+    page[400:600, 300:500] = 0  # one block of "text" in the middle
+    return page
+
+
+def _decode(data: bytes):
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+
+
+def test_adaptive_crops_margins_and_drops_colour():
+    encoded = encode_page(_page(), source_dpi=100, max_dpi=100)
+    image = _decode(encoded.data)
+
+    assert encoded.cropped
+    assert image.ndim == 2  # single-channel JPEG
+    # 200px of ink plus 0.15in of padding on each side, at 100 DPI
+    assert image.shape == (230, 230)
+
+
+def test_fixed_keeps_whole_colour_page():
+    encoded = encode_page(_page(), source_dpi=100, max_dpi=100, encoding="fixed")
+    image = _decode(encoded.data)
+
+    assert not encoded.cropped
+    assert image.shape == (1000, 800, 3)
+
+
+def test_blank_page_and_specks_have_no_content_box():
+    mask = np.zeros((1000, 800), dtype=np.uint8)
+    assert content_box(mask, padding=10) is None
+    mask[5, 5] = 255  # a single speck is below MIN_INK_SHARE
+    assert content_box(mask, padding=10) is None
+
+    encoded = encode_page(np.full((1000, 800, 3), 255, dtype=np.uint8), source_dpi=100, max_dpi=100)
+    assert encoded.ink_ratio == 0.0
+
+
+def test_denser_pages_get_more_resolution():
+    sparse, dense = choose_profile(0.0), choose_profile(1.0)
+    assert sparse[0] < dense[0]
+    assert dense == DENSITY_PROFILES[-1][1:]
+    assert choose_profile(1.0, max_dpi=100)[0] == 100
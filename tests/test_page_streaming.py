@@ -0,0 +1,62 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz
+
+from src import page_rendering
+from src.page_rendering import iter_rendered_pages
+from src.pipeline import iter_document_pages
+
+
+def _pdf(tmp_path, pages=6):
+    doc = fitz.open()
+    for n in range(pages):
+        doc.new_page(width=300, height=400).insert_text((40, 60 + 20 * n), f"Page {n + 1}: define paging")
+    path = str(tmp_path / "doc.pdf")
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def test_pages_are_rendered_only_when_asked_for(tmp_path, monkeypatch):
+    rendered = []
+    process_page = page_rendering.process_page
+
+    def recording_process_page(page, index, *args, **kwargs):
+        rendered.append(index)
+        return process_page(page, index, *args, **kwargs)
+
+    monkeypatch.setattr(page_rendering, "process_page", recording_process_page)
+    pages = iter_rendered_pages(_pdf(tmp_path), processes=1)
+
+    assert rendered == []
+    assert next(pages).index == 0
+    assert rendered == [0]
+    assert [page.index for page in pages] == [1, 2, 3, 4, 5]
+
+
+def test_parallel_ranges_stream_in_page_order(tmp_path):
+    pages = list(iter_rendered_pages(_pdf(tmp_path), processes=2, analyze=False))
+    assert [page.index for page in pages] == list(range(6))
+    assert all(page.ocr_image[:2] == b"\xff\xd8" for page in pages)  # JPEG
+
+
+def test_document_pages_come_from_the_render_pool(tmp_path):
+    assert [index for index, _ in iter_document_pages(_pdf(tmp_path, pages=3))] == [0, 1, 2]
+
+
+def test_parallel_rendering_keeps_a_bounded_number_of_ranges_queued(tmp_path, monkeypatch):
+    submitted = []
+
+    class RecordingPool(ThreadPoolExecutor):
+        def submit(self, fn, pdf_path, start, *args):
+            submitted.append(start)
+            return super().submit(fn, pdf_path, start, *args)
+
+    with RecordingPool(max_workers=2) as pool:
+        monkeypatch.setattr(page_rendering, "_get_process_pool", lambda processes: pool)
+        pages = iter_rendered_pages(_pdf(tmp_path, pages=20), processes=2, analyze=False, pages_per_task=1)
+
+        assert next(pages).index == 0
+        assert len(submitted) == 2 * page_rendering.RANGES_IN_FLIGHT_PER_PROCESS + 1
+        assert [page.index for page in pages] == list(range(1, 20))
+        assert submitted == list(range(20))
@@ -0,0 +1,100 @@
+from google.api_core import exceptions as api_exceptions
+from google.generativeai import protos
+
+from src import prompt_cache
+from src.prompt_cache import PrefixRegistry, token_savings
+from src.rate_limiter import RateLimiter
+from src.answer_grader import build_grading_prefix, build_student_prompt
+
+LONG_PREFIX = "Question paper and answer key. " * 400  # well over MIN_CACHE_TOKENS
+
+
+class _FakeCacheClient:
+    def __init__(self, fail=False, errors=()):
+        self.fail = fail
+        self.errors = list(errors)
+        self.created = []
+
+    def create_cached_content(self, request):
+        if self.fail:
+            raise api_exceptions.InvalidArgument("caching not supported for this model")
+        if self.errors:
+            raise self.errors.pop(0)
+        self.created.append(request)
+        return protos.CachedContent(name=f"cachedContents/{len(self.created)}",
+                                    usage_metadata={"total_token_count": 3000})
+
+
+def test_prefix_depends_only_on_the_exam():
+    prefix = build_grading_prefix("Q1. Define paging.", "Paging splits memory...", "", "Moderate")
+    assert prefix == build_grading_prefix("Q1. Define paging.", "Paging splits memory...", "", "Moderate")
+    assert prefix != build_grading_prefix("Q1. Define paging.", "Paging splits memory...", "", "Strict")
+    assert "student one" in build_student_prompt("student one", 2)
+    assert "student one" not in prefix
+
+
+def test_context_cache_is_created_once_on_reuse(monkeypatch):
+    client = _FakeCacheClient()
+    monkeypatch.setattr(prompt_cache, "get_client", lambda api_key, service: client)
+    registry = PrefixRegistry()
+
+    first = registry.register("key", "models/test", LONG_PREFIX)
+    assert registry.context_cache("key", "models/test", first, LONG_PREFIX) is None
+
+    names = []
+    for _ in range(3):
+        entry = registry.register("key", "models/test", LONG_PREFIX)
+        names.append(registry.context_cache("key", "models/test", entry, LONG_PREFIX))
+
+    assert names == ["cachedContents/1"] * 3
+    assert len(client.created) == 1
+    assert registry.stats()["prefix_reuses"] == 3
+
+
+def test_refused_cache_falls_back_to_full_prompts(monkeypatch):
+    client = _FakeCacheClient(fail=True)
+    monkeypatch.setattr(prompt_cache, "get_client", lambda api_key, service: client)
+    registry = PrefixRegistry()
+
+    for _ in range(3):
+        entry = registry.register("key", "models/test", LONG_PREFIX)
+        assert registry.context_cache("key", "models/test", entry, LONG_PREFIX) is None
+    assert entry.cache_failed
+
+
+def test_transient_errors_do_not_turn_caching_off(monkeypatch):
+    busy = [api_exceptions.ServiceUnavailable("Overloaded, retry in 0.01s") for _ in range(6)]
+    client = _FakeCacheClient(errors=busy)
+    monkeypatch.setattr(prompt_cache, "get_client", lambda api_key, service: client)
+    monkeypatch.setattr(prompt_cache, "get_limiter", lambda name: RateLimiter(requests_per_minute=6000))
+    registry = PrefixRegistry()
+
+    registry.register("key", "models/test", LONG_PREFIX)
+    entry = registry.register("key", "models/test", LONG_PREFIX)
+    # Every retry fails: this request goes without a cache, but caching stays on
+    assert registry.context_cache("key", "models/test", entry, LONG_PREFIX) is None
+    assert not entry.cache_failed
+    # The next reuse retries through the one remaining outage
+    entry = registry.register("key", "models/test", LONG_PREFIX)
+    assert registry.context_cache("key", "models/test", entry, LONG_PREFIX) == "cachedContents/1"
+
+
+def test_caches_are_kept_apart_per_api_key():
+    registry = PrefixRegistry()
+    mine = registry.register("key-1", "models/test", LONG_PREFIX)
+    theirs = registry.register("key-2", "models/test", LONG_PREFIX)
+    assert mine is not theirs
+    assert (mine.uses, theirs.uses) == (1, 1)
+
+
+def test_token_savings_between_snapshots():
+    registry = PrefixRegistry()
+    before = registry.stats()
+    response = protos.GenerateContentResponse(usage_metadata={
+        "prompt_token_count": 1000, "cached_content_token_count": 800, "candidates_token_count": 50
+    })
+    registry.record_usage(response, used_context_cache=True)
+
+    savings = token_savings(before, registry.stats())
+    assert savings["cached_share"] == 0.8
+    assert savings["explicit_cache_requests"] == 1
@@ -0,0 +1,51 @@
+import pytest
+from google.api_core import exceptions as api_exceptions
+
+from src.rate_limiter import RateLimiter, call_with_retry, retry_after_seconds
+
+
+def flaky(failures):
+    """Returns a callable that raises each error in `failures` once, then succeeds."""
+    failures = list(failures)
+
+    def call():
+        if failures:
+            raise failures.pop(0)
+        return "ok"
+    return call
+
+
+def test_retries_transient_errors_and_honors_retry_after():
+    limiter = RateLimiter(requests_per_minute=6000, max_concurrency=4)
+    slept = []
+    result = call_with_retry(
+        flaky([api_exceptions.ResourceExhausted("Quota exceeded. Please retry in 7s."),
+               api_exceptions.ServiceUnavailable("unavailable")]),
+        limiter=limiter, sleep=slept.append
+    )
+
+    assert result == "ok"
+    assert slept[0] == 7.0
+    stats = limiter.stats()
+    assert (stats["calls"], stats["retries"], stats["rate_limited"]) == (3, 2, 1)
+    assert stats["concurrency"] == 2  # halved by the 429
+
+
+def test_non_retryable_errors_are_raised_immediately():
+    limiter = RateLimiter(requests_per_minute=6000)
+    with pytest.raises(api_exceptions.InvalidArgument):
+        call_with_retry(flaky([api_exceptions.InvalidArgument("bad request")]), limiter=limiter, sleep=lambda s: None)
+    assert limiter.stats()["retries"] == 0
+
+
+def test_gives_up_after_max_attempts():
+    limiter = RateLimiter(requests_per_minute=6000, max_concurrency=8)
+    with pytest.raises(api_exceptions.TooManyRequests):
+        call_with_retry(flaky([api_exceptions.TooManyRequests("slow down")] * 3), limiter=limiter,
+                        max_attempts=3, sleep=lambda s: None)
+    assert limiter.stats()["concurrency"] == 1
+
+
+def test_retry_after_from_message():
+    assert retry_after_seconds(Exception("retry_delay {\n  seconds: 12\n}")) == 12.0
+    assert retry_after_seconds(Exception("no hint here")) is None
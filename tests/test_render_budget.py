@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+from src.render_budget import begin_rerun, budget_section, track_page
+
+
+def test_sections_are_recorded_per_page():
+    report = begin_rerun()
+
+    @track_page("Dashboard")
+    def page():
+        with budget_section("load"):
+            pass
+        with budget_section("load"):
+            pass
+        with budget_section("serialize"):
+            pass
+
+    page()
+    assert [p["name"] for p in report["pages"]] == ["Dashboard"]
+    assert set(report["pages"][0]["sections"]) == {"load", "serialize"}
+    assert report["warnings"] == []
+
+
+def test_duplicate_page_render_is_flagged():
+    report = begin_rerun()
+
+    @track_page("Dashboard")
+    def page():
+        pass
+
+    page()
+    page()
+    assert len(report["warnings"]) == 1
+    assert "more than once" in report["warnings"][0]
+
+    # A new rerun starts clean
+    assert begin_rerun()["warnings"] == []
+
+
+def test_pages_without_a_budget_are_timed_but_never_over_budget():
+    report = begin_rerun()
+
+    @track_page("Evaluate", budget_ms=None)
+    def evaluate():
+        time.sleep(0.01)
+
+    @track_page("Settings", budget_ms=1)
+    def settings():
+        time.sleep(0.01)
+
+    evaluate()
+    settings()
+    assert report["pages"][0]["total_ms"] >= 10
+    assert len(report["warnings"]) == 1
+    assert "Settings" in report["warnings"][0]
+
+
+def test_dashboard_tracks_itself_so_a_second_render_is_flagged(monkeypatch):
+    import dashboard
+
+    def no_store():
+        raise RuntimeError("stop after the page has been entered")
+
+    monkeypatch.setattr(dashboard, "get_store", no_store)
+    report = begin_rerun()
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            dashboard.display_dashboard("OS")
+
+    assert [p["name"] for p in report["pages"]] == ["Dashboard", "Dashboard"]
+    assert any("more than once" in w for w in report["warnings"])
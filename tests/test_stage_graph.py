@@ -0,0 +1,92 @@
+import threading
+
+import pytest
+
+from src.pipeline import run_stage_graph
+
+
+def test_stages_run_after_their_dependencies_and_get_their_results():
+    order = []
+
+    def stage(name, value):
+        def run(*deps):
+            order.append(name)
+            return value + sum(deps)
+        return run
+
+    progress = []
+    results = run_stage_graph({
+        "total": (stage("total", 100), ["a", "b"]),
+        "b": (stage("b", 10), ["a"]),
+        "a": (stage("a", 1), []),
+    }, on_stage_complete=lambda name, done, total: progress.append((name, done, total)))
+
+    assert results == {"a": 1, "b": 11, "total": 112}
+    assert order == ["a", "b", "total"]
+    assert progress == [("a", 1, 3), ("b", 2, 3), ("total", 3, 3)]
+
+
+def test_independent_stages_run_concurrently():
+    # Each stage waits for the other to start; run one at a time, this would time out
+    barrier = threading.Barrier(2, timeout=5)
+
+    def meet(name):
+        def run():
+            barrier.wait()
+            return name
+        return run
+
+    assert run_stage_graph({"a": (meet("a"), []), "b": (meet("b"), [])}) == {"a": "a", "b": "b"}
+
+
+def test_unknown_dependency_is_rejected_before_anything_runs():
+    ran = []
+    with pytest.raises(ValueError, match="unknown"):
+        run_stage_graph({"a": (lambda: ran.append("a"), []), "b": (lambda a: None, ["missing"])})
+    assert ran == []
+
+
+def test_cycle_is_detected():
+    with pytest.raises(ValueError, match="cycle"):
+        run_stage_graph({"a": (lambda: 1, []), "b": (lambda c: 2, ["c"]), "c": (lambda b: 3, ["b"])})
+
+
+def test_failure_propagates_and_dependents_never_start():
+    started = []
+
+    def fail():
+        raise RuntimeError("OCR failed")
+
+    with pytest.raises(RuntimeError, match="OCR failed"):
+        run_stage_graph({
+            "sheet": (fail, []),
+            "grade": (lambda sheet: started.append("grade"), ["sheet"]),
+        })
+    assert started == []
+
+
+def test_failure_cancels_stages_not_yet_started():
+    release = threading.Event()
+    started = []
+
+    def fail():
+        raise RuntimeError("boom")
+
+    def slow():
+        started.append("slow")
+        release.wait(5)
+
+    def queued():
+        started.append("queued")
+
+    # One worker: "queued" sits behind "slow" and is cancelled when "fail" raises
+    stages = {"fail": (fail, []), "slow": (slow, []), "queued": (queued, [])}
+    timer = threading.Timer(0.2, release.set)
+    timer.start()
+    try:
+        with pytest.raises(RuntimeError, match="boom"):
+            run_stage_graph(stages, max_workers=1)
+    finally:
+        timer.cancel()
+        release.set()
+    assert "queued" not in started
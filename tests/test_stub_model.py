@@ -0,0 +1,41 @@
+import pytest
+from google.api_core import exceptions as api_exceptions
+
+from src.answer_grader import parse_ai_response
+from src.stub_model import StubModel
+from src import model_registry
+
+
+def test_stub_grading_response_parses_like_gemini():
+    model = StubModel("models/test", latency=0, jitter=0)
+    first = parse_ai_response(model.generate_content("grade this sheet").text)
+    again = parse_ai_response(model.generate_content("grade this sheet").text)
+
+    assert first == again
+    total = first["analytics"]["total_score"]
+    assert total["max"] == sum(item["max_marks"] for item in first["analytics"]["detailed_breakdown"])
+    assert "Strengths" in first["report"]
+
+
+def test_stub_ocr_is_deterministic_per_image():
+    model = StubModel("models/test", latency=0, jitter=0)
+    page = [{"text": "OCR"}, {"inline_data": {"mime_type": "image/jpeg", "data": "abc"}}]
+    other = [{"text": "OCR"}, {"inline_data": {"mime_type": "image/jpeg", "data": "xyz"}}]
+    assert model.generate_content(page).text == model.generate_content(page).text
+    assert model.generate_content(page).text != model.generate_content(other).text
+
+
+def test_stub_failures_look_like_api_outages():
+    model = StubModel("models/test", latency=0, jitter=0, failure_rate=1.0)
+    with pytest.raises(api_exceptions.ServiceUnavailable):
+        model.generate_content("grade this sheet")
+
+
+def test_stub_backend_is_kept_out_of_real_cache_keys():
+    try:
+        model_registry.set_backend("stub")
+        assert isinstance(model_registry.get_model("any-key", "models/test"), StubModel)
+        assert model_registry.cache_model_id("models/test") == "stub:models/test"
+    finally:
+        model_registry.set_backend("gemini")
+    assert model_registry.cache_model_id("models/test") == "models/test"